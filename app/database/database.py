@@ -1,20 +1,84 @@
+import asyncio
 import os
-from dotenv import load_dotenv
-from supabase import create_client, Client
+import threading
+from typing import TYPE_CHECKING, Optional, Tuple
 
-# Charger les variables d'environnement depuis le fichier .env
-load_dotenv()
+if TYPE_CHECKING:
+    from supabase import AsyncClient, Client
 
-# Récupérer les informations de connexion depuis les variables d'environnement
-supabase_url: str = os.environ.get("SUPABASE_URL")
-supabase_key: str = os.environ.get("SUPABASE_KEY")
 
-# Vérifier si les variables sont bien définies
-if not supabase_url or not supabase_key:
-    raise ValueError("SUPABASE_URL and SUPABASE_KEY doit inclus dans le fichier .env")
+def _credentials() -> Tuple[str, str]:
+    # Récupérer les informations de connexion depuis les variables d'environnement (chargées par main.py)
+    supabase_url = os.environ.get("SUPABASE_URL")
+    supabase_key = os.environ.get("SUPABASE_KEY")
+
+    # Vérifier si les variables sont bien définies
+    if not supabase_url or not supabase_key:
+        raise ValueError("SUPABASE_URL and SUPABASE_KEY doit inclus dans le fichier .env")
+    return supabase_url, supabase_key
+
+
+class LazySupabaseClient:
+    """
+    Client Supabase unique, partagé par tout le projet et créé au premier usage :
+    l'import du paquet `supabase` et la lecture de la configuration ne pèsent pas
+    sur le démarrage. S'utilise exactement comme un `Client`.
+    """
+
+    def __init__(self):
+        self._client: Optional["Client"] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> "Client":
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._create()
+        return self._client
+
+    @staticmethod
+    def _create() -> "Client":
+        from supabase import create_client
+
+        client = create_client(*_credentials())
+        print("Supabase client initialized successfully.")
+        return client
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
 
-# Créer une instance unique du client Supabase
 # Cette instance sera importée et utilisée dans tout le projet
-supabase: Client = create_client(supabase_url, supabase_key)
+supabase = LazySupabaseClient()
+
+
+def get_supabase() -> "Client":
+    return supabase.get()
+
+
+class AsyncSupabaseClient:
+    """
+    Client Supabase asynchrone pour les routes `async def` : les requêtes PostgREST
+    sont attendues dans la boucle de l'application au lieu d'occuper un thread.
+    Créé au premier usage ; `await async_supabase.get()` renvoie un `AsyncClient`.
+    """
+
+    def __init__(self):
+        self._client: Optional["AsyncClient"] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def get(self) -> "AsyncClient":
+        if self._client is None:
+            if self._lock is None:
+                self._lock = asyncio.Lock()
+            async with self._lock:
+                if self._client is None:
+                    from supabase import acreate_client
+                    self._client = await acreate_client(*_credentials())
+                    print("Async Supabase client initialized successfully.")
+        return self._client
+
 
-print("Supabase client initialized successfully.")
+async_supabase = AsyncSupabaseClient()
@@ -0,0 +1,103 @@
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, List, Optional, Sequence
+
+# Connexion directe et asynchrone à Postgres (sans PostgREST) : pool borné, requêtes
+# préparées une fois par connexion et connexions inactives recyclées.
+PG_POOL_MIN = int(os.getenv("PG_POOL_MIN", 1))
+PG_POOL_MAX = int(os.getenv("PG_POOL_MAX", 10))
+PG_POOL_TIMEOUT = float(os.getenv("PG_POOL_TIMEOUT", 5))
+PG_HEALTHCHECK_AFTER = float(os.getenv("PG_HEALTHCHECK_AFTER", 30))
+PG_STATEMENT_TIMEOUT_MS = int(os.getenv("PG_STATEMENT_TIMEOUT_MS", 10000))
+
+
+class PreparedQuery:
+    """Requête SQL à paramètres positionnels ($1, $2...) préparée une fois par connexion."""
+
+    def __init__(self, name: str, sql: str):
+        self.name = name
+        self.sql = sql
+
+
+async def _init_connection(conn) -> None:
+    # jsonb décodé en objets Python, comme les réponses PostgREST
+    await conn.set_type_codec("jsonb", encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+
+
+class PostgresPool:
+    """
+    Pool asyncpg créé au premier usage (DATABASE_URL), dans la boucle de l'application.
+    Au plus PG_POOL_MAX connexions ; au-delà, l'appelant attend PG_POOL_TIMEOUT secondes
+    sans occuper de thread.
+    """
+
+    def __init__(self, dsn: Optional[str]):
+        self.dsn = dsn
+        self._pool = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.dsn)
+
+    async def _get_pool(self):
+        if self._pool is None:
+            if self._lock is None:
+                self._lock = asyncio.Lock()
+            async with self._lock:
+                if self._pool is None:
+                    if not self.dsn:
+                        raise ValueError("DATABASE_URL doit être défini pour l'accès direct à Postgres.")
+                    import asyncpg
+                    self._pool = await asyncpg.create_pool(
+                        self.dsn,
+                        min_size=PG_POOL_MIN,
+                        max_size=PG_POOL_MAX,
+                        # Connexion inactive au-delà de ce délai : fermée puis recréée à la demande
+                        max_inactive_connection_lifetime=PG_HEALTHCHECK_AFTER,
+                        server_settings={"statement_timeout": str(PG_STATEMENT_TIMEOUT_MS)},
+                        init=_init_connection,
+                    )
+        return self._pool
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[Any]:
+        pool = await self._get_pool()
+        try:
+            conn = await pool.acquire(timeout=PG_POOL_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise TimeoutError("Aucune connexion Postgres disponible (pool saturé).")
+        try:
+            yield conn
+        finally:
+            await pool.release(conn)
+
+    async def fetch_all(self, query: PreparedQuery, params: Sequence[Any] = ()) -> List[Any]:
+        # asyncpg prépare l'instruction à la première exécution sur chaque connexion, puis la réutilise
+        async with self.connection() as conn:
+            return await conn.fetch(query.sql, *params)
+
+    async def fetch_value(self, query: PreparedQuery, params: Sequence[Any] = ()) -> Any:
+        """Première colonne de la première ligne (ex : un résultat jsonb, déjà décodé)."""
+        async with self.connection() as conn:
+            return await conn.fetchval(query.sql, *params)
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    def stats(self) -> dict:
+        pool = self._pool
+        return {
+            "configured": self.configured,
+            "started": pool is not None,
+            "max": PG_POOL_MAX,
+            "size": pool.get_size() if pool is not None else 0,
+            "idle": pool.get_idle_size() if pool is not None else 0,
+        }
+
+
+postgres = PostgresPool(os.getenv("DATABASE_URL"))
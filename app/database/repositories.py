@@ -0,0 +1,179 @@
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+from .database import async_supabase
+from .postgres import postgres, PreparedQuery
+from ..schemas.incidents import IncidentFilters
+from ..utils import metrics
+from ..utils.incident_queries import INCIDENT_LIST_SELECT, apply_incident_filters
+
+# Accès aux données par dépôt, asynchrone, avec deux implémentations interchangeables :
+# "postgrest" (client Supabase async, par défaut) et "postgres" (pool asyncpg, voir postgres.py).
+# Les méthodes sont des coroutines : les routes `async def` les attendent sans occuper de thread.
+# Choix par dépôt : REPOSITORY_BACKENDS="users=postgres,incidents=postgres,stats=postgres"
+BACKENDS = ("postgrest", "postgres")
+
+
+def _configured_backends() -> Dict[str, str]:
+    choices = {}
+    for item in os.getenv("REPOSITORY_BACKENDS", "").split(","):
+        name, _, backend = item.strip().partition("=")
+        if name and backend in BACKENDS:
+            choices[name] = backend
+    return choices
+
+
+def _timed(repository: str, backend: str, fn: Callable[..., Awaitable]):
+    """Compte les appels et le temps cumulé par dépôt et par backend (comparaison dans /admin/metrics)."""
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            metrics.increment("repositories", f"{repository}.{backend}:calls")
+            metrics.increment("repositories", f"{repository}.{backend}:us", int((time.perf_counter() - start) * 1e6))
+    return wrapper
+
+
+# --- Utilisateurs (recherche à chaque requête authentifiée) ---
+
+# Profil minimal d'une session WebSocket : jamais le hachage du mot de passe
+SESSION_COLUMNS = ["id", "role", "fokontany_id", "nom", "prenom"]
+
+
+class PostgrestUserRepository:
+    async def _first(self, email: str, select: str) -> Optional[dict]:
+        client = await async_supabase.get()
+        response = await client.table("utilisateurs").select(select).eq("email", email).limit(1).execute()
+        return response.data[0] if response.data else None
+
+    async def get_by_email(self, email: str) -> Optional[dict]:
+        return await self._first(email, "*")
+
+    async def get_session_by_email(self, email: str) -> Optional[dict]:
+        return await self._first(email, ", ".join(SESSION_COLUMNS))
+
+
+class PostgresUserRepository:
+    _by_email = PreparedQuery("utilisateur_par_email", "select to_jsonb(u) from public.utilisateurs u where u.email = $1 limit 1")
+    _session_by_email = PreparedQuery(
+        "session_par_email",
+        "select jsonb_build_object(" + ", ".join(f"'{c}', u.{c}" for c in SESSION_COLUMNS) + ") "
+        "from public.utilisateurs u where u.email = $1 limit 1"
+    )
+
+    async def get_by_email(self, email: str) -> Optional[dict]:
+        return await postgres.fetch_value(self._by_email, (email,))
+
+    async def get_session_by_email(self, email: str) -> Optional[dict]:
+        return await postgres.fetch_value(self._session_by_email, (email,))
+
+
+# --- Listes d'incidents ---
+
+class PostgrestIncidentRepository:
+    async def list(self, filters: IncidentFilters, columns: Optional[List[str]] = None,
+                   order_by: str = "date_signalement") -> List[dict]:
+        client = await async_supabase.get()
+        select = ", ".join(columns) if columns else INCIDENT_LIST_SELECT
+        query = apply_incident_filters(client.table("incidents").select(select), filters)
+        response = await query.order(order_by, desc=True).execute()
+        return response.data or []
+
+
+_INCIDENT_LIST_SQL = """
+    select coalesce(jsonb_agg(
+        to_jsonb(i) || jsonb_build_object('fokontany', to_jsonb(f), 'typesincident', to_jsonb(t))
+        order by i.{order} desc
+    ), '[]'::jsonb)
+    from public.incidents i
+    left join public.fokontany f on f.id = i.fokontany_id
+    left join public.typesincident t on t.id = i.type_id
+    where ($1::text[] is null or i.statut = any($1::text[]))
+      and ($2::integer is null or i.type_id = $2)
+      and ($3::integer is null or i.fokontany_id = $3)
+      and ($4::uuid is null or i.signale_par_id = $4)
+      and ($5::uuid is null or i.assigne_a_id = $5)
+      and ($6::text is null or i.date_signalement >= $6::text::timestamptz)
+      and ($7::text is null or i.date_signalement <= $7::text::timestamptz)
+"""
+
+
+class PostgresIncidentRepository:
+    """Une seule instruction préparée par ordre de tri : les filtres absents valent NULL."""
+    _queries = {
+        order: PreparedQuery(f"incidents_par_{order}", _INCIDENT_LIST_SQL.format(order=order))
+        for order in ("date_signalement", "date_assignation")
+    }
+
+    async def list(self, filters: IncidentFilters, columns: Optional[List[str]] = None,
+                   order_by: str = "date_signalement") -> List[dict]:
+        start, end = filters.date_bounds()
+        rows = await postgres.fetch_value(self._queries[order_by], (
+            filters.statut or None,
+            filters.type_id,
+            filters.fokontany_id,
+            str(filters.signale_par_id) if filters.signale_par_id else None,
+            str(filters.assigne_a_id) if filters.assigne_a_id else None,
+            start,
+            end,
+        )) or []
+        if columns:
+            rows = [{c: row.get(c) for c in columns} for row in rows]
+        return rows
+
+
+# --- Statistiques groupées (RPC incident_stats_grouped) ---
+
+class PostgrestStatsRepository:
+    async def grouped(self, params: dict) -> dict:
+        client = await async_supabase.get()
+        response = await client.rpc("incident_stats_grouped", params).execute()
+        return response.data or {}
+
+
+class PostgresStatsRepository:
+    _grouped = PreparedQuery(
+        "incident_stats_grouped",
+        "select public.incident_stats_grouped($1::text::date, $2::text::date, $3::text, $4::integer, $5::integer, $6::uuid)"
+    )
+
+    async def grouped(self, params: dict) -> dict:
+        return await postgres.fetch_value(self._grouped, (
+            params["p_start"], params["p_end"], params["p_period"],
+            params["p_fokontany_id"], params["p_type_id"], params["p_assigne_a_id"]
+        )) or {}
+
+
+_IMPLEMENTATIONS = {
+    "users": {"postgrest": PostgrestUserRepository, "postgres": PostgresUserRepository},
+    "incidents": {"postgrest": PostgrestIncidentRepository, "postgres": PostgresIncidentRepository},
+    "stats": {"postgrest": PostgrestStatsRepository, "postgres": PostgresStatsRepository},
+}
+
+
+class _Instrumented:
+    def __init__(self, name: str, backend: str, impl):
+        self.backend = backend
+        self._name = name
+        self._impl = impl
+
+    def __getattr__(self, attr: str):
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        return _timed(self._name, self.backend, getattr(self._impl, attr))
+
+
+def _build(name: str):
+    backend = _configured_backends().get(name, "postgrest")
+    if backend == "postgres" and not postgres.configured:
+        print(f"WARNING: dépôt '{name}' configuré sur postgres sans DATABASE_URL, repli sur PostgREST.")
+        backend = "postgrest"
+    return _Instrumented(name, backend, _IMPLEMENTATIONS[name][backend]())
+
+
+users_repository = _build("users")
+incidents_repository = _build("incidents")
+stats_repository = _build("stats")
+
+metrics.register_gauge("postgres_pool", postgres.stats)
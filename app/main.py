@@ -1,18 +1,28 @@
 # Fichier complet : backend/app/main.py
+# Chargé une seule fois, avant tout module qui lit la configuration
+from dotenv import load_dotenv
+load_dotenv()
+
+import asyncio
+import threading
 import uuid
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.encoders import jsonable_encoder
 from typing import Dict, List, Set
 import os
-from dotenv import load_dotenv
 from jose import jwt, JWTError
 from .routers import auth, fokontany, admin, incidents, users, authority, security, postes, stats, history, incident_types
 from .utils import socket_events
+from .utils.etag import ETagMiddleware
+from .utils.sketches import resolution_sketches
+from .utils.reference_data import reference_data
+from .utils import jobs, rollup, spikes  # noqa: F401 -- rollup : enregistre la tâche de réconciliation
+from .database.database import supabase, async_supabase
+from .database.postgres import postgres
+from .database.repositories import users_repository
 from fastapi.openapi.utils import get_openapi
 
-load_dotenv()
-
 ALLOWED_ORIGINS = [
     "http://localhost:3000"
 
@@ -48,12 +58,27 @@ def custom_openapi():
 
 app.openapi = custom_openapi
 
+# GET conditionnels (ETag / If-None-Match) sur les données consultées en boucle par les tableaux de bord
+app.add_middleware(
+    ETagMiddleware,
+    paths=[
+        "/api/v1/incidents",
+        "/api/v1/authority/incidents",
+        "/api/v1/security/incidents",
+        "/api/v1/fokontany",
+        "/api/v1/postes",
+        "/api/v1/stats",
+    ],
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Pagination de l'historique : le frontend doit pouvoir lire le curseur suivant
+    expose_headers=["X-Next-Cursor"],
 )
 
 SECRET_KEY = os.getenv("SECRET_KEY")
@@ -68,9 +93,6 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 if not all([SECRET_KEY, ALGORITHM, FROM_EMAIL, SMTP_SERVER, SMTP_PORT, SMTP_PASSWORD, SUPABASE_URL, SUPABASE_KEY]):
     raise ValueError("Les variables d'environnement essentielles doivent être définies dans le fichier .env.")
 
-from supabase import create_client, Client
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-
 active_websockets_by_user_id: Dict[str, WebSocket] = {}
 active_websockets_by_fokontany: Dict[int, Set[str]] = {}
 active_websockets_by_role: Dict[str, Set[str]] = {
@@ -83,8 +105,7 @@ async def get_user_data_from_token(token: str):
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_email = payload.get("sub")
         if user_email is None: return None
-        response = supabase.table("utilisateurs").select("id, role, fokontany_id, nom, prenom").eq("email", user_email).single().execute()
-        return response.data if response.data else None
+        return await users_repository.get_session_by_email(user_email)
     except JWTError as e:
         print(f"Erreur JWT: {e}")
         return None
@@ -163,7 +184,8 @@ async def _broadcast_panic_alert_impl(incident_data: dict, sender_id: str):
     fokontany_id_incident = incident_data.get('fokontany_id')
     if fokontany_id_incident:
         try:
-            res_chefs_fokontany_db = supabase.table("utilisateurs").select("id").eq("role", "CHEF_FOKONTANY").eq("fokontany_id", fokontany_id_incident).execute()
+            client = await async_supabase.get()
+            res_chefs_fokontany_db = await client.table("utilisateurs").select("id").eq("role", "CHEF_FOKONTANY").eq("fokontany_id", fokontany_id_incident).execute()
             if res_chefs_fokontany_db.data:
                 chefs_fokontany_incident_db_ids = {u['id'] for u in res_chefs_fokontany_db.data}
                 connected_and_relevant_chefs = active_websockets_by_role.get("CHEF_FOKONTANY", set()).intersection(chefs_fokontany_incident_db_ids)
@@ -188,6 +210,61 @@ async def _broadcast_panic_alert_impl(incident_data: dict, sender_id: str):
 
 socket_events.broadcast_panic_alert = _broadcast_panic_alert_impl
 
+async def _broadcast_spike_alert_impl(alert: dict):
+    # Autorités locales et chefs du Fokontany concerné
+    users_to_notify = set(active_websockets_by_role.get("AUTORITE_LOCALE", set()))
+    users_to_notify.update(active_websockets_by_fokontany.get(alert.get("fokontany_id"), set()).intersection(
+        active_websockets_by_role.get("CHEF_FOKONTANY", set())
+    ))
+    message_id = str(uuid.uuid4())
+    for user_id in users_to_notify:
+        websocket = active_websockets_by_user_id.get(user_id)
+        if websocket:
+            try:
+                await websocket.send_json({"type": "spike_alert", "data": alert, "message_id": message_id})
+            except Exception as e:
+                print(f"Erreur envoi WebSocket à {user_id}: {e}")
+    print(f"Alerte de pic diffusée à {len(users_to_notify)} utilisateurs.")
+
+socket_events.broadcast_spike_alert = _broadcast_spike_alert_impl
+
+def warm_up():
+    """
+    Préchauffage hors du chemin de démarrage : client Supabase, tables de référence,
+    état du détecteur de pics et schéma OpenAPI sont prêts avant les premières requêtes.
+    """
+    steps = [
+        ("supabase client", supabase.get),
+        ("reference data", reference_data.warm),
+        ("spike detector", spikes.spike_detector.rebuild),
+        ("openapi schema", app.openapi),
+    ]
+    for label, step in steps:
+        try:
+            step()
+        except Exception as e:
+            print(f"ERROR during warm-up ({label}): {e}")
+
+@app.on_event("startup")
+def start_background_writers():
+    jobs.start_jobs()
+    # Les alertes de pic partent des threads des routes vers la boucle de l'application
+    spikes.bind_event_loop(asyncio.get_running_loop())
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+@app.on_event("shutdown")
+def stop_background_writers():
+    jobs.stop_jobs()
+    try:
+        # Les durées de résolution pas encore fusionnées en base
+        resolution_sketches.flush()
+    except Exception as e:
+        print(f"ERROR flushing resolution sketches: {e}")
+
+@app.on_event("shutdown")
+async def close_database_pools():
+    await postgres.close()
+
 @app.get("/", tags=["Root"])
 def read_root():
     return {"message": "Bienvenue sur l'API de Gestion des Incidents de Fianarantsoa!"}
@@ -9,13 +9,16 @@ from ..schemas.admin_management import (
     PosteSecuriteResponse, PosteSecuriteCreate, PosteSecuriteUpdate,
     AdminUserCreate, AdminUserUpdate # NOUVEAUX IMPORTS
 )
-from datetime import date, datetime, timedelta, timezone
 from ..utils.email_sender import send_account_validated_to_user
 from ..utils.security import hash_password # NOUVEL IMPORT
+from ..utils.serialization import fast_list_response, prepare
+from ..utils import metrics
+from ..utils.reference_data import reference_data
+from ..utils.kpis import kpis
 from uuid import UUID
-import dns.resolver # NOUVEAU: Import pour la vérification DNS
 
 router = APIRouter()
+prepare(UserResponse)
 
 # --- Routes de gestion de la validation (existantes) ---
 @router.get("/users/pending-validation",
@@ -29,7 +32,7 @@ def get_users_to_validate(role: Optional[str] = None):
         if role:
             query = query.eq("role", role)
         response = query.execute()
-        return response.data
+        return fast_list_response(UserResponse, response.data)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
@@ -44,6 +47,7 @@ def validate_user_account(user_id: UUID, background_tasks: BackgroundTasks, curr
         if not response.data:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Utilisateur ID {user_id} non trouvé.")
         validated_user = response.data[0]
+        kpis.refresh_users()
         background_tasks.add_task(
             send_account_validated_to_user,
             user_email=validated_user.get("email")
@@ -64,6 +68,7 @@ def reject_user_account(user_id: UUID, current_admin: UserResponse = Depends(get
         
         # On doit aussi le supprimer de `auth.users`
         supabase.auth.admin.delete_user(str(user_id))
+        kpis.refresh_users()
         return
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
@@ -76,7 +81,7 @@ def list_all_users(current_user: UserResponse = Depends(get_current_admin_user))
     """
     try:
         response = supabase.table("utilisateurs").select("*, postes_securite(nom_poste), fokontany(nom_fokontany)").order("nom").execute()
-        return response.data
+        return fast_list_response(UserResponse, response.data)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -101,6 +106,7 @@ def create_user_by_admin(user_data: AdminUserCreate, current_user: UserResponse
             supabase.auth.admin.delete_user(auth_response.user.id)
             raise HTTPException(status_code=500, detail="Échec de la mise à jour du profil public.")
 
+        kpis.refresh_users()
         return update_response.data[0]
     except Exception as e:
         if "duplicate key value" in str(e):
@@ -123,6 +129,7 @@ def update_user_by_admin(user_id: UUID, user_data: AdminUserUpdate, current_user
         response = supabase.table("utilisateurs").update(update_dict).eq("id", user_id).execute()
         if not response.data:
             raise HTTPException(status_code=404, detail="Utilisateur non trouvé.")
+        kpis.refresh_users()
         return response.data[0]
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur de base de données : {e}")
@@ -137,38 +144,28 @@ def delete_user_by_admin(user_id: UUID, current_user: UserResponse = Depends(get
         if "User not found" in str(e):
              raise HTTPException(status_code=404, detail="Utilisateur non trouvé.")
         raise HTTPException(status_code=500, detail=f"Erreur lors de la suppression: {str(e)}")
+    kpis.refresh_users()
 
 @router.get("/kpis",
             response_model=AdminKPIsResponse,
             summary="Récupérer les KPIs pour le tableau de bord de l'administrateur")
 def get_admin_kpis(current_admin: UserResponse = Depends(get_current_admin_user)):
-    # ... (code inchangé)
     try:
-        pending_users_res = supabase.table("utilisateurs").select("id", count='exact').eq("est_verifie", False).execute()
-        utilisateurs_en_attente = pending_users_res.count or 0
-        
-        total_incidents_res = supabase.table("incidents").select("id", count='exact').execute()
-        incidents_total = total_incidents_res.count or 0
-        
-        today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0).isoformat()
-        today_end = (datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)).isoformat()
-        today_incidents_res = supabase.table("incidents").select("id", count='exact').gte("date_signalement", today_start).lt("date_signalement", today_end).execute()
-        incidents_aujourdhui = today_incidents_res.count or 0
-        
-        return AdminKPIsResponse(
-            utilisateurs_en_attente=utilisateurs_en_attente,
-            incidents_total=incidents_total,
-            incidents_aujourdhui=incidents_aujourdhui
-        )
+        # Compteurs en mémoire (voir utils/kpis.py) : aucune requête de comptage par appel
+        return AdminKPIsResponse(**kpis.admin())
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
+@router.get("/metrics", summary="Exporter les métriques internes (caches, ETag, ...)")
+def get_metrics(current_admin: UserResponse = Depends(get_current_admin_user)):
+    """Retourne un instantané des compteurs internes du processus."""
+    return metrics.snapshot()
+
 @router.get("/fokontany", response_model=List[FokontanyResponse], summary="Lister tous les Fokontany")
 def list_fokontany(current_user: UserResponse = Depends(get_current_admin_user)):
     # ... (code inchangé)
     try:
-        response = supabase.table("fokontany").select("*").order("nom_fokontany").execute()
-        return response.data
+        return reference_data.all("fokontany")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -177,6 +174,7 @@ def create_fokontany(fokontany: FokontanyCreate, current_user: UserResponse = De
     # ... (code inchangé)
     try:
         response = supabase.table("fokontany").insert(fokontany.model_dump()).execute()
+        reference_data.invalidate("fokontany")
         return response.data[0]
     except Exception as e:
         if "duplicate key value" in str(e):
@@ -190,6 +188,7 @@ def update_fokontany(fokontany_id: int, fokontany: FokontanyUpdate, current_user
         response = supabase.table("fokontany").update(fokontany.model_dump(exclude_unset=True)).eq("id", fokontany_id).execute()
         if not response.data:
             raise HTTPException(status_code=404, detail="Fokontany non trouvé.")
+        reference_data.invalidate("fokontany")
         return response.data[0]
     except Exception as e:
         if "duplicate key value" in str(e):
@@ -203,6 +202,7 @@ def delete_fokontany(fokontany_id: int, current_user: UserResponse = Depends(get
         response = supabase.table("fokontany").delete().eq("id", fokontany_id).execute()
         if not response.data:
             raise HTTPException(status_code=404, detail="Fokontany non trouvé.")
+        reference_data.invalidate("fokontany")
     except Exception as e:
         if "foreign key constraint" in str(e):
             raise HTTPException(status_code=409, detail="Impossible de supprimer ce Fokontany car il est lié à des utilisateurs ou des incidents.")
@@ -214,8 +214,7 @@ def delete_fokontany(fokontany_id: int, current_user: UserResponse = Depends(get
 def list_postes(current_user: UserResponse = Depends(get_current_admin_user)):
     # ... (code inchangé)
     try:
-        response = supabase.table("postes_securite").select("*").order("nom_poste").execute()
-        return response.data
+        return reference_data.all("postes_securite")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -224,6 +223,7 @@ def create_poste(poste: PosteSecuriteCreate, current_user: UserResponse = Depend
     # ... (code inchangé)
     try:
         response = supabase.table("postes_securite").insert(poste.model_dump()).execute()
+        reference_data.invalidate("postes_securite")
         return response.data[0]
     except Exception as e:
         if "duplicate key value" in str(e):
@@ -237,6 +237,7 @@ def update_poste(poste_id: int, poste: PosteSecuriteUpdate, current_user: UserRe
         response = supabase.table("postes_securite").update(poste.model_dump(exclude_unset=True)).eq("id", poste_id).execute()
         if not response.data:
             raise HTTPException(status_code=404, detail="Poste de sécurité non trouvé.")
+        reference_data.invalidate("postes_securite")
         return response.data[0]
     except Exception as e:
         if "duplicate key value" in str(e):
@@ -250,6 +251,7 @@ def delete_poste(poste_id: int, current_user: UserResponse = Depends(get_current
         response = supabase.table("postes_securite").delete().eq("id", poste_id).execute()
         if not response.data:
             raise HTTPException(status_code=404, detail="Poste de sécurité non trouvé.")
+        reference_data.invalidate("postes_securite")
     except Exception as e:
         if "foreign key constraint" in str(e):
             raise HTTPException(status_code=409, detail="Impossible de supprimer ce poste car il est lié à des utilisateurs ou des types d'incidents.")
@@ -9,6 +9,7 @@ import secrets
 from datetime import datetime, timedelta, timezone
 import hashlib
 from ..utils.dependencies import get_current_user_data 
+from ..utils.kpis import kpis
 router = APIRouter()
 
 @router.post("/register",
@@ -75,6 +76,7 @@ def register_user(user: UserCreate, background_tasks: BackgroundTasks):
 
         # Envoyer l'e-mail de notification si nécessaire
         if not finalized_user.get("est_verifie"):
+            kpis.refresh_users()
             # (Votre code d'envoi d'e-mail reste le même)
             admin_email = "giffmada@gmail.com" 
             background_tasks.add_task(
@@ -1,39 +1,42 @@
 # CHEMIN : backend/app/routers/authority.py
 # Fichier complet et re-corrigé
 
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query
+from typing import List, Optional
 from ..database.database import supabase
+from ..database.repositories import incidents_repository
 from ..utils.dependencies import role_checker
-from ..schemas.incidents import IncidentResponse
+from ..schemas.incidents import (
+    IncidentResponse, IncidentBaseResponse, IncidentFilters,
+    BulkIncidentIds, BulkAssignRequest, BulkActionResponse
+)
 from ..schemas.users import UserResponse
-from ..utils.email_sender import send_assignment_to_security
+from ..schemas.stats import AgentPerformancePage
+from ..utils.email_sender import send_assignment_to_security, send_assignments_digest_to_security
+from ..utils.transitions import apply_transition, apply_bulk_transition
+from ..utils.incident_queries import INCIDENT_LIST_SELECT, apply_incident_filters
+from ..utils.exports import EXPORT_FORMATS, keyset_pages, ndjson_lines, csv_lines, export_response
+from ..utils.serialization import row_projector
+from ..utils.incident_payloads import IncidentPayloadOptions, incident_payload_options
+from ..utils.loaders import Loaders, request_loaders
 from uuid import UUID
-from datetime import datetime
+from datetime import datetime, date, timedelta
 
 router = APIRouter()
 get_current_authority_user = role_checker("AUTORITE_LOCALE")
 
-def log_status_change(incident_id: int, old_status: str, new_status: str, user_id: UUID):
-    """Enregistre un changement de statut dans la table historiquestatuts."""
-    try:
-        supabase.table("historiquestatuts").insert({
-            "incident_id": incident_id,
-            "ancien_statut": old_status,
-            "nouveau_statut": new_status,
-            "modifie_par_id": str(user_id)
-        }).execute()
-    except Exception as e:
-        print(f"ERROR logging status change for incident {incident_id}: {e}")
+INCIDENT_CSV_COLUMNS = [*IncidentBaseResponse.model_fields, "nom_fokontany", "nom_type"]
 
 @router.get("/incidents/pending",
             response_model=List[IncidentResponse],
             summary="Lister les incidents en attente de validation")
-def get_pending_incidents(current_user: UserResponse = Depends(get_current_authority_user)):
+async def get_pending_incidents(
+    payload: IncidentPayloadOptions = Depends(incident_payload_options),
+    current_user: UserResponse = Depends(get_current_authority_user)
+):
     try:
-        query = "*, fokontany:fokontany_id(*), typesincident:type_id(*)"
-        response = supabase.table("incidents").select(query).in_("statut", ["NOUVEAU", "URGENT"]).order("date_signalement", desc=True).execute()
-        return response.data
+        filters = IncidentFilters(statut=["NOUVEAU", "URGENT"])
+        return await payload.render_async(await incidents_repository.list(filters, payload.columns()))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -41,38 +44,120 @@ def get_pending_incidents(current_user: UserResponse = Depends(get_current_autho
 @router.get("/incidents/all",
             response_model=List[IncidentResponse],
             summary="Lister tous les incidents du système pour l'Autorité Locale")
-def get_all_incidents(current_user: UserResponse = Depends(get_current_authority_user)):
+async def get_all_incidents(
+    payload: IncidentPayloadOptions = Depends(incident_payload_options),
+    current_user: UserResponse = Depends(get_current_authority_user)
+):
     """Permet à une autorité locale de voir tous les incidents de la base de données."""
     try:
-        response = supabase.table("incidents").select(
-            "*, fokontany:fokontany_id(*), typesincident:type_id(*)"
-        ).order("date_signalement", desc=True).execute()
-        return response.data
+        return await payload.render_async(await incidents_repository.list(IncidentFilters(), payload.columns()))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _flatten_incident(row: dict) -> dict:
+    """Ligne CSV : champs de l'incident plus les noms de fokontany et de type."""
+    flat = dict(row)
+    flat["nom_fokontany"] = (row.get("fokontany") or {}).get("nom_fokontany")
+    flat["nom_type"] = (row.get("typesincident") or {}).get("nom_type")
+    return flat
+
+@router.get("/incidents/export",
+            summary="Exporter les incidents en streaming (NDJSON ou CSV)")
+def export_incidents(
+    export_format: str = Query("ndjson", alias="format", enum=EXPORT_FORMATS),
+    statut: Optional[List[str]] = Query(None, description="Filtrer par statut(s)"),
+    type_id: Optional[int] = Query(None, description="Filtrer par type d'incident"),
+    fokontany_id: Optional[int] = Query(None, description="Filtrer par fokontany"),
+    start_date: Optional[date] = Query(None, description="Date de début pour le filtre"),
+    end_date: Optional[date] = Query(None, description="Date de fin pour le filtre"),
+    current_user: UserResponse = Depends(get_current_authority_user)
+):
+    """
+    Exporte les incidents filtrés page par page (pagination sur l'ID) :
+    la mémoire utilisée reste constante quelle que soit la taille de l'export.
+    """
+    filters = IncidentFilters(
+        statut=[s.upper() for s in statut] if statut else None,
+        type_id=type_id,
+        fokontany_id=fokontany_id,
+        start_date=start_date,
+        end_date=end_date
+    )
+    rows = keyset_pages(lambda: apply_incident_filters(supabase.table("incidents").select(INCIDENT_LIST_SELECT), filters))
+    if export_format == "csv":
+        lines = csv_lines(rows, INCIDENT_CSV_COLUMNS, _flatten_incident)
+    else:
+        lines = ndjson_lines(rows, row_projector(IncidentResponse))
+    return export_response(lines, export_format, "incidents")
+
+def _bulk_response(results: list) -> BulkActionResponse:
+    succeeded = sum(1 for r in results if r["success"])
+    return BulkActionResponse(succeeded=succeeded, failed=len(results) - succeeded, results=results)
+
+@router.post("/incidents/bulk/validate",
+             response_model=BulkActionResponse,
+             summary="Valider plusieurs incidents en une fois")
+def bulk_validate_incidents(payload: BulkIncidentIds, current_user: UserResponse = Depends(get_current_authority_user)):
+    try:
+        results, _ = apply_bulk_transition([{"incident_id": i} for i in payload.incident_ids], "VALIDE", current_user.id)
+        return _bulk_response(results)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/incidents/bulk/reject",
+             response_model=BulkActionResponse,
+             summary="Rejeter plusieurs incidents en une fois")
+def bulk_reject_incidents(payload: BulkIncidentIds, current_user: UserResponse = Depends(get_current_authority_user)):
+    try:
+        results, _ = apply_bulk_transition([{"incident_id": i} for i in payload.incident_ids], "REJETE", current_user.id)
+        return _bulk_response(results)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/incidents/bulk/assign",
+             response_model=BulkActionResponse,
+             summary="Assigner plusieurs incidents (paires incident / agent) en une fois")
+def bulk_assign_incidents(
+    payload: BulkAssignRequest,
+    background_tasks: BackgroundTasks,
+    current_user: UserResponse = Depends(get_current_authority_user),
+    loaders: Loaders = Depends(request_loaders)
+):
+    """Les emails d'assignation sont regroupés : un seul email par agent."""
+    try:
+        items = [{"incident_id": a.incident_id, "assigne_a_id": str(a.agent_id)} for a in payload.assignments]
+        results, updated = apply_bulk_transition(items, "ASSIGNE", current_user.id)
+
+        incidents_by_agent = {}
+        for incident in updated:
+            incidents_by_agent.setdefault(incident["assigne_a_id"], []).append(incident)
+        for agent_id, agent in loaders.users.load_many(incidents_by_agent).items():
+            if agent:
+                background_tasks.add_task(
+                    send_assignments_digest_to_security,
+                    agent_email=agent["email"],
+                    incidents=incidents_by_agent[agent_id]
+                )
+        return _bulk_response(results)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/incidents/{incident_id}/validate",
              response_model=IncidentResponse,
              summary="Valider un incident")
 def validate_incident(incident_id: int, current_user: UserResponse = Depends(get_current_authority_user)):
     try:
-        incident_to_validate_res = supabase.table("incidents").select("statut").eq("id", incident_id).in_("statut", ["NOUVEAU", "URGENT"]).single().execute()
-        if not incident_to_validate_res.data:
-            raise HTTPException(status_code=404, detail="Incident non trouvé, déjà traité ou ne peut être validé.")
-        
-        old_status = incident_to_validate_res.data['statut']
-
-        # FIX: Étape 1 - Mettre à jour le statut
-        update_response = supabase.table("incidents").update({"statut": "VALIDE"}).eq("id", incident_id).execute()
-        if not update_response.data:
-            raise HTTPException(status_code=404, detail="La validation de l'incident a échoué.")
-        
-        # FIX: Étape 2 - Récupérer l'objet complet pour le retour
-        response = supabase.table("incidents").select("*, fokontany:fokontany_id(*), typesincident:type_id(*)").eq("id", incident_id).single().execute()
-
-        log_status_change(incident_id, old_status, "VALIDE", current_user.id)
-        return response.data
+        incident, _ = apply_transition(incident_id, "VALIDE", current_user.id)
+        return incident
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -81,22 +166,10 @@ def validate_incident(incident_id: int, current_user: UserResponse = Depends(get
              summary="Rejeter un incident")
 def reject_incident(incident_id: int, current_user: UserResponse = Depends(get_current_authority_user)):
     try:
-        incident_to_reject_res = supabase.table("incidents").select("statut").eq("id", incident_id).in_("statut", ["NOUVEAU", "URGENT"]).single().execute()
-        if not incident_to_reject_res.data:
-            raise HTTPException(status_code=404, detail="Incident non trouvé, déjà traité ou ne peut être rejeté.")
-        
-        old_status = incident_to_reject_res.data['statut']
-
-        # FIX: Étape 1 - Mettre à jour
-        update_response = supabase.table("incidents").update({"statut": "REJETE"}).eq("id", incident_id).execute()
-        if not update_response.data:
-            raise HTTPException(status_code=404, detail="Le rejet de l'incident a échoué.")
-
-        # FIX: Étape 2 - Récupérer l'objet complet
-        response = supabase.table("incidents").select("*, fokontany:fokontany_id(*), typesincident:type_id(*)").eq("id", incident_id).single().execute()
-
-        log_status_change(incident_id, old_status, "REJETE", current_user.id)
-        return response.data
+        incident, _ = apply_transition(incident_id, "REJETE", current_user.id)
+        return incident
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -107,47 +180,60 @@ def assign_incident(
     incident_id: int,
     agent_id: UUID,
     background_tasks: BackgroundTasks,
-    current_user: UserResponse = Depends(get_current_authority_user)
+    current_user: UserResponse = Depends(get_current_authority_user),
+    loaders: Loaders = Depends(request_loaders)
 ):
     try:
-        incident_res = supabase.table("incidents").select("statut").eq("id", incident_id).single().execute()
-        if not incident_res.data:
-            raise HTTPException(status_code=404, detail="L'incident à assigner est introuvable.")
-        
-        current_status = incident_res.data['statut']
-        if current_status not in ["NOUVEAU", "URGENT", "VALIDE"]:
-            raise HTTPException(status_code=400, detail=f"Impossible d'assigner un incident avec le statut '{current_status}'.")
-
-        update_data = {
-            "statut": "ASSIGNE",
+        assigned_incident, _ = apply_transition(incident_id, "ASSIGNE", current_user.id, changes={
             "assigne_a_id": str(agent_id),
             "date_assignation": datetime.now().isoformat()
-        }
-
-        # FIX: Étape 1 - Mettre à jour l'incident
-        update_response = supabase.table("incidents").update(update_data).eq("id", incident_id).execute()
-        if not update_response.data:
-            raise HTTPException(status_code=404, detail="Échec de l'assignation. L'incident n'a pas pu être mis à jour.")
-
-        # FIX: Étape 2 - Récupérer l'incident mis à jour avec toutes ses données
-        assign_response = supabase.table("incidents").select("*, typesincident(*), fokontany(*)").eq("id", incident_id).single().execute()
-        if not assign_response.data:
-             raise HTTPException(status_code=404, detail="Impossible de récupérer l'incident après l'assignation.")
-        
-        assigned_incident = assign_response.data
-        
-        log_status_change(incident_id, current_status, "ASSIGNE", current_user.id)
-
-        agent_response = supabase.table("utilisateurs").select("email").eq("id", str(agent_id)).single().execute()
-        if agent_response.data:
-            agent_email = agent_response.data['email']
+        })
+
+        agent = loaders.users.load(str(agent_id))
+        if agent:
             background_tasks.add_task(
                 send_assignment_to_security,
-                agent_email=agent_email,
+                agent_email=agent["email"],
                 incident_title=assigned_incident['titre'],
                 incident_id=assigned_incident['id']
             )
             
         return assigned_incident
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+# --- Performance des agents (compteurs maintenus par trigger, voir *_agent_performance.sql) ---
+AGENT_SORT_FIELDS = ["missions_ouvertes", "resolus", "non_resolus", "premiere_action_moyenne_heures", "resolution_moyenne_heures"]
+
+@router.get("/agents/performance",
+            response_model=AgentPerformancePage,
+            summary="Charge et rendement des agents de sécurité, triés et paginés")
+def get_agents_performance(
+    start_date: Optional[date] = Query(None, description="Début de la période des clôtures (défaut : 30 derniers jours)"),
+    end_date: Optional[date] = Query(None),
+    sort: str = Query("missions_ouvertes", enum=AGENT_SORT_FIELDS),
+    order: str = Query("desc", enum=["asc", "desc"]),
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    current_user: UserResponse = Depends(get_current_authority_user)
+):
+    """
+    Missions ouvertes, clôtures (résolues / non résolues) sur la période, délais moyens
+    de première action et de résolution. Lecture de compteurs : aucun parcours des incidents.
+    """
+    effective_end_date = end_date or date.today()
+    effective_start_date = start_date or (effective_end_date - timedelta(days=29))
+    try:
+        response = supabase.rpc("agent_performance_page", {
+            "p_start": effective_start_date.isoformat(),
+            "p_end": effective_end_date.isoformat(),
+            "p_sort": sort,
+            "p_desc": order == "desc",
+            "p_limit": limit,
+            "p_offset": offset
+        }).execute()
+        return response.data or {"total": 0, "items": []}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,7 +1,8 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel
-from ..database.database import supabase
+from ..utils.etag import versioned_etag
+from ..utils.reference_data import reference_data, REFERENCE_CACHE_CONTROL
 
 router = APIRouter()
 
@@ -15,17 +16,14 @@ class FokontanyResponse(BaseModel):
 
 @router.get("/", 
             response_model=List[FokontanyResponse], 
-            summary="Récupérer la liste de tous les fokontany")
+            summary="Récupérer la liste de tous les fokontany",
+            dependencies=[Depends(versioned_etag("fokontany", cache_control=REFERENCE_CACHE_CONTROL))])
 def get_all_fokontany():
     """
     Endpoint pour lister tous les fokontany.
     """
     try:
-        # CORRECTION : La requête sélectionne les nouvelles colonnes
-        response = supabase.table("fokontany").select("id, nom_fokontany, latitude, longitude, radius").execute()
-        if not response.data:
-            return []
-        return response.data
+        return reference_data.all("fokontany")
     except Exception as e:
         print(f"Error fetching fokontany: {e}")
         raise HTTPException(
@@ -35,16 +33,19 @@ def get_all_fokontany():
 
 @router.get("/{fokontany_id}",
             response_model=FokontanyResponse,
-            summary="Récupérer les détails d'un Fokontany spécifique")
+            summary="Récupérer les détails d'un Fokontany spécifique",
+            dependencies=[Depends(versioned_etag("fokontany", cache_control=REFERENCE_CACHE_CONTROL))])
 def get_fokontany_by_id(fokontany_id: int):
     """
     Retourne les détails complets d'un Fokontany, y compris ses coordonnées centrales et son rayon.
     """
     try:
-        response = supabase.table("fokontany").select("*").eq("id", fokontany_id).single().execute()
-        if not response.data:
+        fokontany = reference_data.get("fokontany", fokontany_id)
+        if not fokontany:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Fokontany non trouvé.")
-        return response.data
+        return fokontany
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching fokontany by ID: {e}")
         raise HTTPException(
@@ -1,62 +1,93 @@
 # D:\...\backend\app\routers\history.py
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from ..database.database import supabase
 from ..schemas.users import UserResponse
 from ..schemas.history import HistoryLogItem
 from ..utils.dependencies import role_checker
-from typing import List
+from ..utils.exports import EXPORT_FORMATS, keyset_pages, ndjson_lines, csv_lines, export_response
+from ..utils.cursors import encode_cursor, decode_cursor, keyset_filter
+from typing import List, Optional
+from uuid import UUID
+from datetime import date
 
 router = APIRouter()
 get_current_authority_user = role_checker("AUTORITE_LOCALE")
 
+# Les champs d'affichage (titre, "Nom Prénom - (Rôle)") sont renseignés à l'écriture par un trigger
+HISTORY_SELECT = "id, date_changement, ancien_statut, nouveau_statut, incident_titre, modifie_par_nom"
+HISTORY_EXPORT_COLUMNS = ["id", "date_changement", "incident_title", "modified_by_name", "old_status", "new_status"]
+
+def format_history_item(item: dict) -> dict:
+    """Construit une entrée d'historique à partir des champs d'affichage dénormalisés."""
+    return {
+        "id": item['id'],
+        "date_changement": item['date_changement'],
+        "incident_title": item.get('incident_titre') or 'Incident Inconnu',
+        "modified_by_name": item.get('modifie_par_nom') or 'Utilisateur Inconnu',
+        "old_status": item['ancien_statut'],
+        "new_status": item['nouveau_statut']
+    }
+
 @router.get("/",
             response_model=List[HistoryLogItem],
-            summary="Récupérer l'historique de toutes les actions de changement de statut")
-def get_action_history(current_user: UserResponse = Depends(get_current_authority_user)):
+            summary="Récupérer l'historique des changements de statut (paginé, plus récent d'abord)")
+def get_action_history(
+    response: Response,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="Valeur de l'en-tête X-Next-Cursor de la page précédente"),
+    incident_id: Optional[int] = Query(None, description="Filtrer par incident"),
+    user_id: Optional[UUID] = Query(None, description="Filtrer par auteur de la modification"),
+    statut: Optional[str] = Query(None, description="Filtrer par nouveau statut"),
+    start_date: Optional[date] = Query(None, description="Date de début pour le filtre"),
+    end_date: Optional[date] = Query(None, description="Date de fin pour le filtre"),
+    current_user: UserResponse = Depends(get_current_authority_user)
+):
     """
-    Retourne une liste de toutes les actions enregistrées dans la table `historiquestatuts`.
-    Chaque entrée est enrichie avec le titre de l'incident et le nom de l'utilisateur
-    qui a effectué la modification.
+    Retourne une page de la table `historiquestatuts`, du plus récent au plus ancien,
+    avec pagination par clé (date_changement, id) : le coût dépend de la taille de la page,
+    pas de la longueur de l'historique. La page suivante est indiquée par l'en-tête
+    `X-Next-Cursor` (absent sur la dernière page).
     """
     try:
-        # --- MODIFICATION DE LA REQUÊTE ---
-        # On ajoute 'role' à la sélection de l'utilisateur.
-        response = supabase.table("historiquestatuts").select(
-        "id, date_changement, ancien_statut, nouveau_statut, "
-        "incident:incidents(titre), "
-        "user:utilisateurs!modifie_par_id(nom, prenom, role)"
-        ).order("date_changement", desc=False).execute()
-
-
-        if not response.data:
-            return []
-
-        formatted_history = []
-        for item in response.data:
-            user_info = item.get('user')
-            incident_info = item.get('incident')
-            
-            # --- MODIFICATION DU FORMATAGE ---
-            # On construit la chaîne "Prénom Nom (Rôle)"
-            modified_by_str = 'Utilisateur Inconnu'
-            if user_info:
-                user_role = user_info.get('role', 'Rôle Inconnu')
-                modified_by_str = f"{user_info.get('nom', '')} {user_info.get('prenom', '')} - ({user_role})".strip()
-
-
-            formatted_item = {
-                "id": item['id'],
-                "date_changement": item['date_changement'],
-                "incident_title": incident_info.get('titre', 'Incident Inconnu') if incident_info else 'Incident Inconnu',
-                "modified_by_name": modified_by_str, # <-- Utilisation de la nouvelle chaîne
-                "old_status": item['ancien_statut'],
-                "new_status": item['nouveau_statut']
-            }
-            formatted_history.append(HistoryLogItem(**formatted_item))
-
-        return formatted_history
+        query = supabase.table("historiquestatuts").select(HISTORY_SELECT)
+        if incident_id:
+            query = query.eq("incident_id", incident_id)
+        if user_id:
+            query = query.eq("modifie_par_id", str(user_id))
+        if statut:
+            query = query.eq("nouveau_statut", statut.upper())
+        if start_date:
+            query = query.gte("date_changement", str(start_date))
+        if end_date:
+            query = query.lte("date_changement", str(end_date) + "T23:59:59")
+        if cursor:
+            position = decode_cursor(cursor, d="timestamp", i="int")
+            query = query.or_(keyset_filter("date_changement", position["d"], "id", position["i"], descending=True))
+
+        rows = query.order("date_changement", desc=True).order("id", desc=True).limit(limit + 1).execute().data or []
+        if len(rows) > limit:
+            rows = rows[:limit]
+            response.headers["X-Next-Cursor"] = encode_cursor({"d": rows[-1]["date_changement"], "i": rows[-1]["id"]})
 
+        return [HistoryLogItem(**format_history_item(item)) for item in rows]
+
+    except HTTPException:
+        raise
     except Exception as e:
         print(e)
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.get("/export",
+            summary="Exporter l'historique en streaming (NDJSON ou CSV)")
+def export_action_history(
+    export_format: str = Query("ndjson", alias="format", enum=EXPORT_FORMATS),
+    current_user: UserResponse = Depends(get_current_authority_user)
+):
+    """Exporte tout l'historique page par page, sans le charger entièrement en mémoire."""
+    rows = keyset_pages(lambda: supabase.table("historiquestatuts").select(HISTORY_SELECT))
+    if export_format == "csv":
+        lines = csv_lines(rows, HISTORY_EXPORT_COLUMNS, format_history_item)
+    else:
+        lines = ndjson_lines(rows, format_history_item)
+    return export_response(lines, export_format, "historique")
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from typing import List
 from ..database.database import supabase
+from ..utils.reference_data import reference_data
 from ..utils.dependencies import get_current_admin_user
 from ..schemas.users import UserResponse
 from ..schemas.incident_types import IncidentTypeCreate, IncidentTypeUpdate, IncidentTypeResponse
@@ -13,8 +14,7 @@ router = APIRouter()
 def get_all_incident_types(current_admin: UserResponse = Depends(get_current_admin_user)):
     """Récupère la liste complète des types d'incidents."""
     try:
-        response = supabase.table("typesincident").select("*").order("nom_type").execute()
-        return response.data
+        return reference_data.all("typesincident")
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
@@ -28,6 +28,7 @@ def create_incident_type(type_data: IncidentTypeCreate, current_admin: UserRespo
         response = supabase.table("typesincident").insert(type_data.model_dump()).execute()
         if not response.data:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="La création a échoué.")
+        reference_data.invalidate("typesincident")
         return response.data[0]
     except Exception as e:
         # Gère le cas où le nom du type existe déjà (contrainte UNIQUE)
@@ -47,6 +48,7 @@ def update_incident_type(type_id: int, type_update: IncidentTypeUpdate, current_
         response = supabase.table("typesincident").update(update_data).eq("id", type_id).execute()
         if not response.data:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Type d'incident ID {type_id} non trouvé.")
+        reference_data.invalidate("typesincident")
         return response.data[0]
     except Exception as e:
         if "duplicate key value" in str(e):
@@ -62,6 +64,7 @@ def delete_incident_type(type_id: int, current_admin: UserResponse = Depends(get
         response = supabase.table("typesincident").delete().eq("id", type_id).execute()
         if not response.data:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Type d'incident ID {type_id} non trouvé.")
+        reference_data.invalidate("typesincident")
     except Exception as e:
         # Gère l'erreur de contrainte de clé étrangère
         if "foreign key constraint" in str(e):
@@ -4,33 +4,82 @@ from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks,
 from typing import List, Optional
 from pydantic import BaseModel
 from ..database.database import supabase
+from ..database.repositories import incidents_repository
 from ..utils.dependencies import get_current_user_data, role_checker
 from ..schemas.incidents import (
     IncidentCreate,
     IncidentUpdate,
     IncidentResponse,
     IncidentDetailResponse,
-    IncidentTypeResponse
+    IncidentTypeResponse,
+    IncidentFilters,
+    IncidentFacetsResponse,
+    IncidentBaseResponse,
+    IncidentSyncResponse
 )
 from ..schemas.users import UserResponse
 from ..utils.email_sender import send_new_incident_notification, send_panic_alert_notification
-from ..utils import socket_events
-from datetime import date
+from ..utils import socket_events, incident_events
+from ..utils.etag import versioned_etag, current_versions, on_version_change
+from ..utils import metrics
+from ..utils.cursors import encode_cursor, decode_cursor, keyset_filter
+from ..utils.cache import TTLCache
+from ..utils.reference_data import reference_data, REFERENCE_CACHE_CONTROL
+from ..utils.incident_queries import incident_filters_rpc_params
+from ..utils.incident_payloads import IncidentPayloadOptions, incident_payload_options
+from ..utils.loaders import Loaders, UserScope, request_loaders
+from ..utils.serialization import fast_response, prepare, encode_json
+from datetime import date, datetime, timedelta, timezone
 
 router = APIRouter()
 get_current_fokontany_chief_user = role_checker("CHEF_FOKONTANY")
 
+# Facettes mises en cache par combinaison de filtres
+facets_cache = TTLCache(maxsize=512, ttl=30)
+
+# Détail hydraté des incidents (avant le calcul de can_edit_delete, propre à chaque utilisateur)
+INCIDENT_DETAIL_SELECT = (
+    "*, "
+    "fokontany:fokontany_id(*), "
+    "typesincident:type_id(*), "
+    "piecesjointes(*), "
+    "signale_par:utilisateurs!signale_par_id(prenom, nom), "
+    "assigne_a:utilisateurs!assigne_a_id(prenom, nom), "
+    "rapports_intervention:rapportsintervention(*, redige_par:utilisateurs!redige_par_id(nom, prenom, postes_securite(nom_poste)))"
+)
+detail_cache = TTLCache(maxsize=1000, ttl=300, sizeof=lambda data: len(encode_json(data)))
+metrics.register_gauge("incident_detail_cache", detail_cache.stats)
+
+@incident_events.subscribe
+def _invalidate_incident_detail(event: str, incident: dict, old_status: Optional[str],
+                                previous: Optional[dict] = None) -> None:
+    if incident.get("id") is not None:
+        detail_cache.invalidate(int(incident["id"]))
+
+@on_version_change
+def _clear_incident_details(name: str) -> None:
+    # Écriture vue en base (autre worker, accès direct) : l'incident concerné est inconnu
+    if name == "incidents":
+        detail_cache.clear()
+
+prepare(IncidentDetailResponse, IncidentSyncResponse)
+
+# Synchronisation incrémentale : colonnes renvoyées et marge de sécurité
+# (une transaction encore ouverte peut committer avec un updated_at légèrement passé)
+SYNC_SELECT = ", ".join([*IncidentBaseResponse.model_fields, "updated_at"])
+SYNC_SAFETY_LAG = timedelta(seconds=2)
+
 class PanicPayload(BaseModel):
     latitude: float
     longitude: float
     type_id: int
     fokontany_id: int
 
-@router.get("/types", response_model=List[IncidentTypeResponse])
+@router.get("/types", response_model=List[IncidentTypeResponse],
+            dependencies=[Depends(versioned_etag("typesincident", cache_control=REFERENCE_CACHE_CONTROL))])
 def get_incident_types():
     try:
-        response = supabase.table("typesincident").select("*").execute()
-        return response.data
+        return reference_data.all("typesincident")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -38,7 +87,8 @@ def get_incident_types():
 def create_incident(
     incident: IncidentCreate,
     background_tasks: BackgroundTasks,
-    current_user: UserResponse = Depends(get_current_user_data)
+    current_user: UserResponse = Depends(get_current_user_data),
+    loaders: Loaders = Depends(request_loaders)
 ):
     pieces_jointes_urls = incident.pieces_jointes_urls
     incident_dict = incident.model_dump(exclude={"pieces_jointes_urls"})
@@ -60,29 +110,20 @@ def create_incident(
                 for url in pieces_jointes_urls
             ]).execute()
 
-        fokontany_res = supabase.table("fokontany").select("nom_fokontany").eq("id", fokontany_id).single().execute()
-        fokontany_name = fokontany_res.data['nom_fokontany'] if fokontany_res.data else "Inconnu"
-
-        recipient_emails = set()
-        authorities_res = supabase.table("utilisateurs").select("email").eq("role", "AUTORITE_LOCALE").eq("est_verifie", True).execute()
-        if authorities_res.data:
-            for user in authorities_res.data:
-                recipient_emails.add(user['email'])
+        fokontany_info = reference_data.get("fokontany", fokontany_id)
+        fokontany_name = fokontany_info['nom_fokontany'] if fokontany_info else "Inconnu"
 
-        chief_res = supabase.table("utilisateurs").select("email").eq("role", "CHEF_FOKONTANY").eq("fokontany_id", fokontany_id).eq("est_verifie", True).execute()
-        if chief_res.data:
-            for user in chief_res.data:
-                recipient_emails.add(user['email'])
+        # Autorités, chef et agents du Fokontany : une seule lecture des destinataires
+        recipient_emails = loaders.verified_emails(
+            UserScope("AUTORITE_LOCALE"),
+            UserScope("CHEF_FOKONTANY", fokontany_id),
+            UserScope("SECURITE_URBAINE", fokontany_id),
+        )
 
-        security_res = supabase.table("utilisateurs").select("email").eq("role", "SECURITE_URBAINE").eq("fokontany_id", fokontany_id).eq("est_verifie", True).execute()
-        if security_res.data:
-            for user in security_res.data:
-                recipient_emails.add(user['email'])
-        
         if recipient_emails:
             background_tasks.add_task(
                 send_new_incident_notification,
-                recipient_emails=list(recipient_emails),
+                recipient_emails=recipient_emails,
                 incident_title=created_incident['titre'],
                 incident_id=incident_id,
                 user_name=f"{current_user.prenom} {current_user.nom}",
@@ -90,11 +131,12 @@ def create_incident(
                 fokontany_name=fokontany_name
             )
         
-        enrich_query = supabase.table("incidents").select(
-            "*, fokontany:fokontany_id(*), typesincident:type_id(*)"
-        ).eq("id", incident_id).single().execute()
-        
-        return IncidentResponse(**enrich_query.data)
+        # Références embarquées depuis le cache en mémoire, sans relire l'incident
+        created_incident["fokontany"] = fokontany_info
+        created_incident["typesincident"] = reference_data.get("typesincident", created_incident["type_id"])
+
+        incident_events.publish("created", created_incident)
+        return IncidentResponse(**created_incident)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -102,16 +144,14 @@ def create_incident(
 def trigger_panic_mode(
     payload: PanicPayload,
     background_tasks: BackgroundTasks,
-    current_user: UserResponse = Depends(get_current_user_data)
+    current_user: UserResponse = Depends(get_current_user_data),
+    loaders: Loaders = Depends(request_loaders)
 ):
     if current_user.role not in ["CITOYEN", "CHEF_FOKONTANY"]:
         raise HTTPException(status_code=403, detail="Accès non autorisé.")
     try:
-        type_res = supabase.table("typesincident").select("*").eq("id", payload.type_id).single().execute()
-        type_info = type_res.data or {"nom_type": "Type inconnu", "categorie": ""}
-        
-        fokontany_res = supabase.table("fokontany").select("*").eq("id", payload.fokontany_id).single().execute()
-        fokontany_info = fokontany_res.data or {"nom_fokontany": "Fokontany inconnu"}
+        type_info = reference_data.get("typesincident", payload.type_id) or {"nom_type": "Type inconnu", "categorie": ""}
+        fokontany_info = reference_data.get("fokontany", payload.fokontany_id) or {"nom_fokontany": "Fokontany inconnu"}
 
         panic_data = {
             "titre": f"URGENCE: {type_info['nom_type']}",
@@ -130,6 +170,7 @@ def trigger_panic_mode(
         incident = response.data[0]
         incident["typesincident"] = type_info
         incident["fokontany"] = fokontany_info
+        incident_events.publish("created", incident)
         
         # CORRECTION : On passe l'ID de l'expéditeur à la tâche de diffusion
         background_tasks.add_task(
@@ -138,10 +179,8 @@ def trigger_panic_mode(
             sender_id=str(current_user.id)
         )
         
-        notify_roles = ["AUTORITE_LOCALE", "SECURITE_URBAINE"]
-        notify_users = supabase.table("utilisateurs").select("email").in_("role", notify_roles).eq("est_verifie", True).execute()
-        if notify_users.data:
-            emails = [u["email"] for u in notify_users.data]
+        emails = loaders.verified_emails(UserScope("AUTORITE_LOCALE"), UserScope("SECURITE_URBAINE"))
+        if emails:
             background_tasks.add_task(
                 send_panic_alert_notification,
                 emails=emails,
@@ -155,85 +194,194 @@ def trigger_panic_mode(
 
 # ... (les autres routes restent identiques)
 @router.get("/me", response_model=List[IncidentResponse])
-def get_my_incidents(
+async def get_my_incidents(
     type_id: Optional[int] = Query(None, description="Filtrer par type d'incident"),
     start_date: Optional[date] = Query(None, description="Date de début pour le filtre"),
     end_date: Optional[date] = Query(None, description="Date de fin pour le filtre"),
+    payload: IncidentPayloadOptions = Depends(incident_payload_options),
     current_user: UserResponse = Depends(get_current_user_data)
 ):
+    filters = IncidentFilters(signale_par_id=current_user.id, type_id=type_id, start_date=start_date, end_date=end_date)
     try:
-        query = supabase.table("incidents").select(
-            "*, fokontany:fokontany_id(*), typesincident:type_id(*)"
-        ).eq("signale_par_id", str(current_user.id))
-        if type_id:
-            query = query.eq("type_id", type_id)
-        if start_date:
-            query = query.gte("date_signalement", str(start_date))
-        if end_date:
-            query = query.lte("date_signalement", str(end_date) + "T23:59:59")
-        response = query.order("date_signalement", desc=True).execute()
-        return response.data
+        return await payload.render_async(await incidents_repository.list(filters, payload.columns()))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/fokontany/all", response_model=List[IncidentResponse])
-def get_incidents_for_fokontany(current_user: UserResponse = Depends(get_current_fokontany_chief_user)):
+async def get_incidents_for_fokontany(
+    payload: IncidentPayloadOptions = Depends(incident_payload_options),
+    current_user: UserResponse = Depends(get_current_fokontany_chief_user)
+):
     if not current_user.fokontany_id:
         raise HTTPException(status_code=400, detail="Aucun Fokontany associé.")
     try:
-        response = supabase.table("incidents").select(
-            "*, fokontany:fokontany_id(*), typesincident:type_id(*)"
-        ).eq("fokontany_id", current_user.fokontany_id).order("date_signalement", desc=True).execute()
-        return response.data
+        filters = IncidentFilters(fokontany_id=current_user.fokontany_id)
+        return await payload.render_async(await incidents_repository.list(filters, payload.columns()))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/fokontany/me", response_model=List[IncidentResponse])
-def get_incidents_reported_by_chief(
+async def get_incidents_reported_by_chief(
     type_id: Optional[int] = Query(None, description="Filtrer par type d'incident"),
     start_date: Optional[date] = Query(None, description="Date de début pour le filtre"),
     end_date: Optional[date] = Query(None, description="Date de fin pour le filtre"),
+    payload: IncidentPayloadOptions = Depends(incident_payload_options),
     current_user: UserResponse = Depends(get_current_fokontany_chief_user)
 ):
+    filters = IncidentFilters(signale_par_id=current_user.id, type_id=type_id, start_date=start_date, end_date=end_date)
     try:
-        query = supabase.table("incidents").select(
-            "*, fokontany:fokontany_id(*), typesincident:type_id(*)"
-        ).eq("signale_par_id", str(current_user.id))
-        
-        if type_id:
-            query = query.eq("type_id", type_id)
-        if start_date:
-            query = query.gte("date_signalement", str(start_date))
-        if end_date:
-            query = query.lte("date_signalement", str(end_date) + "T23:59:59")
-        response = query.order("date_signalement", desc=True).execute()
-        return response.data
+        return await payload.render_async(await incidents_repository.list(filters, payload.columns()))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/facets",
+            response_model=IncidentFacetsResponse,
+            summary="Comptages groupés par statut, type et fokontany pour les filtres")
+def get_incident_facets(
+    statut: Optional[List[str]] = Query(None, description="Filtrer par statut(s)"),
+    type_id: Optional[int] = Query(None, description="Filtrer par type d'incident"),
+    fokontany_id: Optional[int] = Query(None, description="Filtrer par fokontany"),
+    start_date: Optional[date] = Query(None, description="Date de début pour le filtre"),
+    end_date: Optional[date] = Query(None, description="Date de fin pour le filtre"),
+    current_user: UserResponse = Depends(get_current_user_data)
+):
+    """
+    Retourne en une requête les comptages de chaque facette pour la combinaison de filtres.
+    L'agrégation est faite par la fonction SQL `incident_facets` (GROUP BY côté base).
+    Un chef de fokontany est toujours restreint à son propre fokontany, y compris
+    dans la facette par fokontany (périmètre appliqué avant toute agrégation).
+    """
+    scope_fokontany_id = None
+    if current_user.role == "CHEF_FOKONTANY":
+        if not current_user.fokontany_id:
+            raise HTTPException(status_code=400, detail="Aucun Fokontany associé.")
+        fokontany_id = scope_fokontany_id = current_user.fokontany_id
+    elif current_user.role != "AUTORITE_LOCALE":
+        raise HTTPException(status_code=403, detail="Accès non autorisé.")
+
+    filters = IncidentFilters(
+        statut=[s.upper() for s in statut] if statut else None,
+        type_id=type_id,
+        fokontany_id=fokontany_id,
+        start_date=start_date,
+        end_date=end_date
+    )
+    cache_key = (scope_fokontany_id, *filters.cache_key())
+    cached = facets_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    try:
+        params = {**incident_filters_rpc_params(filters), "p_scope_fokontany_id": scope_fokontany_id}
+        response = supabase.rpc("incident_facets", params).execute()
+        facets = IncidentFacetsResponse(**(response.data or {"total": 0}))
+        facets_cache.set(cache_key, facets)
+        return facets
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _restrict_to_visible(query, current_user: UserResponse):
+    """Limite une requête (incidents ou pierres tombales) au périmètre visible de l'utilisateur."""
+    if current_user.role == "SECURITE_URBAINE":
+        return query.eq("assigne_a_id", str(current_user.id))
+    if current_user.role == "CHEF_FOKONTANY" and current_user.fokontany_id:
+        return query.eq("fokontany_id", current_user.fokontany_id)
+    if current_user.role in ["AUTORITE_LOCALE", "ADMIN"]:
+        return query
+    return query.eq("signale_par_id", str(current_user.id))
+
+def _tombstones_for(current_user: UserResponse):
+    """
+    Pierres tombales destinées à l'utilisateur : suppressions de son périmètre, et
+    sorties de périmètre ('moved') seulement pour l'ancien agent ou l'ancien chef.
+    """
+    query = _restrict_to_visible(supabase.table("incidents_tombstones").select("id, incident_id, deleted_at"), current_user)
+    if current_user.role in ["AUTORITE_LOCALE", "ADMIN"]:
+        query = query.eq("raison", "deleted")
+    return query
+
+@router.get("/changes",
+            response_model=IncidentSyncResponse,
+            summary="Incidents créés, modifiés ou supprimés depuis un curseur")
+def get_incident_changes(
+    cursor: Optional[str] = Query(None, description="Curseur renvoyé par la synchronisation précédente"),
+    limit: int = Query(500, ge=1, le=2000),
+    current_user: UserResponse = Depends(get_current_user_data)
+):
+    """
+    Synchronisation incrémentale pour l'application mobile.
+    Sans curseur, renvoie tous les incidents visibles (par pages) et un curseur initial.
+    Avec un curseur, ne renvoie que les incidents modifiés (`changed`, sans références
+    embarquées) et les IDs sortis du périmètre (`deleted`). Le client applique `deleted`
+    puis `changed`, et rappelle tant que `has_more` est vrai.
+    """
+    position = decode_cursor(cursor, u="timestamp", i="int", d="timestamp", t="int") if cursor else None
+    horizon = (datetime.now(timezone.utc) - SYNC_SAFETY_LAG).isoformat()
+    try:
+        query = supabase.table("incidents").select(SYNC_SELECT).lte("updated_at", horizon)
+        query = _restrict_to_visible(query, current_user)
+        if position:
+            query = query.or_(keyset_filter("updated_at", position["u"], "id", position["i"]))
+        rows = query.order("updated_at").order("id").limit(limit + 1).execute().data or []
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_position = {"u": horizon, "i": 0, "d": horizon, "t": 0}
+        if rows:
+            next_position.update(u=rows[-1]["updated_at"], i=rows[-1]["id"])
+
+        deleted = []
+        if position:
+            tombstones = _tombstones_for(current_user).lte("deleted_at", horizon)
+            tombstones = tombstones.or_(keyset_filter("deleted_at", position["d"], "id", position["t"]))
+            tomb_rows = tombstones.order("deleted_at").order("id").limit(limit + 1).execute().data or []
+            has_more = has_more or len(tomb_rows) > limit
+            tomb_rows = tomb_rows[:limit]
+            deleted = {row["incident_id"] for row in tomb_rows}
+            if deleted:
+                # Un incident revenu dans le périmètre (ex : réassigné au même agent) n'est pas retiré
+                still_visible = _restrict_to_visible(supabase.table("incidents").select("id"), current_user) \
+                    .in_("id", list(deleted)).execute().data or []
+                deleted -= {row["id"] for row in still_visible}
+            deleted = sorted(deleted)
+            if tomb_rows:
+                next_position.update(d=tomb_rows[-1]["deleted_at"], t=tomb_rows[-1]["id"])
+            elif has_more:
+                next_position.update(d=position["d"], t=position["t"])
+        if has_more and not rows and position:
+            next_position.update(u=position["u"], i=position["i"])
+
+        return fast_response(IncidentSyncResponse, {
+            "changed": rows,
+            "deleted": deleted,
+            "cursor": encode_cursor(next_position),
+            "has_more": has_more
+        })
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/{incident_id}", response_model=IncidentDetailResponse)
 def get_incident_by_id(incident_id: int, current_user: UserResponse = Depends(get_current_user_data)):
     try:
-        query_str = (
-            "*, "
-            "fokontany:fokontany_id(*), "
-            "typesincident:type_id(*), "
-            "piecesjointes(*), "
-            "signale_par:utilisateurs!signale_par_id(prenom, nom), "
-            "assigne_a:utilisateurs!assigne_a_id(prenom, nom), "
-            "rapports_intervention:rapportsintervention(*, redige_par:utilisateurs!redige_par_id(nom, prenom, postes_securite(nom_poste)))"
-        )
-        query = supabase.table("incidents").select(query_str).eq("id", incident_id).single().execute()
-        if not query.data:
-            raise HTTPException(status_code=404, detail="Incident non trouvé")
-        
-        data = query.data
-        rapports = data.get("rapports_intervention")
-        if rapports is None:
-            data["rapports_intervention"] = []
-        elif isinstance(rapports, dict):
-            data["rapports_intervention"] = [rapports]
-        
+        cached = detail_cache.get(incident_id)
+        if cached is None:
+            # Une écriture concurrente pendant la lecture ne doit pas laisser une version périmée en cache
+            version_before = current_versions("incidents")
+            query = supabase.table("incidents").select(INCIDENT_DETAIL_SELECT).eq("id", incident_id).single().execute()
+            if not query.data:
+                raise HTTPException(status_code=404, detail="Incident non trouvé")
+
+            cached = query.data
+            rapports = cached.get("rapports_intervention")
+            if rapports is None:
+                cached["rapports_intervention"] = []
+            elif isinstance(rapports, dict):
+                cached["rapports_intervention"] = [rapports]
+            if current_versions("incidents") == version_before:
+                detail_cache.set(incident_id, cached)
+
+        data = dict(cached)
+
         is_owner = UUID(data["signale_par_id"]) == current_user.id
         is_chief = (
             current_user.role == "CHEF_FOKONTANY" and
@@ -241,13 +389,15 @@ def get_incident_by_id(incident_id: int, current_user: UserResponse = Depends(ge
             data["fokontany_id"] == current_user.fokontany_id
         )
         data["can_edit_delete"] = is_owner or is_chief
-        return data
+        return fast_response(IncidentDetailResponse, data)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors de la récupération de l'incident : {e}")
     
 @router.put("/{incident_id}", response_model=IncidentResponse)
 def update_incident(incident_id: int, incident_update: IncidentUpdate, current_user: UserResponse = Depends(get_current_user_data)):
-    existing_res = supabase.table("incidents").select("signale_par_id, fokontany_id").eq("id", incident_id).single().execute()
+    existing_res = supabase.table("incidents").select(
+        "signale_par_id, fokontany_id, type_id, assigne_a_id, statut, date_signalement, date_resolution"
+    ).eq("id", incident_id).single().execute()
     if not existing_res.data:
         raise HTTPException(status_code=404, detail="Incident non trouvé.")
     
@@ -267,13 +417,16 @@ def update_incident(incident_id: int, incident_update: IncidentUpdate, current_u
             raise HTTPException(status_code=500, detail="Échec de la mise à jour.")
         
         response = supabase.table("incidents").select("*, fokontany:fokontany_id(*), typesincident:type_id(*)").eq("id", incident_id).single().execute()
+        incident_events.publish("updated", response.data, previous=data)
         return response.data
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/{incident_id}", status_code=204)
 def delete_incident(incident_id: int, current_user: UserResponse = Depends(get_current_user_data)):
-    res = supabase.table("incidents").select("signale_par_id, fokontany_id").eq("id", incident_id).single().execute()
+    res = supabase.table("incidents").select(
+        "signale_par_id, fokontany_id, type_id, assigne_a_id, statut, date_signalement, date_resolution"
+    ).eq("id", incident_id).single().execute()
     if not res.data:
         raise HTTPException(status_code=404, detail="Incident non trouvé.")
     
@@ -285,5 +438,6 @@ def delete_incident(incident_id: int, current_user: UserResponse = Depends(get_c
     
     try:
         supabase.table("incidents").delete().eq("id", incident_id).execute()
+        incident_events.publish("deleted", {"id": incident_id, **data})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,7 +1,8 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status
 from typing import List
 from pydantic import BaseModel
-from ..database.database import supabase
+from ..utils.etag import versioned_etag
+from ..utils.reference_data import reference_data, REFERENCE_CACHE_CONTROL
 
 router = APIRouter()
 
@@ -11,12 +12,12 @@ class PosteSecuriteResponse(BaseModel):
 
 @router.get("/", 
             response_model=List[PosteSecuriteResponse], 
-            summary="Récupérer la liste des postes de sécurité")
+            summary="Récupérer la liste des postes de sécurité",
+            dependencies=[Depends(versioned_etag("postes_securite", cache_control=REFERENCE_CACHE_CONTROL))])
 def get_all_postes():
     """Endpoint pour lister tous les postes de sécurité disponibles."""
     try:
-        response = supabase.table("postes_securite").select("id, nom_poste").execute()
-        return response.data
+        return reference_data.all("postes_securite")
     except Exception as e:
         print(f"Error fetching postes de securite: {e}")
         raise HTTPException(
@@ -4,33 +4,28 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from typing import List
 from ..database.database import supabase
 from ..utils.dependencies import role_checker
-from ..schemas.incidents import IncidentResponse
-from ..schemas.reports import ReportCreate, StatusUpdate, ReportResponse
+from ..schemas.incidents import IncidentResponse, IncidentFilters
+from ..schemas.reports import ReportCreate, StatusUpdate, ReportResponse, ReportCloseRequest
 from ..schemas.users import UserResponse
-from uuid import UUID
+from ..database.repositories import incidents_repository
+from ..utils import incident_events
+from ..utils.transitions import apply_transition, submit_report_and_close, CLOSING_STATUSES
+from ..utils.incident_payloads import IncidentPayloadOptions, incident_payload_options
 from datetime import datetime
 
 router = APIRouter()
 get_current_security_user = role_checker("SECURITE_URBAINE")
 
-def log_status_change(incident_id: int, old_status: str, new_status: str, user_id: UUID):
-    try:
-        supabase.table("historiquestatuts").insert({
-            "incident_id": incident_id,
-            "ancien_statut": old_status,
-            "nouveau_statut": new_status,
-            "modifie_par_id": str(user_id)
-        }).execute()
-    except Exception as e:
-        print(f"ERROR logging status change for incident {incident_id}: {e}")
-
 @router.get("/incidents/assigned",
             response_model=List[IncidentResponse],
             summary="Lister les incidents assignés à l'agent connecté")
-def get_my_assigned_incidents(current_user: UserResponse = Depends(get_current_security_user)):
+async def get_my_assigned_incidents(
+    payload: IncidentPayloadOptions = Depends(incident_payload_options),
+    current_user: UserResponse = Depends(get_current_security_user)
+):
     try:
-        response = supabase.table("incidents").select("*, fokontany:fokontany_id(*), typesincident:type_id(*)").eq("assigne_a_id", str(current_user.id)).order("date_assignation", desc=True).execute()
-        return response.data
+        filters = IncidentFilters(assigne_a_id=current_user.id)
+        return await payload.render_async(await incidents_repository.list(filters, payload.columns(), order_by="date_assignation"))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -38,16 +33,16 @@ def get_my_assigned_incidents(current_user: UserResponse = Depends(get_current_s
 @router.get("/incidents/all",
             response_model=List[IncidentResponse],
             summary="Lister tous les incidents de la base de données")
-def get_all_incidents(current_user: UserResponse = Depends(get_current_security_user)):
+async def get_all_incidents(
+    payload: IncidentPayloadOptions = Depends(incident_payload_options),
+    current_user: UserResponse = Depends(get_current_security_user)
+):
     """
     Permet à un agent de sécurité de voir tous les incidents du système,
     pas seulement ceux qui lui sont assignés.
     """
     try:
-        response = supabase.table("incidents").select(
-            "*, fokontany:fokontany_id(*), typesincident:type_id(*)"
-        ).order("date_signalement", desc=True).execute()
-        return response.data
+        return await payload.render_async(await incidents_repository.list(IncidentFilters(), payload.columns()))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -56,30 +51,20 @@ def get_all_incidents(current_user: UserResponse = Depends(get_current_security_
              response_model=IncidentResponse,
              summary="Mettre à jour le statut d'un incident")
 def update_incident_status(incident_id: int, status_update: StatusUpdate, current_user: UserResponse = Depends(get_current_security_user)):
+    new_status = status_update.nouveau_statut.upper()
+    changes = {}
+    if new_status in CLOSING_STATUSES:
+        changes["date_resolution"] = datetime.now().isoformat()
     try:
-        res = supabase.table("incidents").select("statut").eq("id", incident_id).eq("assigne_a_id", str(current_user.id)).single().execute()
-        if not res.data:
-            raise HTTPException(status_code=404, detail="Incident non trouvé ou non assigné à cet agent.")
-
-        incident_current_status = res.data['statut']
-        new_status = status_update.nouveau_statut.upper()
-
-        if new_status in ["RESOLU", "NON_RESOLU"]:
-            report_res = supabase.table("rapportsintervention").select("id").eq("incident_id", incident_id).execute()
-            if not report_res.data:
-                raise HTTPException(status_code=403, detail="Un rapport d'intervention est requis avant de pouvoir clôturer cet incident.")
-
-        update_data = {"statut": new_status}
-        if new_status in ["RESOLU", "NON_RESOLU"]:
-            update_data["date_resolution"] = datetime.now().isoformat()
-
-        update_response = supabase.table("incidents").update(update_data).eq("id", incident_id).execute()
-        if not update_response.data:
-            raise HTTPException(status_code=500, detail="La mise à jour du statut a échoué.")
-
-        response = supabase.table("incidents").select("*, fokontany:fokontany_id(*), typesincident:type_id(*)").eq("id", incident_id).single().execute()
-        log_status_change(incident_id, incident_current_status, new_status, current_user.id)
-        return response.data
+        incident, _ = apply_transition(
+            incident_id, new_status, current_user.id,
+            changes=changes,
+            assigned_to=current_user.id,
+            require_report=new_status in CLOSING_STATUSES
+        )
+        return incident
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -92,10 +77,7 @@ def submit_intervention_report(incident_id: int, report: ReportCreate, current_u
     if not res.data:
         raise HTTPException(status_code=404, detail="Incident non trouvé ou non assigné à cet agent.")
 
-    report_res = supabase.table("rapportsintervention").select("id").eq("incident_id", incident_id).execute()
-    if report_res.data:
-        raise HTTPException(status_code=409, detail="Un rapport existe déjà pour cet incident.")
-        
+    # Le doublon est refusé par la contrainte UNIQUE (incident_id), sans pré-vérification
     try:
         report_data = {
             "contenu": report.contenu,
@@ -110,8 +92,29 @@ def submit_intervention_report(incident_id: int, report: ReportCreate, current_u
         response = supabase.table("rapportsintervention").select("*, incident:incidents(id, titre)").eq("id", new_report_id).single().execute()
         if not response.data:
             raise HTTPException(status_code=500, detail="Échec de la récupération du rapport après création.")
-            
+
+        incident_events.publish("report_added", {"id": incident_id})
         return response.data
+    except HTTPException:
+        raise
+    except Exception as e:
+        if "duplicate key value" in str(e):
+            raise HTTPException(status_code=409, detail="Un rapport existe déjà pour cet incident.")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/incidents/{incident_id}/close",
+             response_model=IncidentResponse,
+             summary="Soumettre le rapport d'intervention et clôturer l'incident")
+def submit_report_and_close_incident(incident_id: int, payload: ReportCloseRequest, current_user: UserResponse = Depends(get_current_security_user)):
+    """
+    Insère le rapport, passe l'incident à RESOLU / NON_RESOLU avec sa date de résolution
+    et journalise le changement, le tout dans une seule transaction côté base.
+    """
+    try:
+        incident, _ = submit_report_and_close(incident_id, current_user.id, payload.contenu, payload.nouveau_statut.upper())
+        return incident
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
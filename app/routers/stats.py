@@ -1,66 +1,152 @@
 # Fichier complet : backend/app/routers/stats.py
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from ..database.database import supabase
+from ..database.repositories import stats_repository
 from ..schemas.users import UserResponse
-from ..schemas.stats import FokontanyStatsResponse, StatItem, AuthorityKPIsResponse, GlobalStatsResponse
+from ..schemas.stats import (
+    FokontanyStatsResponse, StatItem, AuthorityKPIsResponse, GlobalStatsResponse,
+    ResolutionPercentileItem, ResolutionPercentilesResponse
+)
 from datetime import datetime, timedelta, timezone, date
 from ..utils.dependencies import role_checker
-from typing import List, Optional
-from collections import Counter, defaultdict
+from ..utils.etag import versioned_etag, current_versions, on_version_change
+from ..utils.bucketing import bucket_counts
+from ..utils.cache import TTLCache
+from ..utils.serialization import encode_json
+from ..utils import metrics, incident_events
+from ..utils.kpis import kpis
+from ..utils.sketches import resolution_sketches
+from ..utils.incident_payloads import fetch_references
+from typing import Hashable, List, Optional
+from uuid import UUID
+from collections import defaultdict
 import calendar
+import os
 
 router = APIRouter()
 get_current_fokontany_chief_user = role_checker("CHEF_FOKONTANY")
 get_current_authority_user = role_checker("AUTORITE_LOCALE")
 get_current_security_user = role_checker("SECURITE_URBAINE")
+# ETag par utilisateur et par jour : les fenêtres par défaut dépendent de la date courante
+stats_etag = versioned_etag("incidents", per_user=True, daily=True)
 
-# MODIFIÉ: Fonction d'agrégation améliorée
-def aggregate_incidents_by_period(incidents: List[dict], period: str, start_date: date, end_date: date):
-    """Agrège les incidents par jour, semaine ou mois sur une période donnée."""
-    
-    # Générer les labels pour la période
-    labels = []
-    if period == 'day':
-        delta = end_date - start_date
-        labels = [(start_date + timedelta(days=i)).strftime('%d/%m') for i in range(delta.days + 1)]
-    elif period == 'week':
-        # Générer des labels pour chaque semaine dans la plage
-        current_date = start_date
-        while current_date <= end_date:
-            # Format: Année-NuméroDeSemaine
-            labels.append(current_date.strftime('%Y-W%U'))
-            current_date += timedelta(weeks=1)
-    elif period == 'month':
-        # Générer des labels pour chaque mois dans la plage
-        current_date = start_date
-        while current_date <= end_date:
-            labels.append(current_date.strftime('%Y-%m'))
-            # Aller au premier jour du mois suivant
-            current_date = (current_date.replace(day=1) + timedelta(days=32)).replace(day=1)
-
-    period_counts = {label: 0 for label in labels}
-    
-    for incident in incidents:
-        incident_date = datetime.fromisoformat(incident['date_signalement']).date()
-        if start_date <= incident_date <= end_date:
-            if period == 'day':
-                label = incident_date.strftime('%d/%m')
-            elif period == 'week':
-                label = incident_date.strftime('%Y-W%U')
-            elif period == 'month':
-                label = incident_date.strftime('%Y-%m')
-            
-            if label in period_counts:
-                period_counts[label] += 1
-                
-    return [StatItem(label=day, value=count) for day, count in period_counts.items()]
+# Résultats de incident_stats_grouped, clé : (portée, id de portée, début, fin, type_id, période).
+# Une plage entièrement passée ne change que sur écriture (invalidée ci-dessous) : TTL long.
+STATS_CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", 60))
+STATS_CACHE_PAST_TTL = float(os.getenv("STATS_CACHE_PAST_TTL", 24 * 3600))
+stats_cache = TTLCache(
+    maxsize=4096,
+    ttl=STATS_CACHE_TTL,
+    sizeof=lambda grouped: len(encode_json(grouped)),
+    max_bytes=int(os.getenv("STATS_CACHE_MAX_BYTES", 8 * 1024 * 1024))
+)
+metrics.register_gauge("stats_cache", stats_cache.stats)
+
+def _stats_cache_matches(key: Hashable, event: str, incident: dict) -> bool:
+    """Une écriture sur l'incident peut-elle modifier le résultat mis en cache sous cette clé ?"""
+    scope, scope_id, start, end, type_id, _period = key
+    signalement = incident.get("date_signalement")
+    if signalement:
+        # Même découpage que l'agrégat journalier : date UTC du signalement
+        day = date.fromisoformat(str(signalement)[:10])
+        if not (start <= day <= end):
+            return False
+    if type_id and incident.get("type_id") is not None and incident["type_id"] != type_id:
+        return False
+    if scope == "fokontany":
+        return incident.get("fokontany_id") is None or incident["fokontany_id"] == scope_id
+    if scope == "agent":
+        # Une affectation peut aussi retirer l'incident des statistiques d'un autre agent
+        assignee = incident.get("assigne_a_id")
+        return assignee is None or str(assignee) == scope_id or event in ("status_changed", "deleted")
+    return True
+
+@incident_events.subscribe
+def _invalidate_stats_cache(event: str, incident: dict, old_status: Optional[str],
+                            previous: Optional[dict] = None) -> None:
+    # Un changement de type, de fokontany ou d'agent touche aussi les entrées des anciennes valeurs
+    rows = [row for row in (incident, previous) if row]
+    stats_cache.invalidate_where(lambda key: any(_stats_cache_matches(key, event, row) for row in rows))
+
+@on_version_change
+def _clear_stats_cache(name: str) -> None:
+    # Écriture vue en base (autre worker, accès direct) : portée inconnue, tout est recalculé
+    if name == "incidents":
+        stats_cache.clear()
+
+def aggregate_incidents_by_period(incidents: List[dict], period: str, start_date: date, end_date: date,
+                                  date_key: str = 'date_signalement', weight_key: Optional[str] = None):
+    """
+    Agrège les incidents par jour, semaine ISO ou mois sur une période donnée.
+    Avec `weight_key`, chaque ligne compte pour sa valeur (lignes de l'agrégat journalier).
+    """
+    dates = [incident[date_key] for incident in incidents]
+    weights = [incident[weight_key] for incident in incidents] if weight_key else None
+    return [StatItem(label=label, value=count)
+            for label, count in bucket_counts(dates, period, start_date, end_date, weights)]
+
+
+# --- Couche de service : agrégation déléguée à la base (RPC incident_stats_grouped) ---
+
+def _stat_items(groups: List[dict]) -> List[StatItem]:
+    return [StatItem(label=g['label'], value=g['count']) for g in groups if g.get('label') is not None]
+
+async def compute_incident_stats(
+    start_date: date,
+    end_date: date,
+    period: str,
+    fokontany_id: Optional[int] = None,
+    type_id: Optional[int] = None,
+    assigne_a_id: Optional[UUID] = None
+) -> Optional[dict]:
+    """
+    Comptages par statut, type, fokontany et période calculés par un seul appel RPC.
+    Retourne None si aucun incident ne correspond aux filtres.
+    """
+    if assigne_a_id:
+        scope, scope_id = "agent", str(assigne_a_id)
+    elif fokontany_id:
+        scope, scope_id = "fokontany", fokontany_id
+    else:
+        scope, scope_id = "global", None
+    cache_key = (scope, scope_id, start_date, end_date, type_id, period)
+
+    grouped = stats_cache.get(cache_key)
+    if grouped is None:
+        # Une écriture concurrente pendant le calcul ne doit pas laisser un résultat périmé en cache
+        version_before = current_versions("incidents")
+        grouped = await stats_repository.grouped({
+            "p_start": start_date.isoformat(),
+            "p_end": end_date.isoformat(),
+            "p_period": period,
+            "p_fokontany_id": fokontany_id,
+            "p_type_id": type_id,
+            "p_assigne_a_id": scope_id if scope == "agent" else None
+        })
+        past_only = end_date < datetime.now(timezone.utc).date()
+        if current_versions("incidents") == version_before:
+            stats_cache.set(cache_key, grouped, ttl=STATS_CACHE_PAST_TTL if past_only else None)
+
+    if not grouped.get('total'):
+        return None
+
+    return {
+        "incidents_par_statut": _stat_items(grouped['par_statut']),
+        "incidents_par_type": _stat_items(grouped['par_type']),
+        "incidents_par_fokontany": _stat_items(grouped['par_fokontany']),
+        # Les compartiments vides sont complétés par le générateur de libellés
+        "incidents_over_time": aggregate_incidents_by_period(
+            grouped['par_periode'], period, start_date, end_date, date_key='debut', weight_key='count'
+        ),
+    }
 
 
 @router.get("/fokontany",
             response_model=FokontanyStatsResponse,
             summary="Récupérer les statistiques pour le Fokontany du chef connecté")
-def get_stats_for_fokontany(
+async def get_stats_for_fokontany(
     current_user: UserResponse = Depends(get_current_fokontany_chief_user),
+    _etag: None = Depends(stats_etag),
     start_date: Optional[date] = Query(None),
     end_date: Optional[date] = Query(None),
     type_id: Optional[int] = Query(None),
@@ -72,38 +158,19 @@ def get_stats_for_fokontany(
             detail="Aucun Fokontany n'est associé à ce compte."
         )
     try:
-        query = supabase.table("incidents").select(
-            "statut, typesincident(nom_type), date_signalement"
-        ).eq("fokontany_id", current_user.fokontany_id)
-
         # Application des filtres
         effective_end_date = end_date or date.today()
         effective_start_date = start_date or (effective_end_date - timedelta(days=29))
-        
-        query = query.gte("date_signalement", effective_start_date.isoformat())
-        query = query.lte("date_signalement", (effective_end_date + timedelta(days=1)).isoformat())
-
-        if type_id:
-            query = query.eq("type_id", type_id)
 
-        incidents_response = query.execute()
+        stats = await compute_incident_stats(effective_start_date, effective_end_date, period, fokontany_id=current_user.fokontany_id, type_id=type_id)
         
-        if not incidents_response.data:
+        if not stats:
             return FokontanyStatsResponse(incidents_par_statut=[], incidents_par_type=[], incidents_over_time=[])
 
-        incidents = incidents_response.data
-        
-        stats_by_status = Counter(incident['statut'] for incident in incidents)
-        stats_by_type = Counter(
-            incident['typesincident']['nom_type'] for incident in incidents if incident.get('typesincident')
-        )
-        
-        incidents_over_time = aggregate_incidents_by_period(incidents, period, effective_start_date, effective_end_date)
-        
         return FokontanyStatsResponse(
-            incidents_par_statut=[StatItem(label=k, value=v) for k, v in stats_by_status.items()],
-            incidents_par_type=[StatItem(label=k, value=v) for k, v in stats_by_type.items()],
-            incidents_over_time=incidents_over_time
+            incidents_par_statut=stats["incidents_par_statut"],
+            incidents_par_type=stats["incidents_par_type"],
+            incidents_over_time=stats["incidents_over_time"]
         )
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
@@ -113,121 +180,100 @@ def get_stats_for_fokontany(
             summary="Récupérer les KPIs pour l'Autorité Locale")
 def get_kpis_for_authority(current_user: UserResponse = Depends(get_current_authority_user)):
     try:
-        pending_incidents_res = supabase.table("incidents").select("id", count='exact').in_("statut", ["NOUVEAU", "URGENT"]).execute()
-        incidents_a_valider = pending_incidents_res.count or 0
-        
-        active_agents_res = supabase.table("utilisateurs").select("id", count='exact').eq("role", "SECURITE_URBAINE").eq("est_verifie", True).execute()
-        agents_actifs = active_agents_res.count or 0
-
-        resolved_incidents_res = supabase.table("incidents").select("date_signalement, date_resolution").eq("statut", "RESOLU").not_.is_("date_resolution", "null").execute()
-        
-        temps_resolution_moyen_heures = None
-        if resolved_incidents_res.data:
-            total_duration_seconds = sum(
-                (datetime.fromisoformat(inc['date_resolution']) - datetime.fromisoformat(inc['date_signalement'])).total_seconds()
-                for inc in resolved_incidents_res.data
-            )
-            count_resolved = len(resolved_incidents_res.data)
-            if count_resolved > 0:
-                temps_resolution_moyen_heures = round((total_duration_seconds / count_resolved) / 3600, 2)
-        
-        return AuthorityKPIsResponse(
-            incidents_a_valider=incidents_a_valider,
-            agents_actifs=agents_actifs,
-            temps_resolution_moyen_heures=temps_resolution_moyen_heures
-        )
+        return AuthorityKPIsResponse(**kpis.authority())
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @router.get("/global",
             response_model=GlobalStatsResponse,
             summary="Récupérer les statistiques globales pour toute la commune")
-def get_global_stats(
+async def get_global_stats(
     current_user: UserResponse = Depends(get_current_authority_user),
+    _etag: None = Depends(stats_etag),
     start_date: Optional[date] = Query(None),
     end_date: Optional[date] = Query(None),
     type_id: Optional[int] = Query(None),
     period: str = Query("day", enum=["day", "week", "month"])
 ):
     try:
-        query = supabase.table("incidents").select(
-            "statut, date_signalement, typesincident(nom_type), fokontany(nom_fokontany)"
-        )
-
         # Application des filtres
         effective_end_date = end_date or date.today()
         effective_start_date = start_date or (effective_end_date - timedelta(days=29))
 
-        query = query.gte("date_signalement", effective_start_date.isoformat())
-        query = query.lte("date_signalement", (effective_end_date + timedelta(days=1)).isoformat())
-
-        if type_id:
-            query = query.eq("type_id", type_id)
-
-        incidents_res = query.execute()
+        stats = await compute_incident_stats(effective_start_date, effective_end_date, period, type_id=type_id)
         
-        incidents = incidents_res.data
-        if not incidents:
+        if not stats:
             return GlobalStatsResponse(incidents_par_statut=[], incidents_par_type=[], incidents_par_fokontany=[], incidents_over_time=[])
             
-        status_counts = Counter(inc['statut'] for inc in incidents)
-        type_counts = Counter(inc['typesincident']['nom_type'] for inc in incidents if inc.get('typesincident'))
-        fokontany_counts = Counter(inc['fokontany']['nom_fokontany'] for inc in incidents if inc.get('fokontany'))
-        
-        incidents_over_time = aggregate_incidents_by_period(incidents, period, effective_start_date, effective_end_date)
-        
-        return GlobalStatsResponse(
-            incidents_par_statut=[StatItem(label=k, value=v) for k, v in status_counts.items()],
-            incidents_par_type=[StatItem(label=k, value=v) for k, v in type_counts.items()],
-            incidents_par_fokontany=[StatItem(label=k, value=v) for k, v in fokontany_counts.items()],
-            incidents_over_time=incidents_over_time
-        )
+        return GlobalStatsResponse(**stats)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @router.get("/security/me",
             response_model=FokontanyStatsResponse,
             summary="Récupérer les statistiques des missions de l'agent connecté")
-def get_stats_for_security_agent(
+async def get_stats_for_security_agent(
     current_user: UserResponse = Depends(get_current_security_user),
+    _etag: None = Depends(stats_etag),
     start_date: Optional[date] = Query(None),
     end_date: Optional[date] = Query(None),
     type_id: Optional[int] = Query(None),
     period: str = Query("day", enum=["day", "week", "month"])
 ):
     try:
-        query = supabase.table("incidents").select(
-            "statut, date_signalement, typesincident(nom_type)"
-        ).eq("assigne_a_id", str(current_user.id))
-
         # Application des filtres
         effective_end_date = end_date or date.today()
         effective_start_date = start_date or (effective_end_date - timedelta(days=29))
-        
-        query = query.gte("date_signalement", effective_start_date.isoformat())
-        query = query.lte("date_signalement", (effective_end_date + timedelta(days=1)).isoformat())
 
-        if type_id:
-            query = query.eq("type_id", type_id)
-        
-        incidents_response = query.execute()
+        stats = await compute_incident_stats(effective_start_date, effective_end_date, period, type_id=type_id, assigne_a_id=current_user.id)
 
-        if not incidents_response.data:
+        if not stats:
             return FokontanyStatsResponse(incidents_par_statut=[], incidents_par_type=[], incidents_over_time=[])
         
-        incidents = incidents_response.data
-        
-        stats_by_status = Counter(incident['statut'] for incident in incidents)
-        stats_by_type = Counter(
-            incident['typesincident']['nom_type'] for incident in incidents if incident.get('typesincident')
-        )
-        
-        incidents_over_time = aggregate_incidents_by_period(incidents, period, effective_start_date, effective_end_date)
-        
         return FokontanyStatsResponse(
-            incidents_par_statut=[StatItem(label=k, value=v) for k, v in stats_by_status.items()],
-            incidents_par_type=[StatItem(label=k, value=v) for k, v in stats_by_type.items()],
-            incidents_over_time=incidents_over_time
+            incidents_par_statut=stats["incidents_par_statut"],
+            incidents_par_type=stats["incidents_par_type"],
+            incidents_over_time=stats["incidents_over_time"]
+        )
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
+def _percentile_labels(dimension: str, keys: List[str]) -> dict:
+    """Noms affichés des clés d'une dimension (fokontany, type d'incident ou agent)."""
+    if dimension == "fokontany":
+        refs = fetch_references("fokontany", [int(k) for k in keys])
+        return {k: ref["nom_fokontany"] for k, ref in refs.items()}
+    if dimension == "type":
+        refs = fetch_references("typesincident", [int(k) for k in keys])
+        return {k: ref["nom_type"] for k, ref in refs.items()}
+    if dimension == "agent" and keys:
+        agents = supabase.table("utilisateurs").select("id, nom, prenom").in_("id", keys).execute().data or []
+        return {a["id"]: f"{a.get('prenom') or ''} {a.get('nom') or ''}".strip() for a in agents}
+    return {}
+
+def _percentile_item(key: Optional[str], label: str, entry: dict) -> ResolutionPercentileItem:
+    p50, p90, p99 = (None if q is None else round(q / 3600, 2) for q in entry["quantiles"])
+    return ResolutionPercentileItem(id=key, label=label, nombre=entry["count"], p50_heures=p50, p90_heures=p90, p99_heures=p99)
+
+@router.get("/resolution-percentiles",
+            response_model=ResolutionPercentilesResponse,
+            summary="Quantiles (p50/p90/p99) des durées de résolution par fokontany, type ou agent")
+def get_resolution_percentiles(
+    current_user: UserResponse = Depends(get_current_authority_user),
+    dimension: str = Query("fokontany", enum=["fokontany", "type", "agent"])
+):
+    try:
+        # Esquisses de quantiles en mémoire (utils/sketches.py), fusionnées entre workers via la base
+        per_key = resolution_sketches.percentiles(dimension)
+        overall = resolution_sketches.percentiles("global").get("")
+        labels = _percentile_labels(dimension, list(per_key))
+        items = [_percentile_item(key, labels.get(key, key), entry) for key, entry in per_key.items()]
+        items.sort(key=lambda item: item.p90_heures or 0, reverse=True)
+        return ResolutionPercentilesResponse(
+            dimension=dimension,
+            ensemble=_percentile_item(None, "Commune", overall) if overall else None,
+            items=items
         )
     except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
@@ -8,7 +8,11 @@ from ..database.database import supabase
 from ..schemas.users import UserResponse, UserUpdate, PasswordUpdate, UserPhotoUpdate
 from ..utils.dependencies import get_current_user_data
 from ..utils.security import verify_password, hash_password
+from ..utils.serialization import fast_list_response, prepare
+from ..utils.reference_data import reference_data
+from ..utils.loaders import Loaders, UserScope, request_loaders
 router = APIRouter()
+prepare(UserResponse)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -28,7 +32,7 @@ def get_users_by_role(role_name: str, current_user: UserResponse = Depends(get_c
         response = supabase.table("utilisateurs").select(query).eq("role", role_name.upper()).eq("est_verifie", True).execute()
         logger.info("Utilisateurs récupérés : %s", response.data)
         
-        return response.data
+        return fast_list_response(UserResponse, response.data)
     except Exception as e:
         logger.error("Erreur lors de la récupération des utilisateurs : %s", str(e))
         raise HTTPException(status_code=500, detail="Erreur serveur : " + str(e))
@@ -57,7 +61,7 @@ def get_security_agents_by_fokontany(fokontany_id: int, current_user: UserRespon
             .eq("fokontany_id", fokontany_id)\
             .execute()
         
-        return response.data
+        return fast_list_response(UserResponse, response.data)
     except Exception as e:
         logger.error("Erreur lors de la récupération des agents par fokontany : %s", str(e))
         raise HTTPException(status_code=500, detail="Erreur serveur : " + str(e))
@@ -157,7 +161,8 @@ def update_user_photo(
 def get_panic_contacts(
     fokontany_id: int = Query(..., description="ID du Fokontany de l'utilisateur"),
     type_id: int = Query(..., description="ID du type d'incident"),
-    current_user: UserResponse = Depends(get_current_user_data)
+    current_user: UserResponse = Depends(get_current_user_data),
+    loaders: Loaders = Depends(request_loaders)
 ):
     """
     Récupère une liste de contacts d'urgence pour le mode panique.
@@ -169,45 +174,21 @@ def get_panic_contacts(
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Action non autorisée.")
     
     try:
-        contact_list = []
-        
-        # 1. Récupérer toutes les Autorités Locales
-        authorities_res = supabase.table("utilisateurs").select("*, postes_securite(nom_poste)").eq("role", "AUTORITE_LOCALE").eq("est_verifie", True).execute()
-        if authorities_res.data:
-            contact_list.extend(authorities_res.data)
-        
-        logger.info(f"Étape 1: {len(contact_list)} Autorités Locales trouvées.")
+        # 1. Poste recommandé pour le type d'incident (cache des tables de référence)
+        type_info = reference_data.get("typesincident", type_id)
+        poste_id = type_info.get("poste_recommande_id") if type_info else None
 
-        # 2. Récupérer le poste recommandé pour le type d'incident
-        # On utilise .execute() pour une meilleure gestion des erreurs
-        type_res = supabase.table("typesincident").select("poste_recommande_id").eq("id", type_id).execute()
-        
-        # On vérifie si un poste recommandé a été trouvé
-        if type_res.data and type_res.data[0].get("poste_recommande_id"):
-            poste_id = type_res.data[0]["poste_recommande_id"]
-            logger.info(f"Étape 2: Incident de type {type_id} recommande le poste_id {poste_id}.")
-            
-            # 3. Récupérer les agents de sécurité correspondants
-            # La requête filtre par le fokontany_id ET le poste_securite_id
-            security_res = supabase.table("utilisateurs").select("*, postes_securite(nom_poste)") \
-                .eq("role", "SECURITE_URBAINE") \
-                .eq("est_verifie", True) \
-                .eq("fokontany_id", fokontany_id) \
-                .eq("poste_securite_id", poste_id) \
-                .execute()
-            
-            logger.info(f"Étape 3: Recherche d'agents pour fokontany_id={fokontany_id} et poste_id={poste_id}. Trouvé: {len(security_res.data)} agent(s).")
-            
-            if security_res.data:
-                # Ajoute les agents de sécurité à la liste sans créer de doublons
-                existing_ids = {user.get('id') for user in contact_list}
-                for agent in security_res.data:
-                    if agent.get('id') not in existing_ids:
-                        contact_list.append(agent)
+        # 2. Autorités Locales et agents du Fokontany rattachés à ce poste : une seule lecture
+        scopes = [UserScope("AUTORITE_LOCALE")]
+        if poste_id:
+            logger.info(f"Incident de type {type_id} : poste recommandé {poste_id}.")
+            scopes.append(UserScope("SECURITE_URBAINE", fokontany_id, poste_id))
         else:
             logger.warning(f"Aucun poste recommandé trouvé pour le type d'incident ID {type_id}.")
-        
-        # 4. Validation finale de la liste complète des contacts
+        contact_list = loaders.verified_contacts(*scopes)
+        logger.info(f"{len(contact_list)} contact(s) d'urgence trouvé(s).")
+
+        # 3. Validation finale de la liste complète des contacts
         return parse_obj_as(List[UserResponse], contact_list)
 
     except Exception as e:
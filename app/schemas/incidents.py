@@ -1,6 +1,6 @@
 # Fichier complet : backend/app/schemas/incidents.py
 from pydantic import BaseModel, Field
-from datetime import datetime
+from datetime import datetime, date
 from typing import Optional, List
 from uuid import UUID
 
@@ -61,7 +61,8 @@ class IncidentUpdate(BaseModel):
     adresse_approximative: Optional[str] = None
     type_id: Optional[int] = None
 
-class IncidentResponse(BaseModel):
+class IncidentBaseResponse(BaseModel):
+    """Champs propres d'un incident, sans les références embarquées."""
     id: int
     titre: str
     description: str
@@ -76,6 +77,11 @@ class IncidentResponse(BaseModel):
     assigne_a_id: Optional[UUID] = None
     date_assignation: Optional[datetime] = None
     date_resolution: Optional[datetime] = None
+    class Config:
+        from_attributes = True
+        json_encoders = {UUID: str}
+
+class IncidentResponse(IncidentBaseResponse):
     fokontany: Optional[FokontanyResponse] = None
     typesincident: Optional[IncidentTypeResponse] = None
     class Config:
@@ -96,4 +102,75 @@ class IncidentDetailResponse(IncidentResponse):
     assigne_a: Optional[AssigneAResponse] = None
     piecesjointes: List[PieceJointeResponse] = []
     # MISE À JOUR : Utilisation du nouveau schéma détaillé pour les rapports
-    rapports_intervention: List[ReportDetailResponse] = []
\ No newline at end of file
+    rapports_intervention: List[ReportDetailResponse] = []
+
+# --- Modèle de filtre partagé (listes, facettes, exports) ---
+class IncidentFilters(BaseModel):
+    """Filtres communs appliqués aux requêtes sur la table incidents."""
+    statut: Optional[List[str]] = None
+    type_id: Optional[int] = None
+    fokontany_id: Optional[int] = None
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    signale_par_id: Optional[UUID] = None
+    assigne_a_id: Optional[UUID] = None
+
+    def date_bounds(self):
+        """Bornes ISO de date_signalement, identiques à celles des routes de liste."""
+        start = str(self.start_date) if self.start_date else None
+        end = str(self.end_date) + "T23:59:59" if self.end_date else None
+        return start, end
+
+    def cache_key(self) -> tuple:
+        """Clé hachable et stable pour la mise en cache des résultats."""
+        return (
+            tuple(sorted(self.statut)) if self.statut else None,
+            self.type_id,
+            self.fokontany_id,
+            self.start_date,
+            self.end_date,
+            self.signale_par_id,
+            self.assigne_a_id,
+        )
+
+class FacetItem(BaseModel):
+    id: Optional[int] = None
+    label: str
+    count: int
+
+class IncidentFacetsResponse(BaseModel):
+    """Comptages groupés pour les filtres des tableaux de bord."""
+    total: int
+    par_statut: List[FacetItem] = []
+    par_type: List[FacetItem] = []
+    par_fokontany: List[FacetItem] = []
+
+class IncidentSyncResponse(BaseModel):
+    """Lot de synchronisation incrémentale : à appliquer dans l'ordre `deleted` puis `changed`."""
+    changed: List[IncidentBaseResponse] = []
+    deleted: List[int] = []
+    cursor: str
+    has_more: bool = False
+
+# --- Actions en lot de l'Autorité Locale ---
+class BulkIncidentIds(BaseModel):
+    incident_ids: List[int] = Field(..., min_length=1, max_length=200)
+
+class BulkAssignment(BaseModel):
+    incident_id: int
+    agent_id: UUID
+
+class BulkAssignRequest(BaseModel):
+    assignments: List[BulkAssignment] = Field(..., min_length=1, max_length=200)
+
+class BulkItemResult(BaseModel):
+    incident_id: int
+    success: bool
+    statut: Optional[str] = None
+    detail: Optional[str] = None
+
+class BulkActionResponse(BaseModel):
+    """Résultat par incident d'une action en lot."""
+    succeeded: int
+    failed: int
+    results: List[BulkItemResult]
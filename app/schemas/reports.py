@@ -9,6 +9,11 @@ class ReportCreate(BaseModel):
 class StatusUpdate(BaseModel):
     nouveau_statut: str = Field(..., description="Le nouveau statut de l'incident (ex: EN_COURS, RESOLU)")
 
+# Schéma pour soumettre le rapport et clôturer l'incident en une seule opération
+class ReportCloseRequest(BaseModel):
+    contenu: str = Field(..., min_length=20, description="Description détaillée de l'intervention et des résultats.")
+    nouveau_statut: str = Field(..., description="Statut de clôture : RESOLU ou NON_RESOLU")
+
 # --- NOUVEAU SCHÉMA POUR LA RÉPONSE DE L'API ---
 
 class IncidentInfoForReport(BaseModel):
@@ -1,6 +1,7 @@
 # CHEMIN: backend/app/schemas/stats.py
 from pydantic import BaseModel
 from typing import List, Optional
+from uuid import UUID
 
 class StatItem(BaseModel):
     """Représente une seule entrée de statistique (ex: 'Vol', 10)."""
@@ -26,4 +27,35 @@ class GlobalStatsResponse(BaseModel):
     incidents_par_type: List[StatItem]
     incidents_par_fokontany: List[StatItem]
     # NOUVEAU: Ajout des statistiques temporelles
-    incidents_over_time: List[StatItem]
\ No newline at end of file
+    incidents_over_time: List[StatItem]
+class ResolutionPercentileItem(BaseModel):
+    """Quantiles de la durée de résolution (en heures) pour un fokontany, un type ou un agent."""
+    id: Optional[str] = None
+    label: str
+    nombre: int
+    p50_heures: Optional[float] = None
+    p90_heures: Optional[float] = None
+    p99_heures: Optional[float] = None
+
+class ResolutionPercentilesResponse(BaseModel):
+    """Répartition des durées de résolution : ensemble de la commune puis détail par clé."""
+    dimension: str
+    ensemble: Optional[ResolutionPercentileItem] = None
+    items: List[ResolutionPercentileItem]
+
+class AgentPerformanceItem(BaseModel):
+    """Charge et rendement d'un agent de sécurité (durées mesurées depuis l'assignation)."""
+    id: UUID
+    nom: str
+    prenom: Optional[str] = None
+    fokontany_id: Optional[int] = None
+    missions_ouvertes: int
+    resolus: int
+    non_resolus: int
+    premiere_action_moyenne_heures: Optional[float] = None
+    resolution_moyenne_heures: Optional[float] = None
+
+class AgentPerformancePage(BaseModel):
+    """Page d'agents triée ; `total` compte tous les agents actifs."""
+    total: int
+    items: List[AgentPerformanceItem]
@@ -0,0 +1,92 @@
+from datetime import date, timedelta
+from typing import TYPE_CHECKING, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Format des libellés par granularité ; la semaine suit la norme ISO 8601 (lundi)
+PERIOD_LABEL_FORMATS = {
+    'day': '%d/%m',
+    'week': '%G-W%V',
+    'month': '%Y-%m',
+}
+
+_EPOCH = date(1970, 1, 1)
+
+
+def _numpy():
+    # Import différé : NumPy ne pèse sur le démarrage qu'au premier calcul de statistiques
+    import numpy
+    return numpy
+
+
+def parse_day_ordinals(values: Sequence[str]) -> "np.ndarray":
+    """
+    Convertit en bloc des dates / horodatages ISO en nombre de jours depuis 1970-01-01.
+    Seule la partie date (10 premiers caractères) est lue, comme `fromisoformat(...).date()`.
+    """
+    np = _numpy()
+    if len(values) == 0:
+        return np.empty(0, dtype=np.int64)
+    return np.asarray(values, dtype='U10').astype('datetime64[D]').astype(np.int64)
+
+
+def _bucket_ids(days: "np.ndarray", period: str) -> "np.ndarray":
+    """Identifiant absolu de compartiment (jour, lundi de la semaine ISO ou mois) pour chaque jour."""
+    np = _numpy()
+    if period == 'day':
+        return days
+    if period == 'week':
+        # 1970-01-01 est un jeudi : (jours + 3) % 7 donne 0 pour le lundi
+        return days - (days + 3) % 7
+    if period == 'month':
+        return days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    raise ValueError(f"Période inconnue : {period}")
+
+
+def _bucket_start(bucket_id: int, period: str) -> date:
+    if period == 'month':
+        year, month = divmod(bucket_id, 12)
+        return date(1970 + year, month + 1, 1)
+    return _EPOCH + timedelta(days=int(bucket_id))
+
+
+def bucket_labels(period: str, start_date: date, end_date: date) -> Tuple[int, List[str]]:
+    """
+    Libellés de tous les compartiments couvrant [start_date, end_date], pour les trois granularités.
+    Retourne aussi l'identifiant du premier compartiment, qui sert d'origine à l'indexation.
+    """
+    if period not in PERIOD_LABEL_FORMATS:
+        raise ValueError(f"Période inconnue : {period}")
+    np = _numpy()
+    bounds = np.array([(start_date - _EPOCH).days, (end_date - _EPOCH).days], dtype=np.int64)
+    first, last = (int(b) for b in _bucket_ids(bounds, period))
+    step = 7 if period == 'week' else 1
+    fmt = PERIOD_LABEL_FORMATS[period]
+    labels = [_bucket_start(b, period).strftime(fmt) for b in range(first, last + 1, step)]
+    return first, labels
+
+
+def bucket_counts(
+    values: Sequence[str],
+    period: str,
+    start_date: date,
+    end_date: date,
+    weights: Optional[Sequence[float]] = None
+) -> List[Tuple[str, int]]:
+    """
+    Compte (ou somme les poids) par jour, semaine ISO ou mois en une seule passe vectorisée.
+    Les dates hors de [start_date, end_date] sont ignorées.
+    """
+    np = _numpy()
+    first, labels = bucket_labels(period, start_date, end_date)
+    days = parse_day_ordinals(values)
+    in_range = (days >= (start_date - _EPOCH).days) & (days <= (end_date - _EPOCH).days)
+
+    index = _bucket_ids(days[in_range], period) - first
+    if period == 'week':
+        index //= 7
+    w = None if weights is None else np.asarray(weights, dtype=np.float64)[in_range]
+    counts = np.bincount(index, weights=w, minlength=len(labels))
+
+    return list(zip(labels, counts.astype(np.int64).tolist()))
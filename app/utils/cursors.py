@@ -0,0 +1,47 @@
+import base64
+import json
+import re
+from fastapi import HTTPException, status
+
+# Horodatage ISO 8601 tel que renvoyé par PostgREST : aucun caractère qui puisse
+# modifier le filtre `or` dans lequel la valeur est recopiée (guillemets, virgules...)
+_TIMESTAMP = re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(\.\d{1,6})?(Z|[+-]\d{2}(:?\d{2})?)?")
+
+
+def _cursor_int(value) -> int:
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(value)
+    return int(value)
+
+
+def _cursor_timestamp(value) -> str:
+    if not isinstance(value, str) or not _TIMESTAMP.fullmatch(value):
+        raise ValueError(value)
+    return value
+
+
+CURSOR_FIELD_TYPES = {"int": _cursor_int, "timestamp": _cursor_timestamp}
+
+
+def encode_cursor(position: dict) -> str:
+    """Curseur opaque (base64 URL) à partir d'une position de pagination."""
+    return base64.urlsafe_b64encode(json.dumps(position, separators=(",", ":")).encode()).decode()
+
+
+def decode_cursor(cursor: str, **fields: str) -> dict:
+    """
+    Décode un curseur opaque et valide chaque champ selon son type ("int" ou "timestamp"),
+    ex : `decode_cursor(cursor, d="timestamp", i="int")`. 400 s'il est illisible,
+    incomplet ou mal typé : un curseur forgé n'atteint jamais la requête.
+    """
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return {key: CURSOR_FIELD_TYPES[kind](position[key]) for key, kind in fields.items()}
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Curseur de pagination invalide.")
+
+
+def keyset_filter(column: str, value: str, id_column: str, last_id: int, descending: bool = False) -> str:
+    """Filtre PostgREST `or` pour reprendre après (value, last_id) dans l'ordre (column, id_column)."""
+    op = "lt" if descending else "gt"
+    return f'{column}.{op}."{value}",and({column}.eq."{value}",{id_column}.{op}.{int(last_id)})'
@@ -3,7 +3,7 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from ..schemas.users import TokenData
-from ..database.database import supabase
+from ..database.repositories import users_repository
 from ..schemas.users import UserResponse # Importer UserResponse
 # --- Configuration ---
 SECRET_KEY = os.getenv("SECRET_KEY")
@@ -32,11 +32,11 @@ async def get_current_user_data(token: str = Depends(oauth2_scheme)) -> UserResp
         raise credentials_exception
 
     # Récupérer l'utilisateur complet depuis la BDD
-    response = supabase.table("utilisateurs").select("*").eq("email", email).single().execute()
-    if not response.data:
+    user = await users_repository.get_by_email(email)
+    if not user:
         raise credentials_exception
-        
-    return UserResponse(**response.data)
+
+    return UserResponse(**user)
 
 def role_checker(required_role: str):
     """Vérifie si l'utilisateur a le rôle requis."""
@@ -89,6 +89,22 @@ def send_assignment_to_security(agent_email: str, incident_title: str, incident_
     )
     send_email(agent_email, subject, body)
 
+def send_assignments_digest_to_security(agent_email: str, incidents: List[Dict]):
+    """Informe un agent, en un seul email, de toutes les missions assignées lors d'un tri en lot."""
+    if len(incidents) == 1:
+        send_assignment_to_security(agent_email, incidents[0]['titre'], incidents[0]['id'])
+        return
+    subject = f"[GIF Mada] {len(incidents)} Nouvelles Missions Assignées"
+    missions = "".join(f"  - Incident #{inc['id']} : {inc['titre']}\n" for inc in incidents)
+    body = (
+        f"Bonjour,\n\n"
+        f"Les missions suivantes vous ont été assignées :\n"
+        f"{missions}\n"
+        f"Veuillez consulter votre tableau de bord pour plus de détails et commencer les interventions.\n\n"
+        f"L'équipe GIF Mada."
+    )
+    send_email(agent_email, subject, body)
+
 def send_panic_alert_notification(emails: List[str], incident_id: int, location: Dict):
     """Envoie une notification d'urgence pour le mode panique."""
     subject = f"--- ALERTE DANGER IMMÉDIAT --- Incident d'Urgence #{incident_id}"
@@ -103,6 +119,24 @@ def send_panic_alert_notification(emails: List[str], incident_id: int, location:
     for email in emails:
         send_email(email, subject, body)
 
+def send_spike_alert_notification(emails: List[str], alert: Dict):
+    """Prévient les autorités et le chef du Fokontany d'un pic inhabituel d'incidents."""
+    lieu = alert.get("nom_fokontany") or f"Fokontany #{alert['fokontany_id']}"
+    type_incident = alert.get("nom_type") or f"type #{alert['type_id']}"
+    subject = f"[GIF Mada] Pic d'incidents inhabituel : {type_incident} à {lieu}"
+    body = (
+        f"Bonjour,\n\n"
+        f"Un nombre inhabituel d'incidents a été signalé.\n"
+        f"  - Fokontany : {lieu}\n"
+        f"  - Type : {type_incident}\n"
+        f"  - Incidents sur la tranche de {alert['duree_tranche_minutes']} min (depuis {alert['debut_tranche']}) : {alert['nombre']}\n"
+        f"  - Moyenne habituelle sur une tranche : {alert['ligne_de_base']}\n\n"
+        f"Veuillez consulter votre tableau de bord pour évaluer la situation.\n\n"
+        f"L'équipe GIF Mada."
+    )
+    for email in emails:
+        send_email(email, subject, body)
+
 def send_password_reset_email(user_email: str, reset_token: str):
     """Envoie l'email contenant le lien de réinitialisation."""
     reset_url = f"http://localhost:3000/reset-password?token={reset_token}"
@@ -0,0 +1,244 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import defaultdict
+from datetime import date
+from typing import Callable, Dict, Iterable, List, Optional
+from fastapi import HTTPException, Request, Response
+from ..database.database import supabase
+from . import incident_events, metrics
+from .jobs import PeriodicJob, register_job
+
+logger = logging.getLogger(__name__)
+
+# Délai maximal avant qu'une écriture faite ailleurs (autre worker, accès direct
+# à la base) ne change les ETag et ne vide les caches de ce processus
+RESOURCE_VERSION_POLL_INTERVAL = float(os.getenv("RESOURCE_VERSION_POLL_INTERVAL", 1.0))
+
+VersionListener = Callable[[str], None]
+
+
+class ResourceVersions:
+    """
+    Versions des ressources lues dans la table `resource_versions`, que la base incrémente
+    à chaque écriture quel qu'en soit l'auteur : tous les workers calculent les mêmes ETag
+    et aucun redémarrage ne remet les versions à zéro.
+    Entre deux relectures, une écriture faite par ce processus incrémente un compteur local
+    (`bump`) pour qu'il voie aussitôt ses propres écritures. Un changement vu à la relecture
+    est notifié aux abonnés (`on_change`), qui vident leurs caches en mémoire.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._database: Dict[str, int] = {}
+        self._local: Dict[str, int] = defaultdict(int)
+        self._listeners: List[VersionListener] = []
+
+    def on_change(self, listener: VersionListener) -> VersionListener:
+        """Abonne une fonction aux changements de version vus en base (utilisable en décorateur)."""
+        self._listeners.append(listener)
+        return listener
+
+    def refresh(self) -> None:
+        rows = supabase.table("resource_versions").select("name, version").execute().data or []
+        changed = []
+        with self._lock:
+            for row in rows:
+                name, version = row["name"], row["version"]
+                if self._database.get(name) == version:
+                    continue
+                if name in self._database:
+                    changed.append(name)  # Le premier chargement n'est pas un changement
+                self._database[name] = version
+                self._local[name] = 0
+        for name in changed:
+            for listener in list(self._listeners):
+                try:
+                    listener(name)
+                except Exception:
+                    logger.exception("Resource version listener %s failed on %s",
+                                     getattr(listener, "__name__", repr(listener)), name)
+
+    def bump(self, *names: str) -> None:
+        with self._lock:
+            for name in names:
+                self._local[name] += 1
+
+    def current(self, *names: str) -> tuple:
+        """(version en base, écritures locales depuis) par ressource ; None tant que la base n'a pas été lue."""
+        with self._lock:
+            return tuple((self._database[name], self._local[name]) if name in self._database else None
+                         for name in names)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {name: {"version": version, "local_writes": self._local[name]}
+                    for name, version in self._database.items()}
+
+
+resource_versions = ResourceVersions()
+on_version_change = resource_versions.on_change
+metrics.register_gauge("resource_versions", resource_versions.stats)
+register_job(PeriodicJob("resource-versions", RESOURCE_VERSION_POLL_INTERVAL, resource_versions.refresh,
+                         run_at_start=True))
+
+
+def bump_version(*names: str) -> None:
+    """Écriture faite par ce processus sur une ou plusieurs ressources (ex: 'fokontany')."""
+    resource_versions.bump(*names)
+
+
+def current_versions(*names: str) -> tuple:
+    return resource_versions.current(*names)
+
+
+@incident_events.subscribe
+def _bump_incidents_version(event: str, incident: dict, old_status: Optional[str],
+                            previous: Optional[dict] = None) -> None:
+    bump_version("incidents")
+
+
+def make_etag(*parts) -> str:
+    """ETag fort dérivé de versions ou de paramètres."""
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_for_bytes(body: bytes) -> str:
+    """ETag fort dérivé du contenu exact de la réponse."""
+    return f'"{hashlib.sha1(body).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (c.strip() for c in if_none_match.split(","))
+    return any(c.removeprefix("W/") == etag for c in candidates)
+
+
+def versioned_etag(*names: str, per_user: bool = False, daily: bool = False, cache_control: Optional[str] = None):
+    """
+    Dépendance FastAPI : ETag calculé à partir des versions des ressources,
+    du chemin et des paramètres. Répond 304 AVANT la requête en base si le client
+    possède déjà cette version. `cache_control` est renvoyé tel quel (200 et 304).
+    Coroutine sans E/S : évaluée dans la boucle, sans passer par le pool de threads.
+    Tant que les versions n'ont pas été lues en base, aucun ETag n'est émis.
+    """
+    async def dependency(request: Request, response: Response) -> None:
+        versions = current_versions(*names)
+        if None in versions:
+            if cache_control:
+                response.headers["Cache-Control"] = cache_control
+            return
+        parts = [request.url.path, request.url.query, *versions]
+        if per_user:
+            parts.append(hashlib.sha1(request.headers.get("authorization", "").encode()).hexdigest())
+        if daily:
+            parts.append(date.today().isoformat())
+        etag = make_etag(*parts)
+        headers = {"ETag": etag}
+        if cache_control:
+            headers["Cache-Control"] = cache_control
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+    return dependency
+
+
+def _endpoint_label(scope) -> str:
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return route.path
+    return "/".join("{id}" if seg.isdigit() else seg for seg in scope["path"].split("/"))
+
+
+class ETagMiddleware:
+    """
+    Middleware ASGI pour les GET des chemins donnés :
+    - ajoute un ETag dérivé du contenu si la route n'en a pas fourni ;
+    - répond 304 si `If-None-Match` correspond ;
+    - compte les 304 par endpoint (exportés via les métriques 'etag').
+    Les réponses en streaming (plusieurs fragments) sont transmises sans tampon.
+    """
+
+    def __init__(self, app, paths: Iterable[str]):
+        self.app = app
+        self.paths = tuple(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        chunks = []
+        streaming = False
+
+        async def capture(message):
+            nonlocal start_message, streaming
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            if streaming:
+                await send(message)
+                return
+            if message.get("more_body", False) and not chunks:
+                streaming = True
+                await send(start_message)
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                await self._finish(scope, start_message, b"".join(chunks), send)
+
+        await self.app(scope, receive, capture)
+
+    async def _finish(self, scope, start_message, body: bytes, send):
+        label = _endpoint_label(scope)
+        status_code = start_message["status"]
+        headers = list(start_message.get("headers", []))
+        metrics.increment("etag", f"{label}:responses")
+        if status_code == 304:
+            metrics.increment("etag", f"{label}:304")
+        if status_code != 200:
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        existing = next((v.decode("latin-1") for k, v in headers if k.lower() == b"etag"), None)
+        etag = existing or etag_for_bytes(body)
+        if_none_match = next(
+            (v.decode("latin-1") for k, v in scope.get("headers", []) if k == b"if-none-match"), None
+        )
+        if etag_matches(if_none_match, etag):
+            metrics.increment("etag", f"{label}:304")
+            kept = [(k, v) for k, v in headers if k.lower() not in (b"content-length", b"content-type", b"etag")]
+            await send({"type": "http.response.start", "status": 304, "headers": kept + [(b"etag", etag.encode("latin-1"))]})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        if not existing:
+            headers.append((b"etag", etag.encode("latin-1")))
+        await send({**start_message, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+def etag_ratios() -> dict:
+    """Taux de 304 par endpoint, calculé à partir des compteurs bruts."""
+    raw = metrics.counters("etag")
+    ratios = {}
+    for key, value in raw.items():
+        label, _, kind = key.rpartition(":")
+        entry = ratios.setdefault(label, {"responses": 0, "not_modified": 0})
+        entry["responses" if kind == "responses" else "not_modified"] += value
+    for entry in ratios.values():
+        entry["ratio_304"] = round(entry["not_modified"] / entry["responses"], 4) if entry["responses"] else 0.0
+    return ratios
+
+
+metrics.register_gauge("etag_ratios", etag_ratios)
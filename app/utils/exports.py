@@ -0,0 +1,85 @@
+import csv
+import io
+import logging
+from typing import Callable, Iterable, Iterator, List, Optional
+from fastapi.responses import StreamingResponse
+from .cursors import keyset_filter
+from .serialization import encode_json
+
+EXPORT_PAGE_SIZE = 1000
+EXPORT_FORMATS = ["ndjson", "csv"]
+
+logger = logging.getLogger(__name__)
+
+
+def keyset_pages(build_query: Callable[[], object], page_size: int = EXPORT_PAGE_SIZE, key: str = "id",
+                 order_by: Optional[str] = None) -> Iterator[dict]:
+    """
+    Parcourt une table par pagination sur clé (`key > dernier`), page par page.
+    Avec `order_by` (ex : une date), l'ordre est (order_by, key) et la reprise se fait
+    après le couple (order_by, key) de la dernière ligne.
+    `build_query` doit renvoyer une requête PostgREST neuve (les builders sont mutables).
+    Une seule page est en mémoire à la fois, quelle que soit la taille de l'export.
+    """
+    last_row = None
+    while True:
+        query = build_query()
+        if order_by is None:
+            if last_row is not None:
+                query = query.gt(key, last_row[key])
+            query = query.order(key)
+        else:
+            if last_row is not None:
+                query = query.or_(keyset_filter(order_by, last_row[order_by], key, last_row[key]))
+            query = query.order(order_by).order(key)
+        rows = query.limit(page_size).execute().data or []
+        yield from rows
+        if len(rows) < page_size:
+            return
+        last_row = rows[-1]
+
+
+def ndjson_lines(rows: Iterable[dict], project: Callable[[dict], dict]) -> Iterator[bytes]:
+    for row in rows:
+        yield encode_json(project(row)) + b"\n"
+
+
+def csv_lines(rows: Iterable[dict], columns: List[str], flatten: Callable[[dict], dict]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+
+    def drain() -> bytes:
+        data = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate(0)
+        return data
+
+    writer.writeheader()
+    yield drain()
+    for row in rows:
+        writer.writerow(flatten(row))
+        yield drain()
+
+
+def _guarded(lines: Iterator[bytes], export_format: str) -> Iterator[bytes]:
+    """
+    Une fois les en-têtes envoyés, le statut HTTP ne peut plus changer. En cas d'erreur,
+    l'export NDJSON se termine par une ligne `{"error": ...}`, puis l'exception est relancée
+    pour interrompre la connexion : le client ne peut pas prendre un fichier tronqué pour complet.
+    """
+    try:
+        yield from lines
+    except Exception as e:
+        logger.exception("Streaming export failed")
+        if export_format == "ndjson":
+            yield encode_json({"error": str(e), "truncated": True}) + b"\n"
+        raise
+
+
+def export_response(lines: Iterator[bytes], export_format: str, filename: str) -> StreamingResponse:
+    media_type = "application/x-ndjson" if export_format == "ndjson" else "text/csv; charset=utf-8"
+    return StreamingResponse(
+        _guarded(lines, export_format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{export_format}"'}
+    )
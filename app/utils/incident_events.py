@@ -0,0 +1,34 @@
+import logging
+from typing import Callable, List, Optional
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Un abonné reçoit (événement, incident, ancien_statut, valeurs précédentes).
+# Événements : "created", "updated", "status_changed", "report_added", "deleted".
+# `previous` (facultatif) : colonnes de l'incident avant l'écriture (type_id, fokontany_id,
+# assigne_a_id, date_signalement...), pour invalider aussi ce qui dépendait des anciennes valeurs.
+IncidentListener = Callable[[str, dict, Optional[str], Optional[dict]], None]
+
+_listeners: List[IncidentListener] = []
+
+
+def subscribe(listener: IncidentListener) -> IncidentListener:
+    """Abonne une fonction aux écritures sur les incidents (utilisable en décorateur)."""
+    _listeners.append(listener)
+    return listener
+
+
+def publish(event: str, incident: dict, old_status: Optional[str] = None, previous: Optional[dict] = None) -> None:
+    """
+    Notifie les abonnés (caches, compteurs...) d'une écriture sur un incident.
+    Une erreur d'un abonné ne doit jamais faire échouer la requête d'origine :
+    elle est journalisée et comptée par abonné (groupe 'incident_listeners' de /admin/metrics).
+    """
+    for listener in list(_listeners):
+        try:
+            listener(event, incident, old_status, previous)
+        except Exception:
+            name = getattr(listener, "__name__", repr(listener))
+            metrics.increment("incident_listeners", f"{name}:errors")
+            logger.exception("Incident listener %s failed on %s (incident %s)", name, event, incident.get("id"))
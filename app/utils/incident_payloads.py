@@ -0,0 +1,83 @@
+from typing import Dict, Iterable, List, Optional
+from fastapi import HTTPException, Query, status
+from fastapi.responses import JSONResponse
+from ..schemas.incidents import IncidentResponse, IncidentBaseResponse, FokontanyResponse, IncidentTypeResponse
+from ..utils.serialization import fast_list_response, prepare
+from ..utils.reference_data import reference_data
+
+# Références embarquées dans IncidentResponse et leur table / clé étrangère
+REFERENCE_TABLES = {
+    "fokontany": ("fokontany", "fokontany_id", FokontanyResponse),
+    "typesincident": ("typesincident", "type_id", IncidentTypeResponse),
+}
+# Champs scalaires sélectionnables (les objets embarqués passent par `include`)
+INCIDENT_FIELDS = list(IncidentBaseResponse.model_fields)
+# Toujours renvoyés, pour que le client puisse résoudre les références
+REQUIRED_FIELDS = ["id", "fokontany_id", "type_id"]
+
+prepare(IncidentResponse)
+
+
+def _split(value: Optional[str]) -> List[str]:
+    return [part.strip() for part in value.split(",") if part.strip()] if value else []
+
+
+def fetch_references(name: str, ids: Iterable[int]) -> Dict[str, dict]:
+    """Entités de référence demandées, indexées par ID (cache en mémoire, sans appel à la base)."""
+    table, _, model = REFERENCE_TABLES[name]
+    rows = (reference_data.get(table, i) for i in {i for i in ids if i is not None})
+    return {str(row["id"]): {f: row.get(f) for f in model.model_fields} for row in rows if row}
+
+
+class IncidentPayloadOptions:
+    """
+    Mode de réponse compact des listes d'incidents :
+    - `fields` : champs scalaires à renvoyer (les clés étrangères sont toujours incluses) ;
+    - `include` : références à renvoyer une seule fois dans `included`, indexées par ID.
+    Sans ces paramètres, la réponse complète habituelle est conservée.
+    """
+
+    def __init__(self, fields: Optional[str], include: Optional[str]):
+        requested_fields = _split(fields)
+        self.include = _split(include)
+        unknown = [f for f in requested_fields if f not in INCIDENT_FIELDS]
+        unknown += [i for i in self.include if i not in REFERENCE_TABLES]
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Champs inconnus : {', '.join(unknown)}"
+            )
+        self.compact = bool(fields or include)
+        selected = requested_fields or INCIDENT_FIELDS
+        self.fields = REQUIRED_FIELDS + [f for f in selected if f not in REQUIRED_FIELDS]
+
+    def select_clause(self, full_select: str) -> str:
+        """Clause `select` PostgREST : sans jointures en mode compact."""
+        return ", ".join(self.fields) if self.compact else full_select
+
+    def columns(self) -> Optional[List[str]]:
+        """Colonnes à projeter pour les dépôts : None pour la sélection complète avec références."""
+        return self.fields if self.compact else None
+
+    def render(self, rows: List[dict]):
+        """Retourne la liste complète (sérialisation rapide), ou l'enveloppe compacte `data` / `included`."""
+        if not self.compact:
+            return fast_list_response(IncidentResponse, rows)
+        included = {}
+        for name in self.include:
+            _, foreign_key, _ = REFERENCE_TABLES[name]
+            included[name] = fetch_references(name, (row.get(foreign_key) for row in rows))
+        return JSONResponse(content={"data": rows, "included": included})
+
+    async def render_async(self, rows: List[dict]):
+        """`render` pour les routes `async def` : les tables de référence manquantes sont lues sans bloquer la boucle."""
+        if self.compact and self.include:
+            await reference_data.ensure_loaded(*(REFERENCE_TABLES[name][0] for name in self.include))
+        return self.render(rows)
+
+
+async def incident_payload_options(
+    fields: Optional[str] = Query(None, description="Champs à renvoyer, séparés par des virgules (mode compact)"),
+    include: Optional[str] = Query(None, description="Références à joindre une seule fois : fokontany, typesincident")
+) -> IncidentPayloadOptions:
+    return IncidentPayloadOptions(fields, include)
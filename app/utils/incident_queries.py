@@ -0,0 +1,38 @@
+from ..schemas.incidents import IncidentFilters
+
+# Sélection standard des listes d'incidents (références embarquées)
+INCIDENT_LIST_SELECT = "*, fokontany:fokontany_id(*), typesincident:type_id(*)"
+
+
+def apply_incident_filters(query, filters: IncidentFilters):
+    """Applique un IncidentFilters à une requête PostgREST sur la table incidents."""
+    if filters.statut:
+        query = query.in_("statut", filters.statut)
+    if filters.type_id:
+        query = query.eq("type_id", filters.type_id)
+    if filters.fokontany_id:
+        query = query.eq("fokontany_id", filters.fokontany_id)
+    if filters.signale_par_id:
+        query = query.eq("signale_par_id", str(filters.signale_par_id))
+    if filters.assigne_a_id:
+        query = query.eq("assigne_a_id", str(filters.assigne_a_id))
+    start, end = filters.date_bounds()
+    if start:
+        query = query.gte("date_signalement", start)
+    if end:
+        query = query.lte("date_signalement", end)
+    return query
+
+
+def incident_filters_rpc_params(filters: IncidentFilters) -> dict:
+    """Traduit un IncidentFilters en paramètres pour les fonctions SQL (RPC)."""
+    start, end = filters.date_bounds()
+    return {
+        "p_statuts": filters.statut or None,
+        "p_type_id": filters.type_id,
+        "p_fokontany_id": filters.fokontany_id,
+        "p_signale_par_id": str(filters.signale_par_id) if filters.signale_par_id else None,
+        "p_assigne_a_id": str(filters.assigne_a_id) if filters.assigne_a_id else None,
+        "p_start": start,
+        "p_end": end,
+    }
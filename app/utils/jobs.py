@@ -0,0 +1,57 @@
+import threading
+from typing import Callable, List, Optional
+
+
+class PeriodicJob:
+    """Tâche de fond exécutée à intervalle régulier dans un thread démon."""
+
+    def __init__(self, name: str, interval: float, fn: Callable[[], object], run_at_start: bool = False):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self.run_at_start = run_at_start
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self) -> None:
+        try:
+            self.fn()
+        except Exception as e:
+            print(f"ERROR in background job {self.name}: {e}")
+
+    def _run(self) -> None:
+        if self.run_at_start:
+            self.run_once()
+        while not self._stopping.wait(self.interval):
+            self.run_once()
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._stopping.set()
+            self._thread.join(timeout=10)
+            self._thread = None
+
+
+_jobs: List[PeriodicJob] = []
+
+
+def register_job(job: PeriodicJob) -> PeriodicJob:
+    """Déclare une tâche démarrée / arrêtée avec l'application (voir main.py)."""
+    _jobs.append(job)
+    return job
+
+
+def start_jobs() -> None:
+    for job in _jobs:
+        job.start()
+
+
+def stop_jobs() -> None:
+    for job in _jobs:
+        job.stop()
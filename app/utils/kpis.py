@@ -0,0 +1,164 @@
+import os
+import threading
+from datetime import date, datetime, timezone
+from typing import Optional
+from ..database.database import supabase
+from . import incident_events, metrics
+from .etag import on_version_change
+from .jobs import PeriodicJob, register_job
+
+PENDING_STATUSES = ("NOUVEAU", "URGENT")
+KPI_RECONCILE_INTERVAL = float(os.getenv("KPI_RECONCILE_INTERVAL", 300))
+
+
+def _utc_today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+def _resolution_seconds(incident: dict) -> Optional[float]:
+    if incident.get("statut") != "RESOLU" or not incident.get("date_resolution") or not incident.get("date_signalement"):
+        return None
+    resolved = datetime.fromisoformat(str(incident["date_resolution"]))
+    reported = datetime.fromisoformat(str(incident["date_signalement"]))
+    return (resolved - reported).total_seconds()
+
+
+class KpiCounters:
+    """
+    Compteurs des tableaux de bord tenus en mémoire : lus en temps constant,
+    mis à jour par les écritures (événements incidents, routes utilisateurs)
+    et recalés périodiquement sur la base (RPC `incident_kpi_totals`).
+    Propres au processus : une écriture d'incident faite ailleurs (autre worker,
+    accès direct à la base) déclenche une réconciliation dès que la version
+    `incidents` change en base.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.day = _utc_today()
+        self.incidents_total = 0
+        self.incidents_aujourdhui = 0
+        self.incidents_en_attente = 0
+        self.resolution_secondes = 0.0
+        self.resolutions = 0
+        self.utilisateurs_en_attente = 0
+        self.agents_actifs = 0
+
+    def reconcile(self) -> None:
+        """Recharge tous les compteurs depuis la base."""
+        totals = supabase.rpc("incident_kpi_totals", {}).execute().data or {}
+        with self._lock:
+            self.day = _utc_today()
+            self.incidents_total = totals.get("incidents_total", 0)
+            self.incidents_aujourdhui = totals.get("incidents_aujourdhui", 0)
+            self.incidents_en_attente = totals.get("incidents_en_attente", 0)
+            self.resolution_secondes = float(totals.get("resolution_secondes") or 0)
+            self.resolutions = totals.get("resolutions", 0)
+            self.utilisateurs_en_attente = totals.get("utilisateurs_en_attente", 0)
+            self.agents_actifs = totals.get("agents_actifs", 0)
+            self._loaded = True
+
+    def refresh_users(self) -> None:
+        """
+        Recompte les utilisateurs après une écriture sur un compte (inscription, validation,
+        rôle, suppression). Ces écritures sont rares ; un échec ne fait pas échouer la requête.
+        """
+        if not self._loaded:
+            return
+        try:
+            pending = supabase.table("utilisateurs").select("id", count='exact').eq("est_verifie", False).execute()
+            agents = supabase.table("utilisateurs").select("id", count='exact').eq("role", "SECURITE_URBAINE").eq("est_verifie", True).execute()
+        except Exception as e:
+            print(f"ERROR refreshing user KPIs: {e}")
+            return
+        with self._lock:
+            self.utilisateurs_en_attente = pending.count or 0
+            self.agents_actifs = agents.count or 0
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.reconcile()
+
+    def _roll_day(self) -> None:
+        # Appelé sous verrou : les incidents "du jour" repartent de zéro à minuit UTC
+        today = _utc_today()
+        if today != self.day:
+            self.day = today
+            self.incidents_aujourdhui = 0
+
+    def on_incident_event(self, event: str, incident: dict, old_status: Optional[str],
+                          previous: Optional[dict] = None) -> None:
+        if not self._loaded:
+            return  # Le premier chargement lira l'état à jour
+        statut = incident.get("statut")
+        signale = incident.get("date_signalement")
+        reported_today = bool(signale) and str(signale)[:10] == _utc_today().isoformat()
+        with self._lock:
+            self._roll_day()
+            if event == "created":
+                self.incidents_total += 1
+                if reported_today:
+                    self.incidents_aujourdhui += 1
+                if statut in PENDING_STATUSES:
+                    self.incidents_en_attente += 1
+            elif event == "status_changed":
+                if old_status in PENDING_STATUSES:
+                    self.incidents_en_attente -= 1
+                if statut in PENDING_STATUSES:
+                    self.incidents_en_attente += 1
+                seconds = _resolution_seconds(incident)
+                if seconds is not None and old_status != "RESOLU":
+                    self.resolution_secondes += seconds
+                    self.resolutions += 1
+            elif event == "deleted":
+                self.incidents_total -= 1
+                if reported_today:
+                    self.incidents_aujourdhui -= 1
+                if statut in PENDING_STATUSES:
+                    self.incidents_en_attente -= 1
+                seconds = _resolution_seconds(incident)
+                if seconds is not None:
+                    self.resolution_secondes -= seconds
+                    self.resolutions -= 1
+
+    def admin(self) -> dict:
+        self._ensure_loaded()
+        with self._lock:
+            self._roll_day()
+            return {
+                "utilisateurs_en_attente": self.utilisateurs_en_attente,
+                "incidents_total": self.incidents_total,
+                "incidents_aujourdhui": self.incidents_aujourdhui,
+            }
+
+    def authority(self) -> dict:
+        self._ensure_loaded()
+        with self._lock:
+            average = None
+            if self.resolutions > 0:
+                average = round((self.resolution_secondes / self.resolutions) / 3600, 2)
+            return {
+                "incidents_a_valider": self.incidents_en_attente,
+                "agents_actifs": self.agents_actifs,
+                "temps_resolution_moyen_heures": average,
+            }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"loaded": self._loaded, "day": self.day.isoformat(),
+                    "incidents_total": self.incidents_total, "resolutions": self.resolutions}
+
+
+kpis = KpiCounters()
+incident_events.subscribe(kpis.on_incident_event)
+
+
+@on_version_change
+def _reconcile_on_version_change(name: str) -> None:
+    if name == "incidents" and kpis._loaded:
+        kpis.reconcile()
+
+
+metrics.register_gauge("kpis", kpis.stats)
+register_job(PeriodicJob("kpi-reconcile", KPI_RECONCILE_INTERVAL, kpis.reconcile))
@@ -0,0 +1,154 @@
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, Iterable, List, NamedTuple, Optional
+from ..database.database import supabase
+from . import metrics
+
+# Colonnes des utilisateurs chargés par lot (notifications, contacts d'urgence)
+USER_LOADER_SELECT = "*, postes_securite(nom_poste)"
+
+
+class _InFlight:
+    """
+    Lectures en cours, partagées entre les requêtes d'un même loader : une clé déjà
+    demandée par une requête concurrente est attendue au lieu d'être relue en base.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._futures: Dict[Hashable, Future] = {}
+
+    def claim(self, keys: List[Hashable]):
+        """Sépare les clés à lire soi-même de celles déjà en cours de lecture ailleurs."""
+        owned, waiting = {}, {}
+        with self._lock:
+            for key in keys:
+                future = self._futures.get(key)
+                if future is None:
+                    future = self._futures[key] = Future()
+                    owned[key] = future
+                else:
+                    waiting[key] = future
+        return owned, waiting
+
+    def release(self, keys: Iterable[Hashable]) -> None:
+        with self._lock:
+            for key in keys:
+                self._futures.pop(key, None)
+
+
+_in_flight: Dict[str, _InFlight] = {}
+
+
+class DataLoader:
+    """
+    Regroupe et mémorise les lectures par clé pour la durée d'une requête :
+    `load_many` lit toutes les clés manquantes en un seul appel à `batch_fn`
+    (une requête `in_()` ou `or_()`), et une clé déjà lue n'est jamais relue.
+    `batch_fn(keys)` renvoie un dict clé -> valeur ; une clé absente vaut `default`.
+    """
+
+    def __init__(self, name: str, batch_fn: Callable[[List[Hashable]], Dict[Hashable, object]], default=None):
+        self.name = name
+        self._batch_fn = batch_fn
+        self._default = default
+        self._cache: Dict[Hashable, object] = {}
+        self._in_flight = _in_flight.setdefault(name, _InFlight())
+
+    def load(self, key: Hashable):
+        return self.load_many([key])[key]
+
+    def load_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, object]:
+        keys = list(dict.fromkeys(keys))
+        missing = [k for k in keys if k not in self._cache]
+        metrics.increment("loaders", f"{self.name}:hits", len(keys) - len(missing))
+        if missing:
+            self._fetch(missing)
+        return {k: self._cache[k] for k in keys}
+
+    def _fetch(self, keys: List[Hashable]) -> None:
+        owned, waiting = self._in_flight.claim(keys)
+        if owned:
+            try:
+                found = self._batch_fn(list(owned))
+                metrics.increment("loaders", f"{self.name}:batches")
+                metrics.increment("loaders", f"{self.name}:keys", len(owned))
+                for key, future in owned.items():
+                    future.set_result(found.get(key, self._default))
+            except Exception as e:
+                for future in owned.values():
+                    future.set_exception(e)
+                raise
+            finally:
+                self._in_flight.release(owned)
+        for key, future in {**owned, **waiting}.items():
+            self._cache[key] = future.result()
+        metrics.increment("loaders", f"{self.name}:shared", len(waiting))
+
+
+# --- Lots disponibles ---
+
+class UserScope(NamedTuple):
+    """Ensemble d'utilisateurs vérifiés d'un rôle, éventuellement restreint à un fokontany et à un poste."""
+    role: str
+    fokontany_id: Optional[int] = None
+    poste_securite_id: Optional[int] = None
+
+    def filter_clause(self) -> str:
+        parts = [f"role.eq.{self.role}"]
+        if self.fokontany_id is not None:
+            parts.append(f"fokontany_id.eq.{int(self.fokontany_id)}")
+        if self.poste_securite_id is not None:
+            parts.append(f"poste_securite_id.eq.{int(self.poste_securite_id)}")
+        return parts[0] if len(parts) == 1 else f"and({','.join(parts)})"
+
+    def matches(self, user: dict) -> bool:
+        return (
+            user.get("role") == self.role
+            and (self.fokontany_id is None or user.get("fokontany_id") == self.fokontany_id)
+            and (self.poste_securite_id is None or user.get("poste_securite_id") == self.poste_securite_id)
+        )
+
+
+def _users_by_id(ids: List[Hashable]) -> Dict[Hashable, dict]:
+    response = supabase.table("utilisateurs").select(USER_LOADER_SELECT).in_("id", [str(i) for i in ids]).execute()
+    by_id = {row["id"]: row for row in response.data or []}
+    return {i: by_id.get(str(i)) for i in ids}
+
+
+def _verified_users_by_scope(scopes: List[UserScope]) -> Dict[Hashable, List[dict]]:
+    # Un seul aller-retour pour tous les périmètres : or=(role.eq.X,and(role.eq.Y,fokontany_id.eq.Z),...)
+    response = supabase.table("utilisateurs").select(USER_LOADER_SELECT) \
+        .eq("est_verifie", True) \
+        .or_(",".join(scope.filter_clause() for scope in scopes)) \
+        .execute()
+    rows = response.data or []
+    return {scope: [row for row in rows if scope.matches(row)] for scope in scopes}
+
+
+class Loaders:
+    """Loaders d'une requête ; obtenus par la dépendance `request_loaders`."""
+
+    def __init__(self):
+        self.users = DataLoader("users", _users_by_id)
+        self.verified_users = DataLoader("verified_users", _verified_users_by_scope, default=[])
+
+    def verified_emails(self, *scopes: UserScope) -> List[str]:
+        """Emails distincts des utilisateurs vérifiés de tous les périmètres, en une lecture."""
+        emails = {}
+        for users in self.verified_users.load_many(scopes).values():
+            emails.update((u["email"], None) for u in users if u.get("email"))
+        return list(emails)
+
+    def verified_contacts(self, *scopes: UserScope) -> List[dict]:
+        """Utilisateurs vérifiés des périmètres, sans doublon, dans l'ordre des périmètres."""
+        contacts = {}
+        for users in self.verified_users.load_many(scopes).values():
+            for user in users:
+                contacts.setdefault(user["id"], user)
+        return list(contacts.values())
+
+
+async def request_loaders() -> Loaders:
+    """Dépendance FastAPI : une instance par requête, partagée par ses sous-dépendances."""
+    return Loaders()
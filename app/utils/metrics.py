@@ -0,0 +1,35 @@
+import threading
+from collections import defaultdict
+from typing import Callable, Dict
+
+_lock = threading.Lock()
+_counters: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+_gauges: Dict[str, Callable[[], dict]] = {}
+
+
+def increment(group: str, name: str, value: int = 1) -> None:
+    """Incrémente le compteur `name` du groupe `group` (ex: 'etag', 'incidents.me:304')."""
+    with _lock:
+        _counters[group][name] += value
+
+
+def register_gauge(group: str, fn: Callable[[], dict]) -> None:
+    """Enregistre une fonction appelée à l'export (taille d'un cache, taux de succès...)."""
+    _gauges[group] = fn
+
+
+def counters(group: str) -> Dict[str, int]:
+    with _lock:
+        return dict(_counters.get(group, {}))
+
+
+def snapshot() -> dict:
+    """Instantané de toutes les métriques, exporté par la route d'administration."""
+    with _lock:
+        data = {group: dict(values) for group, values in _counters.items()}
+    for group, fn in _gauges.items():
+        try:
+            data[group] = fn()
+        except Exception as e:
+            data[group] = {"error": str(e)}
+    return data
@@ -0,0 +1,122 @@
+import os
+import threading
+from typing import Dict, List, Optional
+from ..database.database import supabase, async_supabase
+from . import metrics
+from .etag import bump_version, on_version_change
+from .jobs import PeriodicJob, register_job
+
+# Tables de référence (quelques modifications par an) : clé de tri des listes
+REFERENCE_ORDER = {
+    "fokontany": "nom_fokontany",
+    "postes_securite": "nom_poste",
+    "typesincident": "nom_type",
+}
+REFERENCE_REFRESH_INTERVAL = float(os.getenv("REFERENCE_REFRESH_INTERVAL", 600))
+# En-tête des lectures publiques : courte durée, puis revalidation par ETag
+REFERENCE_CACHE_CONTROL = "public, max-age=300, must-revalidate"
+
+
+class ReferenceCache:
+    """
+    Copie en mémoire des tables de référence, servie sans appel à la base.
+    Chaque table porte la même version que ses ETag (`bump_version`) : les routes
+    CRUD d'administration appellent `invalidate`, une table modifiée ailleurs (autre
+    worker, accès direct à la base) est rechargée dès que sa version change en base,
+    et un rafraîchissement périodique sert de filet de sécurité.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows: Dict[str, List[dict]] = {}
+        self._by_id: Dict[str, Dict[int, dict]] = {}
+        # Incrémenté par `invalidate` : une lecture commencée avant ne peut plus être stockée
+        self._generation: Dict[str, int] = {}
+
+    def _fetch(self, name: str) -> List[dict]:
+        return supabase.table(name).select("*").order(REFERENCE_ORDER[name]).execute().data or []
+
+    def _store(self, name: str, rows: List[dict], generation: int) -> bool:
+        """Remplace le contenu d'une table ; renvoie True s'il a changé."""
+        with self._lock:
+            if self._generation.get(name, 0) != generation:
+                return False  # Écriture d'administration pendant la lecture : résultat périmé
+            changed = self._rows.get(name) != rows
+            self._rows[name] = rows
+            self._by_id[name] = {row["id"]: row for row in rows}
+        return changed
+
+    def load(self, name: str) -> List[dict]:
+        generation = self._generation.get(name, 0)
+        rows = self._fetch(name)
+        if self._store(name, rows, generation):
+            bump_version(name)
+        return rows
+
+    async def ensure_loaded(self, *names: str) -> None:
+        """
+        Charge les tables absentes du cache avec le client asynchrone : à appeler depuis
+        une route `async def` avant `get` / `all`, pour qu'un défaut de cache (ex : juste
+        après `invalidate`) ne bloque pas la boucle avec le client synchrone.
+        """
+        for name in names:
+            if name in self._rows:
+                continue
+            generation = self._generation.get(name, 0)
+            client = await async_supabase.get()
+            response = await client.table(name).select("*").order(REFERENCE_ORDER[name]).execute()
+            if self._store(name, response.data or [], generation):
+                bump_version(name)
+
+    def warm(self) -> None:
+        """Chargement initial de toutes les tables (démarrage)."""
+        for name in REFERENCE_ORDER:
+            self.load(name)
+
+    def refresh(self) -> None:
+        for name in REFERENCE_ORDER:
+            try:
+                self.load(name)
+            except Exception as e:
+                print(f"ERROR refreshing reference table {name}: {e}")
+
+    def invalidate(self, name: str) -> None:
+        """À appeler après toute écriture sur une table de référence."""
+        with self._lock:
+            self._generation[name] = self._generation.get(name, 0) + 1
+            self._rows.pop(name, None)
+            self._by_id.pop(name, None)
+        bump_version(name)
+
+    def all(self, name: str) -> List[dict]:
+        """Copie des lignes : l'appelant peut les modifier sans altérer le cache."""
+        rows = self._rows.get(name)
+        if rows is None:
+            rows = self.load(name)
+        return [dict(row) for row in rows]
+
+    def get(self, name: str, ref_id: Optional[int]) -> Optional[dict]:
+        if ref_id is None:
+            return None
+        by_id = self._by_id.get(name)
+        if by_id is None:
+            by_id = {row["id"]: row for row in self.load(name)}
+        row = by_id.get(ref_id)
+        return dict(row) if row is not None else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {name: len(rows) for name, rows in self._rows.items()}
+
+
+reference_data = ReferenceCache()
+
+
+@on_version_change
+def _reload_changed_table(name: str) -> None:
+    if name in REFERENCE_ORDER:
+        reference_data.load(name)
+
+
+metrics.register_gauge("reference_data", reference_data.stats)
+register_job(PeriodicJob("reference-refresh", REFERENCE_REFRESH_INTERVAL, reference_data.refresh))
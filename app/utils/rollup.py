@@ -0,0 +1,24 @@
+import os
+from datetime import date, timedelta
+from ..database.database import supabase
+from .jobs import PeriodicJob, register_job
+
+# Table maintenue par trigger (voir supabase/migrations/*_incident_daily_rollup.sql)
+ROLLUP_RECONCILE_DAYS = int(os.getenv("ROLLUP_RECONCILE_DAYS", 7))
+ROLLUP_RECONCILE_INTERVAL = float(os.getenv("ROLLUP_RECONCILE_INTERVAL", 3600))
+
+
+def reconcile_recent_rollup(days: int = ROLLUP_RECONCILE_DAYS) -> int:
+    """Compare l'agrégat des derniers jours aux incidents et le recalcule en cas d'écart."""
+    end = date.today()
+    start = end - timedelta(days=days)
+    drift = supabase.rpc("reconcile_incident_daily_rollup", {
+        "p_start": start.isoformat(),
+        "p_end": end.isoformat()
+    }).execute().data or 0
+    if drift:
+        print(f"Rollup incidents: {drift} groupe(s) corrigé(s) entre {start} et {end}.")
+    return drift
+
+
+register_job(PeriodicJob("rollup-reconcile", ROLLUP_RECONCILE_INTERVAL, reconcile_recent_rollup))
@@ -1,13 +1,9 @@
 import os
 from datetime import datetime, timedelta, timezone
 from typing import Optional
-from dotenv import load_dotenv
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 
-# Charger les variables d'environnement
-load_dotenv()
-
 # --- Configuration du hachage de mot de passe ---
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
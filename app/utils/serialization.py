@@ -0,0 +1,181 @@
+import json
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Type, Union, get_args, get_origin
+from uuid import UUID
+from fastapi.responses import Response
+from pydantic import BaseModel, TypeAdapter
+
+try:
+    import orjson
+except ImportError:  # orjson est optionnel : repli sur la bibliothèque standard
+    orjson = None
+
+
+def encode_json(content: Any) -> bytes:
+    """Encode en JSON compact, octet pour octet identique à la JSONResponse de FastAPI."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """Réponse dont le corps est déjà encodé en octets."""
+    media_type = "application/json"
+
+
+class _Unsupported(Exception):
+    pass
+
+
+def _datetime(value):
+    # Même rendu que pydantic : ISO 8601, UTC noté "Z"
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    text = value.isoformat()
+    return text[:-6] + "Z" if text.endswith("+00:00") else text
+
+
+def _float(value):
+    return float(value)
+
+
+def _uuid(value):
+    return value if isinstance(value, str) else str(value)
+
+
+def _optional(inner: Callable) -> Callable:
+    return lambda value: None if value is None else inner(value)
+
+
+def _list_of(inner: Callable) -> Callable:
+    return lambda values: [inner(v) for v in values]
+
+
+def _converter(annotation) -> Optional[Callable]:
+    """Convertisseur d'une valeur brute de la BDD vers sa forme JSON ; None = identité."""
+    origin = get_origin(annotation)
+    if origin is Union:
+        args = [a for a in get_args(annotation) if a is not type(None)]
+        if len(args) != 1:
+            raise _Unsupported(annotation)
+        inner = _converter(args[0])
+        return _optional(inner) if inner else None
+    if origin in (list, List):
+        args = get_args(annotation)
+        inner = _converter(args[0]) if args else None
+        return _list_of(inner) if inner else list
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return _projector(annotation)
+    if annotation is datetime:
+        return _datetime
+    if annotation is float:
+        return _float
+    if annotation is UUID:
+        return _uuid
+    if annotation in (int, str, bool):
+        return None
+    raise _Unsupported(annotation)
+
+
+_PROJECTORS: Dict[type, Callable] = {}
+_MISSING = object()
+
+
+def _projector(model: Type[BaseModel]) -> Callable[[dict], dict]:
+    """
+    Compile une fois par modèle une fonction qui projette une ligne de la BDD
+    sur les champs déclarés (ordre, valeurs par défaut, formats) sans validation.
+    """
+    if model in _PROJECTORS:
+        return _PROJECTORS[model]
+    plan = []
+    for name, info in model.model_fields.items():
+        if info.alias and info.alias != name:
+            raise _Unsupported(f"{model.__name__}.{name}")
+        if info.is_required():
+            default = _MISSING
+        elif info.default_factory is not None:
+            default = info.default_factory
+        else:
+            default = info.default
+        plan.append((name, _converter(info.annotation), default))
+
+    def project(row: dict) -> dict:
+        out = {}
+        for name, convert, default in plan:
+            value = row.get(name, _MISSING)
+            if value is _MISSING:
+                if default is _MISSING:
+                    raise KeyError(name)
+                value = default() if callable(default) else default
+                if isinstance(value, BaseModel):
+                    value = value.model_dump(mode="json")
+                out[name] = value
+                continue
+            out[name] = convert(value) if convert and value is not None else value
+        return out
+
+    _PROJECTORS[model] = project
+    return project
+
+
+_ADAPTERS: Dict[Any, TypeAdapter] = {}
+
+
+def _adapter(annotation) -> TypeAdapter:
+    if annotation not in _ADAPTERS:
+        _ADAPTERS[annotation] = TypeAdapter(annotation)
+    return _ADAPTERS[annotation]
+
+
+def prepare(model: Type[BaseModel], *models: Type[BaseModel]) -> None:
+    """Pré-construit projecteurs et TypeAdapters (à appeler au chargement des routers)."""
+    for m in (model, *models):
+        try:
+            _projector(m)
+        except _Unsupported:
+            pass
+        _adapter(m)
+        _adapter(List[m])
+
+
+def serialize(model: Type[BaseModel], data, many: bool = False, trusted: bool = True) -> bytes:
+    """
+    Sérialise des lignes PostgREST comme le ferait `response_model`.
+    Les lignes de confiance sont projetées sans validation ; en cas d'écart
+    (champ requis absent, type inattendu), repli sur la validation pydantic.
+    """
+    if trusted:
+        try:
+            project = _projector(model)
+            return encode_json([project(row) for row in data] if many else project(data))
+        except (_Unsupported, KeyError, TypeError, ValueError, AttributeError):
+            pass
+    adapter = _adapter(List[model] if many else model)
+    return adapter.dump_json(adapter.validate_python(data))
+
+
+def row_projector(model: Type[BaseModel]) -> Callable[[dict], dict]:
+    """Projection ligne par ligne vers un dict JSON (exports en streaming), avec repli validé."""
+    adapter = _adapter(model)
+    try:
+        project = _projector(model)
+    except _Unsupported:
+        project = None
+
+    def convert(row: dict) -> dict:
+        if project is not None:
+            try:
+                return project(row)
+            except (KeyError, TypeError, ValueError, AttributeError):
+                pass
+        return adapter.dump_python(adapter.validate_python(row), mode="json")
+    return convert
+
+
+def fast_response(model: Type[BaseModel], data, status_code: int = 200) -> FastJSONResponse:
+    return FastJSONResponse(content=serialize(model, data), status_code=status_code)
+
+
+def fast_list_response(model: Type[BaseModel], rows: List[dict]) -> FastJSONResponse:
+    return FastJSONResponse(content=serialize(model, rows or [], many=True))
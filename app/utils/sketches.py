@@ -0,0 +1,184 @@
+import math
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from ..database.database import supabase
+from . import incident_events, metrics
+from .jobs import PeriodicJob, register_job
+
+# Doit rester identique à supabase/migrations/*_resolution_sketches.sql
+RELATIVE_ACCURACY = 0.01
+MIN_VALUE = 1.0
+SKETCH_MAX_BINS = int(os.getenv("SKETCH_MAX_BINS", 2048))
+SKETCH_PERSIST_INTERVAL = float(os.getenv("SKETCH_PERSIST_INTERVAL", 60))
+
+DIMENSIONS = ("global", "fokontany", "type", "agent")
+
+
+class DDSketch:
+    """
+    Esquisse de quantiles à erreur relative bornée (DDSketch) : compartiments
+    logarithmiques de raison gamma, fusionnables par simple addition des comptes.
+    Au-delà de `max_bins`, les compartiments les plus bas sont regroupés (mémoire bornée).
+    """
+
+    gamma = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+    _log_gamma = math.log(gamma)
+
+    def __init__(self, max_bins: int = SKETCH_MAX_BINS):
+        self.max_bins = max_bins
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+
+    @property
+    def count(self) -> int:
+        return self.zero_count + sum(self.bins.values())
+
+    def add(self, value: float, weight: int = 1) -> None:
+        if value <= MIN_VALUE:
+            self.zero_count += weight
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self.bins[index] = self.bins.get(index, 0) + weight
+        self._collapse()
+
+    def merge(self, other: "DDSketch") -> None:
+        self.zero_count += other.zero_count
+        for index, n in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + n
+        self._collapse()
+
+    def _collapse(self) -> None:
+        if len(self.bins) <= self.max_bins:
+            return
+        indexes = sorted(self.bins)
+        excess = indexes[:len(indexes) - self.max_bins + 1]
+        target = indexes[len(excess)]
+        for index in excess:
+            self.bins[target] += self.bins.pop(index)
+
+    def quantile(self, q: float) -> Optional[float]:
+        total = self.count
+        if total == 0:
+            return None
+        rank = q * (total - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if rank < seen:
+                # Milieu (relatif) du compartiment : erreur relative <= RELATIVE_ACCURACY
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def to_row(self) -> dict:
+        return {"zero_count": self.zero_count, "bins": {str(i): n for i, n in self.bins.items()}}
+
+    @classmethod
+    def from_row(cls, row: dict) -> "DDSketch":
+        sketch = cls()
+        sketch.zero_count = int(row.get("zero_count") or 0)
+        sketch.bins = {int(i): int(n) for i, n in (row.get("bins") or {}).items()}
+        sketch._collapse()
+        return sketch
+
+
+SketchKey = Tuple[str, str]
+
+
+class ResolutionSketches:
+    """
+    Durées de résolution par fokontany, type et agent (plus une esquisse globale).
+    Les résolutions sont ajoutées au fil des événements ; les deltas sont fusionnés
+    périodiquement en base puis l'état partagé est relu (autres workers inclus).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._base: Dict[SketchKey, DDSketch] = {}
+        self._delta: Dict[SketchKey, DDSketch] = {}
+
+    @staticmethod
+    def _keys(incident: dict) -> List[SketchKey]:
+        keys = [("global", "")]
+        for dimension, column in (("fokontany", "fokontany_id"), ("type", "type_id"), ("agent", "assigne_a_id")):
+            if incident.get(column) is not None:
+                keys.append((dimension, str(incident[column])))
+        return keys
+
+    def record(self, incident: dict, seconds: float) -> None:
+        with self._lock:
+            for key in self._keys(incident):
+                self._delta.setdefault(key, DDSketch()).add(seconds)
+                if self._loaded:
+                    self._base.setdefault(key, DDSketch()).add(seconds)
+
+    def on_incident_event(self, event: str, incident: dict, old_status: Optional[str],
+                          previous: Optional[dict] = None) -> None:
+        if event != "status_changed" or incident.get("statut") != "RESOLU" or old_status == "RESOLU":
+            return
+        if not incident.get("date_resolution") or not incident.get("date_signalement"):
+            return
+        resolved = datetime.fromisoformat(str(incident["date_resolution"]))
+        reported = datetime.fromisoformat(str(incident["date_signalement"]))
+        self.record(incident, (resolved - reported).total_seconds())
+
+    def flush(self) -> int:
+        """Fusionne en base les résolutions accumulées depuis le dernier envoi."""
+        with self._lock:
+            delta, self._delta = self._delta, {}
+        if not delta:
+            return 0
+        payload = [{"dimension": d, "cle": c, **sketch.to_row()} for (d, c), sketch in delta.items()]
+        try:
+            supabase.rpc("merge_resolution_sketches", {"p_sketches": payload}).execute()
+        except Exception:
+            # Les deltas non envoyés seront retentés au prochain cycle
+            with self._lock:
+                for key, sketch in delta.items():
+                    self._delta.setdefault(key, DDSketch()).merge(sketch)
+            raise
+        return len(payload)
+
+    def reload(self) -> None:
+        """Relit l'état partagé, en y ajoutant les deltas locaux pas encore envoyés."""
+        rows = supabase.table("resolution_sketches").select("dimension, cle, zero_count, bins").execute().data or []
+        base = {(row["dimension"], row["cle"]): DDSketch.from_row(row) for row in rows}
+        with self._lock:
+            for key, sketch in self._delta.items():
+                base.setdefault(key, DDSketch()).merge(sketch)
+            self._base = base
+            self._loaded = True
+
+    def sync(self) -> None:
+        self.flush()
+        self.reload()
+
+    def percentiles(self, dimension: str, quantiles=(0.5, 0.9, 0.99)) -> Dict[str, dict]:
+        """Quantiles (en secondes) et effectif par clé de la dimension demandée."""
+        if not self._loaded:
+            self.reload()
+        with self._lock:
+            return {
+                cle: {"count": sketch.count, "quantiles": [sketch.quantile(q) for q in quantiles]}
+                for (dim, cle), sketch in self._base.items()
+                if dim == dimension and sketch.count
+            }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "loaded": self._loaded,
+                "keys": len(self._base),
+                "bins": sum(len(s.bins) for s in self._base.values()),
+                "pending_keys": len(self._delta),
+            }
+
+
+resolution_sketches = ResolutionSketches()
+incident_events.subscribe(resolution_sketches.on_incident_event)
+metrics.register_gauge("resolution_sketches", resolution_sketches.stats)
+register_job(PeriodicJob("resolution-sketches", SKETCH_PERSIST_INTERVAL, resolution_sketches.sync))
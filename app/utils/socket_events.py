@@ -8,3 +8,10 @@ async def broadcast_panic_alert(incident_data: dict, sender_id: str):
     """
     print("Placeholder: broadcast_panic_alert called.")
     pass # The real implementation will be assigned in main.py
+
+async def broadcast_spike_alert(alert: dict):
+    """
+    Placeholder for the broadcast of an incident spike alert (see utils/spikes.py).
+    Will be replaced by the actual function in main.py.
+    """
+    print("Placeholder: broadcast_spike_alert called.")
@@ -0,0 +1,208 @@
+import asyncio
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+from ..database.database import supabase
+from . import incident_events, metrics, socket_events
+from .email_sender import send_spike_alert_notification
+from .exports import keyset_pages
+
+SPIKE_BUCKET_SECONDS = int(os.getenv("SPIKE_BUCKET_MINUTES", 60)) * 60
+SPIKE_ALPHA = float(os.getenv("SPIKE_ALPHA", 0.1))        # poids de la dernière tranche dans la ligne de base
+SPIKE_Z = float(os.getenv("SPIKE_Z", 3.0))                # écarts-types au-dessus de la ligne de base
+SPIKE_MIN_COUNT = int(os.getenv("SPIKE_MIN_COUNT", 3))    # en dessous, jamais d'alerte
+SPIKE_REBUILD_DAYS = int(os.getenv("SPIKE_REBUILD_DAYS", 14))
+# Au-delà, les tranches vides restantes ne changent plus la ligne de base de façon notable
+_MAX_EMPTY_STEPS = int(math.ceil(math.log(1e-3) / math.log(1 - SPIKE_ALPHA)))
+
+SpikeKey = Tuple[int, int]
+
+
+class _Baseline:
+    """Compte de la tranche courante et moyenne / variance exponentielles des tranches passées."""
+    __slots__ = ("bucket", "count", "mean", "var", "alerted")
+
+    def __init__(self, bucket: int):
+        self.bucket = bucket
+        self.count = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self.alerted = False
+
+    def _fold(self, value: float) -> None:
+        diff = value - self.mean
+        incr = SPIKE_ALPHA * diff
+        self.mean += incr
+        self.var = (1 - SPIKE_ALPHA) * (self.var + diff * incr)
+
+    def advance(self, bucket: int) -> None:
+        """Clôt la tranche courante et les tranches vides jusqu'à `bucket` (nombre d'étapes borné)."""
+        if bucket <= self.bucket:
+            return
+        self._fold(self.count)
+        for _ in range(min(bucket - self.bucket - 1, _MAX_EMPTY_STEPS)):
+            self._fold(0)
+        self.bucket = bucket
+        self.count = 0
+        self.alerted = False
+
+    def threshold(self) -> float:
+        return max(SPIKE_MIN_COUNT, self.mean + SPIKE_Z * math.sqrt(self.var) + 1)
+
+
+class SpikeDetector:
+    """
+    Détection en flux des pics d'incidents par (fokontany, type) : un compte par tranche
+    (SPIKE_BUCKET_MINUTES) comparé à une ligne de base EWMA, en O(1) par incident créé.
+    Une seule alerte par clé et par tranche. L'état se reconstruit depuis la base au démarrage.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state: Dict[SpikeKey, _Baseline] = {}
+        self._pending: Optional[List[Tuple[SpikeKey, int]]] = None
+        self.alerts = 0
+        self.on_alert: List[Callable[[dict], None]] = []
+
+    @staticmethod
+    def _bucket(signalement) -> int:
+        moment = datetime.fromisoformat(str(signalement)) if signalement else datetime.now(timezone.utc)
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        return int(moment.timestamp()) // SPIKE_BUCKET_SECONDS
+
+    def _observe(self, state: Dict[SpikeKey, _Baseline], key: SpikeKey, bucket: int) -> Optional[_Baseline]:
+        """Ajoute un incident ; renvoie la ligne de base si le seuil vient d'être franchi."""
+        baseline = state.get(key)
+        if baseline is None:
+            baseline = state[key] = _Baseline(bucket)
+        baseline.advance(bucket)
+        if bucket < baseline.bucket:
+            return None  # Incident daté d'une tranche déjà close : ignoré
+        baseline.count += 1
+        if not baseline.alerted and baseline.count >= baseline.threshold():
+            baseline.alerted = True
+            return baseline
+        return None
+
+    def observe(self, incident: dict) -> Optional[dict]:
+        if incident.get("fokontany_id") is None or incident.get("type_id") is None:
+            return None
+        key = (incident["fokontany_id"], incident["type_id"])
+        bucket = self._bucket(incident.get("date_signalement"))
+        with self._lock:
+            if self._pending is not None:
+                # Reconstruction en cours : rejoué ensuite, sans alerte
+                self._pending.append((key, bucket))
+                return None
+            baseline = self._observe(self._state, key, bucket)
+            if baseline is None:
+                return None
+            self.alerts += 1
+            alert = {
+                "fokontany_id": key[0],
+                "type_id": key[1],
+                "nom_fokontany": (incident.get("fokontany") or {}).get("nom_fokontany"),
+                "nom_type": (incident.get("typesincident") or {}).get("nom_type"),
+                "nombre": baseline.count,
+                "ligne_de_base": round(baseline.mean, 2),
+                "seuil": round(baseline.threshold(), 2),
+                "debut_tranche": datetime.fromtimestamp(bucket * SPIKE_BUCKET_SECONDS, timezone.utc).isoformat(),
+                "duree_tranche_minutes": SPIKE_BUCKET_SECONDS // 60,
+            }
+        for handler in list(self.on_alert):
+            try:
+                handler(alert)
+            except Exception as e:
+                print(f"ERROR spike alert handler {getattr(handler, '__name__', handler)}: {e}")
+        return alert
+
+    def on_incident_event(self, event: str, incident: dict, old_status: Optional[str],
+                          previous: Optional[dict] = None) -> None:
+        if event == "created":
+            self.observe(incident)
+
+    def rebuild(self, days: int = SPIKE_REBUILD_DAYS) -> int:
+        """Rejoue les incidents récents (sans alerte) pour reconstituer les lignes de base."""
+        with self._lock:
+            self._pending = []
+        since = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+        state: Dict[SpikeKey, _Baseline] = {}
+        replayed = 0
+        try:
+            # Rejeu dans l'ordre chronologique : un incident saisi hors ligne puis synchronisé
+            # reçoit un ID récent pour une date de signalement ancienne
+            rows = keyset_pages(lambda: supabase.table("incidents")
+                                .select("id, fokontany_id, type_id, date_signalement")
+                                .gte("date_signalement", since), order_by="date_signalement")
+            for row in rows:
+                if row.get("fokontany_id") is not None and row.get("type_id") is not None:
+                    self._observe(state, (row["fokontany_id"], row["type_id"]), self._bucket(row["date_signalement"]))
+                    replayed += 1
+            for baseline in state.values():
+                # Une nouvelle alerte dans la tranche en cours reste possible après le redémarrage
+                baseline.alerted = baseline.count >= baseline.threshold()
+        finally:
+            with self._lock:
+                pending, self._pending = self._pending or [], None
+                for key, bucket in pending:
+                    self._observe(state, key, bucket)
+                self._state = state
+        return replayed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"keys": len(self._state), "alerts": self.alerts, "rebuilding": self._pending is not None}
+
+
+spike_detector = SpikeDetector()
+incident_events.subscribe(spike_detector.on_incident_event)
+metrics.register_gauge("spike_detector", spike_detector.stats)
+
+# --- Diffusion des alertes : WebSocket (boucle de l'application) et email ---
+SPIKE_EMAIL_WORKERS = int(os.getenv("SPIKE_EMAIL_WORKERS", 2))
+SPIKE_EMAIL_QUEUE = int(os.getenv("SPIKE_EMAIL_QUEUE", 50))   # envois en cours ou en attente
+_email_executor = ThreadPoolExecutor(max_workers=SPIKE_EMAIL_WORKERS, thread_name_prefix="spike-alert-email")
+_email_slots = threading.BoundedSemaphore(SPIKE_EMAIL_QUEUE)
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def bind_event_loop(loop: asyncio.AbstractEventLoop) -> None:
+    """Boucle asyncio de l'application, utilisée depuis les threads des routes synchrones."""
+    global _loop
+    _loop = loop
+
+
+def _broadcast_alert(alert: dict) -> None:
+    if _loop is not None:
+        asyncio.run_coroutine_threadsafe(socket_events.broadcast_spike_alert(alert), _loop)
+
+
+def _send_alert_email(alert: dict) -> None:
+    try:
+        recipients = supabase.table("utilisateurs").select("email, role, fokontany_id") \
+            .in_("role", ["AUTORITE_LOCALE", "CHEF_FOKONTANY"]).eq("est_verifie", True).execute().data or []
+        emails = [u["email"] for u in recipients
+                  if u["role"] == "AUTORITE_LOCALE" or u.get("fokontany_id") == alert["fokontany_id"]]
+        if emails:
+            send_spike_alert_notification(emails, alert)
+    except Exception as e:
+        print(f"ERROR spike alert email: {e}")
+    finally:
+        _email_slots.release()
+
+
+def _email_alert(alert: dict) -> None:
+    # Rafale d'alertes : au-delà des envois en attente autorisés, l'email est abandonné
+    # (l'alerte WebSocket part quand même) plutôt que d'accumuler threads et connexions SMTP
+    if not _email_slots.acquire(blocking=False):
+        metrics.increment("spike_alerts", "emails_dropped")
+        print(f"ERROR spike alert email dropped: {SPIKE_EMAIL_QUEUE} emails already pending")
+        return
+    _email_executor.submit(_send_alert_email, alert)
+
+
+spike_detector.on_alert.extend([_broadcast_alert, _email_alert])
@@ -0,0 +1,133 @@
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+from fastapi import HTTPException, status
+from ..database.database import supabase
+from . import incident_events
+
+# Graphe des statuts : statut cible -> statuts de départ autorisés
+ALLOWED_TRANSITIONS = {
+    "VALIDE": ["NOUVEAU", "URGENT"],
+    "REJETE": ["NOUVEAU", "URGENT"],
+    "ASSIGNE": ["NOUVEAU", "URGENT", "VALIDE"],
+    "EN_COURS": ["ASSIGNE"],
+    "RESOLU": ["ASSIGNE", "EN_COURS"],
+    "NON_RESOLU": ["ASSIGNE", "EN_COURS"],
+}
+CLOSING_STATUSES = ["RESOLU", "NON_RESOLU"]
+
+
+def allowed_from(new_status: str) -> List[str]:
+    if new_status not in ALLOWED_TRANSITIONS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Statut cible inconnu : '{new_status}'.")
+    return ALLOWED_TRANSITIONS[new_status]
+
+
+def _raise_for_outcome(result: dict, assigned_to: Optional[UUID]) -> None:
+    """Traduit le résultat des fonctions SQL de transition en erreur HTTP."""
+    outcome = result.get("outcome")
+    if outcome == "not_found":
+        detail = "Incident non trouvé ou non assigné à cet agent." if assigned_to else "Incident non trouvé."
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=detail)
+    if outcome == "conflict":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Transition impossible : l'incident est déjà au statut '{result.get('statut')}'."
+        )
+    if outcome == "report_required":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Un rapport d'intervention est requis avant de pouvoir clôturer cet incident.")
+    if outcome == "report_exists":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Un rapport existe déjà pour cet incident.")
+    if outcome != "ok":
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="La mise à jour du statut a échoué.")
+
+
+def apply_transition(
+    incident_id: int,
+    new_status: str,
+    user_id: UUID,
+    changes: Optional[dict] = None,
+    assigned_to: Optional[UUID] = None,
+    require_report: bool = False
+) -> Tuple[dict, str]:
+    """
+    Applique une transition de statut en un seul appel à la base
+    (`transition_incident_status`) : mise à jour conditionnelle, historique
+    et relecture de l'incident avec ses références, dans la même transaction.
+    Retourne (incident, ancien_statut) ; 404 si introuvable, 409 si le statut
+    courant n'autorise pas la transition (ex: course perdue avec un autre utilisateur).
+    """
+    response = supabase.rpc("transition_incident_status", {
+        "p_incident_id": incident_id,
+        "p_to": new_status,
+        "p_from": allowed_from(new_status),
+        "p_user_id": str(user_id),
+        "p_changes": changes or {},
+        "p_assigne_a_id": str(assigned_to) if assigned_to else None,
+        "p_require_report": require_report
+    }).execute()
+    result = response.data or {}
+    _raise_for_outcome(result, assigned_to)
+    incident, old_status = result["incident"], result["ancien_statut"]
+    incident_events.publish("status_changed", incident, old_status)
+    return incident, old_status
+
+
+def submit_report_and_close(incident_id: int, agent_id: UUID, contenu: str, new_status: str) -> Tuple[dict, str]:
+    """
+    Insère le rapport d'intervention et clôture l'incident (RESOLU / NON_RESOLU,
+    date_resolution, historique) en une seule transaction (`submit_report_and_close`).
+    """
+    if new_status not in CLOSING_STATUSES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Le statut de clôture doit être RESOLU ou NON_RESOLU.")
+    response = supabase.rpc("submit_report_and_close", {
+        "p_incident_id": incident_id,
+        "p_agent_id": str(agent_id),
+        "p_contenu": contenu,
+        "p_to": new_status,
+        "p_from": allowed_from(new_status)
+    }).execute()
+    result = response.data or {}
+    _raise_for_outcome(result, agent_id)
+
+    incident, old_status = result["incident"], result["ancien_statut"]
+    incident_events.publish("status_changed", incident, old_status)
+    return incident, old_status
+
+
+def apply_bulk_transition(items: List[dict], new_status: str, user_id: UUID) -> Tuple[List[dict], List[dict]]:
+    """
+    Applique la même transition à plusieurs incidents en un seul appel
+    (`bulk_transition_incident_status`). `items` : [{"incident_id": ..., "assigne_a_id": ...}].
+    Retourne (résultats par incident, incidents mis à jour).
+    """
+    response = supabase.rpc("bulk_transition_incident_status", {
+        "p_items": items,
+        "p_to": new_status,
+        "p_from": allowed_from(new_status),
+        "p_user_id": str(user_id)
+    }).execute()
+    data = response.data or {}
+    updated: Dict[int, dict] = {row["id"]: row for row in data.get("updated", [])}
+    current: Dict[int, str] = {row["id"]: row["statut"] for row in data.get("current", [])}
+    invalid_agent = set(data.get("invalid_agent", []))
+
+    results = []
+    for incident_id in dict.fromkeys(item["incident_id"] for item in items):
+        if incident_id in updated:
+            results.append({"incident_id": incident_id, "success": True, "statut": new_status})
+        elif incident_id in invalid_agent:
+            results.append({
+                "incident_id": incident_id, "success": False, "statut": current.get(incident_id),
+                "detail": "Agent invalide : utilisateur inconnu ou qui n'est pas agent de sécurité urbaine."
+            })
+        elif incident_id in current:
+            results.append({
+                "incident_id": incident_id, "success": False, "statut": current[incident_id],
+                "detail": f"Transition impossible : l'incident est déjà au statut '{current[incident_id]}'."
+            })
+        else:
+            results.append({"incident_id": incident_id, "success": False, "detail": "Incident non trouvé."})
+
+    for incident in updated.values():
+        incident_events.publish("status_changed", incident, incident.pop("ancien_statut", None))
+    return results, list(updated.values())
@@ -0,0 +1,60 @@
+-- Comptages groupés (facettes) pour les panneaux de filtres des incidents.
+-- Chaque facette applique tous les filtres sauf le sien, pour que les
+-- puces restent cliquables ; l'agrégation se fait entièrement côté base.
+-- p_scope_fokontany_id est un périmètre de sécurité (chef de fokontany) : appliqué
+-- à toutes les facettes, y compris par_fokontany, contrairement à p_fokontany_id.
+
+create or replace function public.incident_facets(
+    p_statuts text[] default null,
+    p_type_id integer default null,
+    p_fokontany_id integer default null,
+    p_signale_par_id uuid default null,
+    p_assigne_a_id uuid default null,
+    p_start timestamptz default null,
+    p_end timestamptz default null,
+    p_scope_fokontany_id integer default null
+)
+returns jsonb
+language sql
+stable
+as $$
+    with base as (
+        select i.statut, i.type_id, i.fokontany_id
+        from public.incidents i
+        where (p_start is null or i.date_signalement >= p_start)
+          and (p_end is null or i.date_signalement <= p_end)
+          and (p_signale_par_id is null or i.signale_par_id = p_signale_par_id)
+          and (p_assigne_a_id is null or i.assigne_a_id = p_assigne_a_id)
+          and (p_scope_fokontany_id is null or i.fokontany_id = p_scope_fokontany_id)
+    ),
+    flags as (
+        select statut, type_id, fokontany_id,
+               (p_statuts is null or statut = any(p_statuts)) as ok_statut,
+               (p_type_id is null or type_id = p_type_id) as ok_type,
+               (p_fokontany_id is null or fokontany_id = p_fokontany_id) as ok_fokontany
+        from base
+    )
+    select jsonb_build_object(
+        'total', (select count(*) from flags where ok_statut and ok_type and ok_fokontany),
+        'par_statut', coalesce((
+            select jsonb_agg(jsonb_build_object('label', s.statut, 'count', s.n) order by s.n desc)
+            from (select statut, count(*) as n from flags
+                  where ok_type and ok_fokontany group by statut) s
+        ), '[]'::jsonb),
+        'par_type', coalesce((
+            select jsonb_agg(jsonb_build_object('id', t.type_id, 'label', ti.nom_type, 'count', t.n) order by t.n desc)
+            from (select type_id, count(*) as n from flags
+                  where ok_statut and ok_fokontany group by type_id) t
+            join public.typesincident ti on ti.id = t.type_id
+        ), '[]'::jsonb),
+        'par_fokontany', coalesce((
+            select jsonb_agg(jsonb_build_object('id', f.fokontany_id, 'label', fk.nom_fokontany, 'count', f.n) order by f.n desc)
+            from (select fokontany_id, count(*) as n from flags
+                  where ok_statut and ok_type group by fokontany_id) f
+            join public.fokontany fk on fk.id = f.fokontany_id
+        ), '[]'::jsonb)
+    );
+$$;
+
+create index if not exists incidents_date_signalement_idx
+    on public.incidents (date_signalement);
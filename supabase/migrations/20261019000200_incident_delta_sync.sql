@@ -0,0 +1,68 @@
+-- Synchronisation incrémentale (clients mobiles) : horodatage de modification
+-- et pierres tombales pour les incidents supprimés ou sortis du périmètre d'un utilisateur.
+
+alter table public.incidents
+    add column if not exists updated_at timestamptz not null default now();
+
+create or replace function public.incidents_touch_updated_at()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.updated_at := now();
+    return new;
+end;
+$$;
+
+drop trigger if exists incidents_touch_updated_at on public.incidents;
+create trigger incidents_touch_updated_at
+    before update on public.incidents
+    for each row execute function public.incidents_touch_updated_at();
+
+create index if not exists incidents_updated_at_id_idx
+    on public.incidents (updated_at, id);
+
+create table if not exists public.incidents_tombstones (
+    id bigserial primary key,
+    incident_id bigint not null,
+    fokontany_id integer,
+    signale_par_id uuid,
+    assigne_a_id uuid,
+    raison text not null default 'deleted',  -- 'deleted' ou 'moved'
+    deleted_at timestamptz not null default now()
+);
+
+create index if not exists incidents_tombstones_deleted_at_idx
+    on public.incidents_tombstones (deleted_at, id);
+
+-- Suppression : le client doit retirer l'incident (toutes les colonnes de périmètre renseignées).
+-- Réassignation / changement de fokontany : seul l'ancien agent ou l'ancien chef perd
+-- l'incident. La pierre tombale 'moved' ne porte donc que la colonne de l'ancien
+-- périmètre ; les autres restent NULL pour que l'auteur ou le nouveau périmètre ne la
+-- reçoivent pas. Une première assignation (NULL -> agent) ne retire l'incident à personne.
+create or replace function public.incidents_record_tombstone()
+returns trigger
+language plpgsql
+as $$
+begin
+    if tg_op = 'DELETE' then
+        insert into public.incidents_tombstones (incident_id, fokontany_id, signale_par_id, assigne_a_id, raison)
+        values (old.id, old.fokontany_id, old.signale_par_id, old.assigne_a_id, 'deleted');
+        return old;
+    end if;
+    if old.assigne_a_id is not null and old.assigne_a_id is distinct from new.assigne_a_id then
+        insert into public.incidents_tombstones (incident_id, assigne_a_id, raison)
+        values (old.id, old.assigne_a_id, 'moved');
+    end if;
+    if old.fokontany_id is not null and old.fokontany_id is distinct from new.fokontany_id then
+        insert into public.incidents_tombstones (incident_id, fokontany_id, raison)
+        values (old.id, old.fokontany_id, 'moved');
+    end if;
+    return new;
+end;
+$$;
+
+drop trigger if exists incidents_record_tombstone on public.incidents;
+create trigger incidents_record_tombstone
+    after update or delete on public.incidents
+    for each row execute function public.incidents_record_tombstone();
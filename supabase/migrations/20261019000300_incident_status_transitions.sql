@@ -0,0 +1,64 @@
+-- Transition de statut en un seul appel : verrouille la ligne, vérifie le statut
+-- de départ, met à jour, journalise dans historiquestatuts et renvoie l'incident
+-- avec ses références. Deux autorités qui cliquent en même temps : la seconde
+-- attend le verrou, voit le nouveau statut et obtient 'conflict'.
+
+create or replace function public.transition_incident_status(
+    p_incident_id bigint,
+    p_to text,
+    p_from text[],
+    p_user_id uuid,
+    p_changes jsonb default '{}'::jsonb,
+    p_assigne_a_id uuid default null,
+    p_require_report boolean default false
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_old text;
+begin
+    select statut into v_old
+    from public.incidents
+    where id = p_incident_id
+      and (p_assigne_a_id is null or assigne_a_id = p_assigne_a_id)
+    for update;
+
+    if not found then
+        return jsonb_build_object('outcome', 'not_found');
+    end if;
+    if not (v_old = any(p_from)) then
+        return jsonb_build_object('outcome', 'conflict', 'statut', v_old);
+    end if;
+    if p_require_report and not exists (
+        select 1 from public.rapportsintervention where incident_id = p_incident_id
+    ) then
+        return jsonb_build_object('outcome', 'report_required', 'statut', v_old);
+    end if;
+
+    update public.incidents set
+        statut = p_to,
+        assigne_a_id = case when p_changes ? 'assigne_a_id'
+                            then (p_changes->>'assigne_a_id')::uuid else assigne_a_id end,
+        date_assignation = case when p_changes ? 'date_assignation'
+                                then (p_changes->>'date_assignation')::timestamptz else date_assignation end,
+        date_resolution = case when p_changes ? 'date_resolution'
+                               then (p_changes->>'date_resolution')::timestamptz else date_resolution end
+    where id = p_incident_id;
+
+    insert into public.historiquestatuts (incident_id, ancien_statut, nouveau_statut, modifie_par_id)
+    values (p_incident_id, v_old, p_to, p_user_id);
+
+    return jsonb_build_object(
+        'outcome', 'ok',
+        'ancien_statut', v_old,
+        'incident', (
+            select to_jsonb(i) || jsonb_build_object('fokontany', to_jsonb(f), 'typesincident', to_jsonb(t))
+            from public.incidents i
+            left join public.fokontany f on f.id = i.fokontany_id
+            left join public.typesincident t on t.id = i.type_id
+            where i.id = p_incident_id
+        )
+    );
+end;
+$$;
@@ -0,0 +1,81 @@
+-- Un seul rapport par incident : la contrainte remplace la vérification préalable (non atomique).
+-- Les doublons existants ne sont pas supprimés automatiquement (ce sont des rapports
+-- rédigés) : la migration s'arrête en les listant, à fusionner ou retirer à la main.
+do $$
+declare
+    v_doublons text;
+begin
+    if not exists (
+        select 1 from pg_constraint where conname = 'rapportsintervention_incident_id_key'
+    ) then
+        select string_agg(incident_id::text, ', ' order by incident_id) into v_doublons
+        from (
+            select incident_id from public.rapportsintervention
+            group by incident_id having count(*) > 1
+        ) d;
+        if v_doublons is not null then
+            raise exception 'Plusieurs rapports d''intervention pour les incidents : %', v_doublons
+                using hint = 'Conserver un seul rapport par incident avant d''appliquer cette migration.';
+        end if;
+        alter table public.rapportsintervention
+            add constraint rapportsintervention_incident_id_key unique (incident_id);
+    end if;
+end;
+$$;
+
+-- Rapport + clôture (RESOLU / NON_RESOLU) + historique en une transaction.
+create or replace function public.submit_report_and_close(
+    p_incident_id bigint,
+    p_agent_id uuid,
+    p_contenu text,
+    p_to text,
+    p_from text[]
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_old text;
+    v_report_id bigint;
+begin
+    select statut into v_old
+    from public.incidents
+    where id = p_incident_id and assigne_a_id = p_agent_id
+    for update;
+
+    if not found then
+        return jsonb_build_object('outcome', 'not_found');
+    end if;
+    if not (v_old = any(p_from)) then
+        return jsonb_build_object('outcome', 'conflict', 'statut', v_old);
+    end if;
+
+    begin
+        insert into public.rapportsintervention (contenu, redige_par_id, incident_id)
+        values (p_contenu, p_agent_id, p_incident_id)
+        returning id into v_report_id;
+    exception when unique_violation then
+        return jsonb_build_object('outcome', 'report_exists', 'statut', v_old);
+    end;
+
+    update public.incidents
+    set statut = p_to, date_resolution = now()
+    where id = p_incident_id;
+
+    insert into public.historiquestatuts (incident_id, ancien_statut, nouveau_statut, modifie_par_id)
+    values (p_incident_id, v_old, p_to, p_agent_id);
+
+    return jsonb_build_object(
+        'outcome', 'ok',
+        'ancien_statut', v_old,
+        'rapport_id', v_report_id,
+        'incident', (
+            select to_jsonb(i) || jsonb_build_object('fokontany', to_jsonb(f), 'typesincident', to_jsonb(t))
+            from public.incidents i
+            left join public.fokontany f on f.id = i.fokontany_id
+            left join public.typesincident t on t.id = i.type_id
+            where i.id = p_incident_id
+        )
+    );
+end;
+$$;
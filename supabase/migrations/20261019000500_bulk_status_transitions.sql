@@ -0,0 +1,68 @@
+-- Transitions en lot pour le tri des incidents par l'Autorité Locale :
+-- verrouillage, mise à jour ensembliste et insertion groupée de l'historique
+-- en une seule requête. p_items : [{"incident_id": 1, "assigne_a_id": "..."}, ...]
+-- Un incident présent plusieurs fois : la dernière occurrence l'emporte.
+-- Un agent mal formé, inconnu ou qui n'est pas SECURITE_URBAINE fait échouer
+-- uniquement son élément (renvoyé dans 'invalid_agent'), pas tout le lot.
+
+create or replace function public.bulk_transition_incident_status(
+    p_items jsonb,
+    p_to text,
+    p_from text[],
+    p_user_id uuid
+)
+returns jsonb
+language sql
+as $$
+    with raw as (
+        select e.ord,
+               (e.x->>'incident_id')::bigint as incident_id,
+               nullif(e.x->>'assigne_a_id', '') as agent_text
+        from jsonb_array_elements(p_items) with ordinality as e(x, ord)
+    ),
+    dedup as (
+        select distinct on (incident_id) incident_id, agent_text
+        from raw
+        order by incident_id, ord desc
+    ),
+    input as (
+        select d.incident_id,
+               u.id as assigne_a_id,
+               (d.agent_text is not null and u.id is null) as agent_invalide
+        from dedup d
+        left join public.utilisateurs u
+            -- Le cast n'est évalué que pour un UUID bien formé
+            on u.id = case
+                   when d.agent_text ~* '^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$'
+                   then d.agent_text::uuid
+               end
+           and u.role = 'SECURITE_URBAINE'
+    ),
+    locked as (
+        select i.id, i.statut
+        from public.incidents i
+        join input on input.incident_id = i.id
+        for update of i
+    ),
+    updated as (
+        update public.incidents i set
+            statut = p_to,
+            assigne_a_id = coalesce(input.assigne_a_id, i.assigne_a_id),
+            date_assignation = case when input.assigne_a_id is not null then now() else i.date_assignation end
+        from locked
+        join input on input.incident_id = locked.id
+        where i.id = locked.id and locked.statut = any(p_from) and not input.agent_invalide
+        returning i.*, locked.statut as ancien_statut
+    ),
+    history as (
+        insert into public.historiquestatuts (incident_id, ancien_statut, nouveau_statut, modifie_par_id)
+        select id, ancien_statut, p_to, p_user_id from updated
+        returning incident_id
+    )
+    select jsonb_build_object(
+        'updated', coalesce((select jsonb_agg(to_jsonb(u)) from updated u), '[]'::jsonb),
+        'current', coalesce((select jsonb_agg(jsonb_build_object('id', l.id, 'statut', l.statut)) from locked l), '[]'::jsonb),
+        'invalid_agent', coalesce((select jsonb_agg(incident_id) from input where agent_invalide), '[]'::jsonb),
+        'logged', (select count(*) from history)
+    );
+$$;
@@ -0,0 +1,47 @@
+-- Champs d'affichage de l'historique dénormalisés à l'écriture :
+-- la lecture n'a plus besoin de jointures ni de formatage côté Python.
+
+alter table public.historiquestatuts
+    add column if not exists incident_titre text,
+    add column if not exists modifie_par_nom text;
+
+create or replace function public.historiquestatuts_fill_display_fields()
+returns trigger
+language plpgsql
+as $$
+begin
+    if new.incident_titre is null then
+        select titre into new.incident_titre from public.incidents where id = new.incident_id;
+    end if;
+    if new.modifie_par_nom is null then
+        select trim(coalesce(u.nom, '') || ' ' || coalesce(u.prenom, '') || ' - (' || coalesce(u.role, 'Rôle Inconnu') || ')')
+        into new.modifie_par_nom
+        from public.utilisateurs u where u.id = new.modifie_par_id;
+    end if;
+    return new;
+end;
+$$;
+
+drop trigger if exists historiquestatuts_fill_display_fields on public.historiquestatuts;
+create trigger historiquestatuts_fill_display_fields
+    before insert on public.historiquestatuts
+    for each row execute function public.historiquestatuts_fill_display_fields();
+
+-- Reprise des lignes existantes
+update public.historiquestatuts h
+set incident_titre = i.titre
+from public.incidents i
+where i.id = h.incident_id and h.incident_titre is null;
+
+update public.historiquestatuts h
+set modifie_par_nom = trim(coalesce(u.nom, '') || ' ' || coalesce(u.prenom, '') || ' - (' || coalesce(u.role, 'Rôle Inconnu') || ')')
+from public.utilisateurs u
+where u.id = h.modifie_par_id and h.modifie_par_nom is null;
+
+-- Pagination par clé (plus récent d'abord) et filtres usuels
+create index if not exists historiquestatuts_date_id_idx
+    on public.historiquestatuts (date_changement desc, id desc);
+create index if not exists historiquestatuts_incident_idx
+    on public.historiquestatuts (incident_id, date_changement desc, id desc);
+create index if not exists historiquestatuts_user_idx
+    on public.historiquestatuts (modifie_par_id, date_changement desc, id desc);
@@ -0,0 +1,130 @@
+-- Agrégat journalier des incidents par (jour, fokontany, type, statut, agent assigné),
+-- maintenu incrémentalement par trigger à chaque insertion, changement et suppression.
+-- Les statistiques se lisent ici en temps proportionnel au nombre de jours.
+
+create table if not exists public.incident_daily_rollup (
+    jour date not null,
+    fokontany_id integer not null references public.fokontany (id) on delete cascade,
+    type_id integer not null references public.typesincident (id) on delete cascade,
+    statut text not null,
+    assigne_a_id uuid,
+    nombre integer not null default 0,
+    constraint incident_daily_rollup_key
+        unique nulls not distinct (jour, fokontany_id, type_id, statut, assigne_a_id)
+);
+
+create index if not exists incident_daily_rollup_fokontany_idx
+    on public.incident_daily_rollup (fokontany_id, jour);
+create index if not exists incident_daily_rollup_assigne_idx
+    on public.incident_daily_rollup (assigne_a_id, jour);
+
+-- Jour (UTC) d'un incident, identique au découpage des routes de statistiques
+create or replace function public.incident_rollup_day(p_ts timestamptz)
+returns date
+language sql
+immutable
+as $$
+    select (p_ts at time zone 'UTC')::date;
+$$;
+
+create or replace function public.incident_rollup_add(
+    p_jour date, p_fokontany_id integer, p_type_id integer, p_statut text, p_assigne_a_id uuid, p_delta integer
+)
+returns void
+language sql
+as $$
+    insert into public.incident_daily_rollup as r (jour, fokontany_id, type_id, statut, assigne_a_id, nombre)
+    values (p_jour, p_fokontany_id, p_type_id, p_statut, p_assigne_a_id, p_delta)
+    on conflict on constraint incident_daily_rollup_key
+    do update set nombre = r.nombre + excluded.nombre;
+$$;
+
+create or replace function public.incidents_maintain_rollup()
+returns trigger
+language plpgsql
+as $$
+begin
+    if tg_op = 'UPDATE'
+       and old.statut is not distinct from new.statut
+       and old.type_id is not distinct from new.type_id
+       and old.fokontany_id is not distinct from new.fokontany_id
+       and old.assigne_a_id is not distinct from new.assigne_a_id
+       and old.date_signalement is not distinct from new.date_signalement then
+        return new;
+    end if;
+    if tg_op in ('UPDATE', 'DELETE') then
+        perform public.incident_rollup_add(public.incident_rollup_day(old.date_signalement),
+            old.fokontany_id, old.type_id, old.statut, old.assigne_a_id, -1);
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        perform public.incident_rollup_add(public.incident_rollup_day(new.date_signalement),
+            new.fokontany_id, new.type_id, new.statut, new.assigne_a_id, 1);
+        return new;
+    end if;
+    return old;
+end;
+$$;
+
+drop trigger if exists incidents_maintain_rollup on public.incidents;
+create trigger incidents_maintain_rollup
+    after insert or update or delete on public.incidents
+    for each row execute function public.incidents_maintain_rollup();
+
+-- Recalcul complet (ou sur une plage de jours) à partir de la table incidents
+create or replace function public.rebuild_incident_daily_rollup(p_start date default null, p_end date default null)
+returns integer
+language plpgsql
+as $$
+declare
+    v_rows integer;
+begin
+    delete from public.incident_daily_rollup
+    where (p_start is null or jour >= p_start) and (p_end is null or jour <= p_end);
+
+    insert into public.incident_daily_rollup (jour, fokontany_id, type_id, statut, assigne_a_id, nombre)
+    select public.incident_rollup_day(date_signalement), fokontany_id, type_id, statut, assigne_a_id, count(*)
+    from public.incidents
+    where (p_start is null or public.incident_rollup_day(date_signalement) >= p_start)
+      and (p_end is null or public.incident_rollup_day(date_signalement) <= p_end)
+    group by 1, 2, 3, 4, 5;
+    get diagnostics v_rows = row_count;
+    return v_rows;
+end;
+$$;
+
+-- Réconciliation : compte les groupes en écart sur la plage et la recalcule si besoin.
+create or replace function public.reconcile_incident_daily_rollup(p_start date, p_end date)
+returns integer
+language plpgsql
+as $$
+declare
+    v_drift integer;
+begin
+    with live as (
+        select public.incident_rollup_day(date_signalement) as jour, fokontany_id, type_id, statut, assigne_a_id, count(*)::integer as nombre
+        from public.incidents
+        where public.incident_rollup_day(date_signalement) between p_start and p_end
+        group by 1, 2, 3, 4, 5
+    ),
+    stored as (
+        select jour, fokontany_id, type_id, statut, assigne_a_id, nombre
+        from public.incident_daily_rollup
+        where jour between p_start and p_end and nombre <> 0
+    )
+    select count(*) into v_drift
+    from live full outer join stored
+      on live.jour = stored.jour
+     and live.fokontany_id = stored.fokontany_id
+     and live.type_id = stored.type_id
+     and live.statut = stored.statut
+     and live.assigne_a_id is not distinct from stored.assigne_a_id
+    where live.nombre is distinct from stored.nombre;
+
+    if v_drift > 0 then
+        perform public.rebuild_incident_daily_rollup(p_start, p_end);
+    end if;
+    return v_drift;
+end;
+$$;
+
+select public.rebuild_incident_daily_rollup();
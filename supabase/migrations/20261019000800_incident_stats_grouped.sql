@@ -0,0 +1,48 @@
+-- Statistiques groupées calculées côté base (GROUP BY / date_trunc) à partir de
+-- l'agrégat journalier : seuls quelques comptages traversent le réseau.
+
+create or replace function public.incident_stats_grouped(
+    p_start date,
+    p_end date,
+    p_period text default 'day',
+    p_fokontany_id integer default null,
+    p_type_id integer default null,
+    p_assigne_a_id uuid default null
+)
+returns jsonb
+language sql
+stable
+as $$
+    with base as (
+        select r.jour, r.statut, r.type_id, r.fokontany_id, r.nombre
+        from public.incident_daily_rollup r
+        where r.jour between p_start and p_end
+          and r.nombre > 0
+          and (p_fokontany_id is null or r.fokontany_id = p_fokontany_id)
+          and (p_type_id is null or r.type_id = p_type_id)
+          and (p_assigne_a_id is null or r.assigne_a_id = p_assigne_a_id)
+    )
+    select jsonb_build_object(
+        'total', (select coalesce(sum(nombre), 0) from base),
+        'par_statut', coalesce((
+            select jsonb_agg(jsonb_build_object('label', s.statut, 'count', s.n) order by s.n desc)
+            from (select statut, sum(nombre) as n from base group by statut) s
+        ), '[]'::jsonb),
+        'par_type', coalesce((
+            select jsonb_agg(jsonb_build_object('label', ti.nom_type, 'count', t.n) order by t.n desc)
+            from (select type_id, sum(nombre) as n from base group by type_id) t
+            join public.typesincident ti on ti.id = t.type_id
+        ), '[]'::jsonb),
+        'par_fokontany', coalesce((
+            select jsonb_agg(jsonb_build_object('label', fk.nom_fokontany, 'count', f.n) order by f.n desc)
+            from (select fokontany_id, sum(nombre) as n from base group by fokontany_id) f
+            join public.fokontany fk on fk.id = f.fokontany_id
+        ), '[]'::jsonb),
+        -- Début de compartiment (semaine ISO = lundi), ramené à p_start pour le premier
+        'par_periode', coalesce((
+            select jsonb_agg(jsonb_build_object('debut', p.debut, 'count', p.n) order by p.debut)
+            from (select greatest(date_trunc(p_period, jour)::date, p_start) as debut, sum(nombre) as n
+                  from base group by 1) p
+        ), '[]'::jsonb)
+    );
+$$;
@@ -0,0 +1,39 @@
+-- Totaux des KPIs (tableaux de bord admin / autorité) en un seul appel.
+-- Sert de point de départ et de réconciliation périodique aux compteurs
+-- en mémoire de app/utils/kpis.py ; la durée de résolution est sommée ici
+-- au lieu de télécharger tous les incidents résolus.
+
+create or replace function public.incident_kpi_totals()
+returns jsonb
+language sql
+stable
+as $$
+    select jsonb_build_object(
+        'incidents_total', (select count(*) from public.incidents),
+        'incidents_aujourdhui', (
+            select count(*) from public.incidents
+            where date_signalement >= date_trunc('day', now() at time zone 'UTC') at time zone 'UTC'
+        ),
+        'incidents_en_attente', (
+            select count(*) from public.incidents where statut in ('NOUVEAU', 'URGENT')
+        ),
+        'resolution_secondes', (
+            select coalesce(sum(extract(epoch from (date_resolution - date_signalement))), 0)
+            from public.incidents
+            where statut = 'RESOLU' and date_resolution is not null
+        ),
+        'resolutions', (
+            select count(*) from public.incidents
+            where statut = 'RESOLU' and date_resolution is not null
+        ),
+        'utilisateurs_en_attente', (
+            select count(*) from public.utilisateurs where est_verifie = false
+        ),
+        'agents_actifs', (
+            select count(*) from public.utilisateurs
+            where role = 'SECURITE_URBAINE' and est_verifie = true
+        )
+    );
+$$;
+
+create index if not exists incidents_statut_idx on public.incidents (statut);
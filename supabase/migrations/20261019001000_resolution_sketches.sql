@@ -0,0 +1,80 @@
+-- Esquisses de quantiles (type DDSketch) des durées de résolution, par dimension
+-- ('global', 'fokontany', 'type', 'agent'). Chaque processus fusionne ses deltas
+-- via merge_resolution_sketches : les compteurs de compartiments s'additionnent.
+-- Compartiment i : durées (en secondes) dans ]gamma^(i-1), gamma^i], gamma = 1.01/0.99
+-- (précision relative de 1 %) ; les durées <= 1 s vont dans zero_count.
+
+create table if not exists public.resolution_sketches (
+    dimension text not null,
+    cle text not null,
+    zero_count bigint not null default 0,
+    bins jsonb not null default '{}'::jsonb,
+    updated_at timestamptz not null default now(),
+    primary key (dimension, cle)
+);
+
+create or replace function public.merge_resolution_sketches(p_sketches jsonb)
+returns void
+language plpgsql
+as $$
+declare
+    v_sketch jsonb;
+begin
+    for v_sketch in select value from jsonb_array_elements(p_sketches)
+    loop
+        insert into public.resolution_sketches as s (dimension, cle, zero_count, bins)
+        values (
+            v_sketch->>'dimension',
+            v_sketch->>'cle',
+            coalesce((v_sketch->>'zero_count')::bigint, 0),
+            coalesce(v_sketch->'bins', '{}'::jsonb)
+        )
+        on conflict (dimension, cle) do update
+        set zero_count = s.zero_count + excluded.zero_count,
+            bins = (
+                select coalesce(jsonb_object_agg(k, total), '{}'::jsonb)
+                from (
+                    select k, sum(v) as total
+                    from (
+                        select key as k, value::text::bigint as v from jsonb_each(s.bins)
+                        union all
+                        select key, value::text::bigint from jsonb_each(excluded.bins)
+                    ) u
+                    group by k
+                ) agg
+            ),
+            updated_at = now();
+    end loop;
+end;
+$$;
+
+-- Amorçage à partir des incidents déjà résolus
+with resolved as (
+    select fokontany_id, type_id, assigne_a_id,
+           extract(epoch from (date_resolution - date_signalement)) as secondes
+    from public.incidents
+    where statut = 'RESOLU' and date_resolution is not null
+),
+keyed as (
+    select 'global' as dimension, '' as cle, secondes from resolved
+    union all
+    select 'fokontany', fokontany_id::text, secondes from resolved where fokontany_id is not null
+    union all
+    select 'type', type_id::text, secondes from resolved where type_id is not null
+    union all
+    select 'agent', assigne_a_id::text, secondes from resolved where assigne_a_id is not null
+),
+binned as (
+    select dimension, cle,
+           case when secondes > 1 then ceil(ln(secondes) / ln(1.01 / 0.99))::integer end as idx,
+           count(*) as n
+    from keyed
+    group by 1, 2, 3
+)
+insert into public.resolution_sketches (dimension, cle, zero_count, bins)
+select dimension, cle,
+       coalesce(sum(n) filter (where idx is null), 0),
+       coalesce(jsonb_object_agg(idx::text, n) filter (where idx is not null), '{}'::jsonb)
+from binned
+group by dimension, cle
+on conflict (dimension, cle) do nothing;
@@ -0,0 +1,182 @@
+-- Compteurs de performance par agent de sécurité, maintenus par trigger :
+-- missions ouvertes, premières actions et résolutions (avec durées cumulées),
+-- plus les clôtures par jour pour les comptes par période.
+-- Les durées sont mesurées à partir de date_assignation.
+
+create table if not exists public.agent_performance (
+    agent_id uuid primary key references public.utilisateurs (id) on delete cascade,
+    missions_ouvertes integer not null default 0,
+    premieres_actions integer not null default 0,
+    premiere_action_secondes double precision not null default 0,
+    resolutions_mesurees integer not null default 0,
+    resolution_secondes double precision not null default 0
+);
+
+create table if not exists public.agent_daily_closures (
+    agent_id uuid not null references public.utilisateurs (id) on delete cascade,
+    jour date not null,
+    resolus integer not null default 0,
+    non_resolus integer not null default 0,
+    primary key (agent_id, jour)
+);
+
+create or replace function public.agent_performance_add(
+    p_agent_id uuid,
+    p_missions integer default 0,
+    p_action_secondes double precision default null,
+    p_resolution_secondes double precision default null
+)
+returns void
+language sql
+as $$
+    insert into public.agent_performance as p (
+        agent_id, missions_ouvertes, premieres_actions, premiere_action_secondes,
+        resolutions_mesurees, resolution_secondes
+    )
+    values (
+        p_agent_id, p_missions,
+        (p_action_secondes is not null)::integer, coalesce(p_action_secondes, 0),
+        (p_resolution_secondes is not null)::integer, coalesce(p_resolution_secondes, 0)
+    )
+    on conflict (agent_id) do update
+    set missions_ouvertes = p.missions_ouvertes + excluded.missions_ouvertes,
+        premieres_actions = p.premieres_actions + excluded.premieres_actions,
+        premiere_action_secondes = p.premiere_action_secondes + excluded.premiere_action_secondes,
+        resolutions_mesurees = p.resolutions_mesurees + excluded.resolutions_mesurees,
+        resolution_secondes = p.resolution_secondes + excluded.resolution_secondes;
+$$;
+
+create or replace function public.incidents_maintain_agent_performance()
+returns trigger
+language plpgsql
+as $$
+declare
+    v_old_open boolean := tg_op <> 'INSERT' and old.assigne_a_id is not null and old.statut in ('ASSIGNE', 'EN_COURS');
+    v_new_open boolean := tg_op <> 'DELETE' and new.assigne_a_id is not null and new.statut in ('ASSIGNE', 'EN_COURS');
+begin
+    if v_old_open then
+        perform public.agent_performance_add(old.assigne_a_id, -1);
+    end if;
+    if v_new_open then
+        perform public.agent_performance_add(new.assigne_a_id, 1);
+    end if;
+
+    if tg_op = 'UPDATE' and new.assigne_a_id is not null and old.statut is distinct from new.statut then
+        -- Première action de l'agent : sortie du statut ASSIGNE
+        if old.statut = 'ASSIGNE' and new.date_assignation is not null then
+            perform public.agent_performance_add(
+                new.assigne_a_id, 0, extract(epoch from (now() - new.date_assignation)), null
+            );
+        end if;
+
+        if new.statut in ('RESOLU', 'NON_RESOLU') then
+            insert into public.agent_daily_closures as c (agent_id, jour, resolus, non_resolus)
+            values (
+                new.assigne_a_id,
+                (coalesce(new.date_resolution, now()) at time zone 'UTC')::date,
+                (new.statut = 'RESOLU')::integer,
+                (new.statut = 'NON_RESOLU')::integer
+            )
+            on conflict (agent_id, jour) do update
+            set resolus = c.resolus + excluded.resolus,
+                non_resolus = c.non_resolus + excluded.non_resolus;
+
+            if new.statut = 'RESOLU' and new.date_resolution is not null and new.date_assignation is not null then
+                perform public.agent_performance_add(
+                    new.assigne_a_id, 0, null, extract(epoch from (new.date_resolution - new.date_assignation))
+                );
+            end if;
+        end if;
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists incidents_maintain_agent_performance on public.incidents;
+create trigger incidents_maintain_agent_performance
+    after insert or update of statut, assigne_a_id or delete on public.incidents
+    for each row execute function public.incidents_maintain_agent_performance();
+
+-- Une page d'agents vérifiés avec leurs compteurs ; tri sur liste blanche.
+create or replace function public.agent_performance_page(
+    p_start date,
+    p_end date,
+    p_sort text default 'missions_ouvertes',
+    p_desc boolean default true,
+    p_limit integer default 50,
+    p_offset integer default 0
+)
+returns jsonb
+language sql
+stable
+as $$
+    with agents as (
+        select u.id, u.nom, u.prenom, u.fokontany_id,
+               coalesce(p.missions_ouvertes, 0) as missions_ouvertes,
+               coalesce(c.resolus, 0) as resolus,
+               coalesce(c.non_resolus, 0) as non_resolus,
+               case when p.premieres_actions > 0
+                    then round((p.premiere_action_secondes / p.premieres_actions / 3600)::numeric, 2) end as premiere_action_moyenne_heures,
+               case when p.resolutions_mesurees > 0
+                    then round((p.resolution_secondes / p.resolutions_mesurees / 3600)::numeric, 2) end as resolution_moyenne_heures
+        from public.utilisateurs u
+        left join public.agent_performance p on p.agent_id = u.id
+        left join (
+            select agent_id, sum(resolus) as resolus, sum(non_resolus) as non_resolus
+            from public.agent_daily_closures
+            where jour between p_start and p_end
+            group by agent_id
+        ) c on c.agent_id = u.id
+        where u.role = 'SECURITE_URBAINE' and u.est_verifie = true
+    ),
+    ranked as (
+        select a.*, (case p_sort
+                        when 'resolus' then a.resolus
+                        when 'non_resolus' then a.non_resolus
+                        when 'premiere_action_moyenne_heures' then a.premiere_action_moyenne_heures
+                        when 'resolution_moyenne_heures' then a.resolution_moyenne_heures
+                        else a.missions_ouvertes
+                     end)::double precision as sort_value
+        from agents a
+    ),
+    page as (
+        select * from ranked
+        order by case when p_desc then sort_value end desc nulls last,
+                 case when not p_desc then sort_value end asc nulls last,
+                 nom, prenom, id
+        limit p_limit offset p_offset
+    )
+    select jsonb_build_object(
+        'total', (select count(*) from agents),
+        'items', coalesce((
+            select jsonb_agg(to_jsonb(page) - 'sort_value'
+                             order by case when p_desc then sort_value end desc nulls last,
+                                      case when not p_desc then sort_value end asc nulls last,
+                                      nom, prenom, id)
+            from page
+        ), '[]'::jsonb)
+    );
+$$;
+
+-- Amorçage à partir des incidents existants (la durée de première action n'est pas historisée)
+insert into public.agent_performance (agent_id, missions_ouvertes, resolutions_mesurees, resolution_secondes)
+select i.assigne_a_id,
+       count(*) filter (where i.statut in ('ASSIGNE', 'EN_COURS')),
+       count(*) filter (where i.statut = 'RESOLU' and i.date_resolution is not null and i.date_assignation is not null),
+       coalesce(sum(extract(epoch from (i.date_resolution - i.date_assignation)))
+                filter (where i.statut = 'RESOLU' and i.date_resolution is not null and i.date_assignation is not null), 0)
+from public.incidents i
+join public.utilisateurs u on u.id = i.assigne_a_id
+group by i.assigne_a_id
+on conflict (agent_id) do nothing;
+
+insert into public.agent_daily_closures (agent_id, jour, resolus, non_resolus)
+select i.assigne_a_id,
+       (coalesce(i.date_resolution, i.date_signalement) at time zone 'UTC')::date,
+       count(*) filter (where i.statut = 'RESOLU'),
+       count(*) filter (where i.statut = 'NON_RESOLU')
+from public.incidents i
+join public.utilisateurs u on u.id = i.assigne_a_id
+where i.statut in ('RESOLU', 'NON_RESOLU')
+group by 1, 2
+on conflict (agent_id, jour) do nothing;
@@ -0,0 +1,59 @@
+-- Versions des ressources servies avec ETag et mises en cache par l'API.
+-- Incrémentées par la base à chaque écriture, quel que soit l'auteur (n'importe
+-- quel worker, script ou tableau de bord Supabase) : chaque processus les relit
+-- périodiquement (app/utils/etag.py) au lieu de tenir ses propres compteurs.
+-- La version n'est visible qu'au commit, en même temps que les données modifiées.
+
+create table if not exists public.resource_versions (
+    name text primary key,
+    version bigint not null default 0,
+    updated_at timestamptz not null default now()
+);
+
+insert into public.resource_versions (name)
+values ('incidents'), ('fokontany'), ('typesincident'), ('postes_securite')
+on conflict (name) do nothing;
+
+-- Un incrément par instruction (et non par ligne) : une action en lot ne compte qu'une fois
+create or replace function public.bump_resource_version()
+returns trigger
+language plpgsql
+as $$
+begin
+    update public.resource_versions
+    set version = version + 1, updated_at = now()
+    where name = tg_argv[0];
+    return null;
+end;
+$$;
+
+drop trigger if exists incidents_bump_version on public.incidents;
+create trigger incidents_bump_version
+    after insert or update or delete on public.incidents
+    for each statement execute function public.bump_resource_version('incidents');
+
+-- Le détail d'un incident embarque ses pièces jointes et son rapport
+drop trigger if exists piecesjointes_bump_version on public.piecesjointes;
+create trigger piecesjointes_bump_version
+    after insert or update or delete on public.piecesjointes
+    for each statement execute function public.bump_resource_version('incidents');
+
+drop trigger if exists rapportsintervention_bump_version on public.rapportsintervention;
+create trigger rapportsintervention_bump_version
+    after insert or update or delete on public.rapportsintervention
+    for each statement execute function public.bump_resource_version('incidents');
+
+drop trigger if exists fokontany_bump_version on public.fokontany;
+create trigger fokontany_bump_version
+    after insert or update or delete on public.fokontany
+    for each statement execute function public.bump_resource_version('fokontany');
+
+drop trigger if exists typesincident_bump_version on public.typesincident;
+create trigger typesincident_bump_version
+    after insert or update or delete on public.typesincident
+    for each statement execute function public.bump_resource_version('typesincident');
+
+drop trigger if exists postes_securite_bump_version on public.postes_securite;
+create trigger postes_securite_bump_version
+    after insert or update or delete on public.postes_securite
+    for each statement execute function public.bump_resource_version('postes_securite');
@@ -0,0 +1,105 @@
+import copy
+import os
+import sys
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Configuration factice : aucun test ne contacte Supabase ni le serveur SMTP
+TEST_ENV = {
+    "SECRET_KEY": "test-secret",
+    "ALGORITHM": "HS256",
+    "FROM_EMAIL": "noreply@example.test",
+    "SMTP_SERVER": "localhost",
+    "PASSWORD": "test",
+    "SUPABASE_URL": "http://localhost:54321",
+    "SUPABASE_KEY": "test-key",
+}
+for key, value in TEST_ENV.items():
+    os.environ.setdefault(key, value)
+
+
+def pytest_addoption(parser):
+    parser.addoption("--benchmarks", action="store_true", default=False,
+                     help="exécute aussi les mesures de performance (marqueur `benchmark`)")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "benchmark: mesure de performance, hors suite par défaut (--benchmarks)")
+
+
+def pytest_collection_modifyitems(config, items):
+    # Les mesures dépendent de la machine : elles ne doivent pas faire échouer la suite en CI
+    if config.getoption("--benchmarks"):
+        return
+    skip = pytest.mark.skip(reason="mesure de performance : relancer avec --benchmarks")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
+
+
+def best_time(fn, repeat: int = 5) -> float:
+    """Meilleur temps (secondes) sur `repeat` exécutions, pour lisser le bruit de la machine."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeQuery:
+    """Requête PostgREST enregistrée : chaque appel de méthode est noté, `execute` compte la requête."""
+
+    def __init__(self, client: "FakeSupabase", table: str):
+        self.client = client
+        self.table = table
+        self.calls = []
+
+    def __getattr__(self, name):
+        def method(*args, **kwargs):
+            self.calls.append((name, args))
+            return self
+        return method
+
+    def execute(self):
+        self.client.queries.append((self.table, self.calls))
+        handler = self.client.handlers.get(self.table, [])
+        data = handler(self.calls) if callable(handler) else handler
+        return FakeResponse(copy.deepcopy(data))
+
+
+class FakeSupabase:
+    """Client Supabase factice : réponses fixes par table et journal des requêtes exécutées."""
+
+    def __init__(self, handlers: dict):
+        self.handlers = handlers
+        self.queries = []
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def count(self, table: str) -> int:
+        return sum(1 for name, _ in self.queries if name == table)
+
+
+@pytest.fixture
+def fake_supabase(monkeypatch):
+    """Remplace le client partagé dans les modules qui l'importent ; à appeler avec les réponses par table."""
+    import importlib
+
+    def install(handlers: dict, modules=("app.routers.incidents", "app.routers.users", "app.utils.loaders",
+                                         "app.utils.reference_data")) -> FakeSupabase:
+        fake = FakeSupabase(handlers)
+        for name in modules:
+            monkeypatch.setattr(importlib.import_module(name), "supabase", fake)
+        return fake
+    return install
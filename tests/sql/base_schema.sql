@@ -0,0 +1,75 @@
+-- Tables de base gérées par Supabase (hors migrations du dépôt), réduites aux colonnes
+-- utilisées par l'API : suffisant pour appliquer supabase/migrations sur un Postgres local
+-- et y mesurer les chemins d'accès aux données (tests/test_database_benchmarks.py).
+
+create table public.postes_securite (
+    id serial primary key,
+    nom_poste text not null
+);
+
+create table public.fokontany (
+    id serial primary key,
+    nom_fokontany text not null
+);
+
+create table public.typesincident (
+    id serial primary key,
+    nom_type text not null,
+    categorie text not null default '',
+    poste_recommande_id integer references public.postes_securite (id)
+);
+
+create table public.utilisateurs (
+    id uuid primary key default gen_random_uuid(),
+    nom text not null,
+    prenom text not null,
+    email text not null unique,
+    telephone text,
+    mot_de_passe text,
+    role text,
+    fokontany_id integer references public.fokontany (id),
+    poste_securite_id integer references public.postes_securite (id),
+    est_verifie boolean not null default false,
+    photo_url text
+);
+
+create table public.incidents (
+    id bigserial primary key,
+    titre text not null,
+    description text not null,
+    date_signalement timestamptz not null default now(),
+    latitude double precision not null,
+    longitude double precision not null,
+    adresse_approximative text,
+    statut text not null default 'NOUVEAU',
+    signale_par_id uuid not null references public.utilisateurs (id),
+    fokontany_id integer not null references public.fokontany (id),
+    type_id integer not null references public.typesincident (id),
+    assigne_a_id uuid references public.utilisateurs (id),
+    date_assignation timestamptz,
+    date_resolution timestamptz
+);
+
+create table public.historiquestatuts (
+    id bigserial primary key,
+    incident_id bigint not null references public.incidents (id) on delete cascade,
+    ancien_statut text,
+    nouveau_statut text not null,
+    modifie_par_id uuid references public.utilisateurs (id),
+    date_changement timestamptz not null default now()
+);
+
+create table public.rapportsintervention (
+    id bigserial primary key,
+    incident_id bigint not null references public.incidents (id) on delete cascade,
+    redige_par_id uuid not null references public.utilisateurs (id),
+    contenu text not null,
+    date_rapport timestamptz not null default now()
+);
+
+create table public.piecesjointes (
+    id bigserial primary key,
+    incident_id bigint not null references public.incidents (id) on delete cascade,
+    url_fichier text not null,
+    type_fichier text not null
+);
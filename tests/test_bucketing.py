@@ -0,0 +1,112 @@
+import random
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from conftest import best_time
+from app.utils.bucketing import bucket_counts, bucket_labels
+
+
+def _counts(values, period, start, end, weights=None) -> dict:
+    return dict(bucket_counts(values, period, start, end, weights))
+
+
+def test_iso_week_53_spans_the_year_boundary():
+    # 2020-12-31 (jeudi) et 2021-01-03 (dimanche) appartiennent à la semaine ISO 2020-W53
+    values = ["2020-12-31T23:30:00+00:00", "2021-01-03T08:00:00+03:00", "2021-01-04T00:00:00"]
+    counts = _counts(values, "week", date(2020, 12, 28), date(2021, 1, 10))
+    assert counts == {"2020-W53": 2, "2021-W01": 1}
+
+
+def test_week_labels_start_on_the_monday_of_a_mid_week_start_date():
+    _, labels = bucket_labels("week", date(2020, 12, 31), date(2021, 1, 5))
+    assert labels == ["2020-W53", "2021-W01"]
+    _, labels = bucket_labels("week", date(2019, 12, 30), date(2020, 1, 6))
+    # 2019-12-30 est le lundi de 2020-W01
+    assert labels == ["2020-W01", "2020-W02"]
+
+
+def test_month_labels_across_year_boundary():
+    values = ["2020-11-30", "2020-12-31T23:59:59", "2021-01-01T00:00:00", "2021-02-02"]
+    counts = _counts(values, "month", date(2020, 11, 15), date(2021, 2, 2))
+    assert counts == {"2020-11": 1, "2020-12": 1, "2021-01": 1, "2021-02": 1}
+
+
+def test_day_labels_across_year_boundary_ignore_out_of_range_dates():
+    values = ["2020-12-29", "2020-12-30", "2021-01-01T12:00:00+00:00", "2021-01-02", "2021-01-03"]
+    counts = _counts(values, "day", date(2020, 12, 30), date(2021, 1, 2))
+    assert list(counts) == ["30/12", "31/12", "01/01", "02/01"]
+    assert list(counts.values()) == [1, 0, 1, 1]
+
+
+def test_weights_are_summed_per_bucket():
+    counts = _counts(["2021-01-04", "2021-01-05", "2021-01-11"], "week", date(2021, 1, 4), date(2021, 1, 17),
+                     weights=[2, 3, 4])
+    assert counts == {"2021-W01": 5, "2021-W02": 4}
+
+
+def test_unknown_period_is_rejected():
+    with pytest.raises(ValueError):
+        bucket_counts([], "year", date(2021, 1, 1), date(2021, 12, 31))
+
+
+def _synthetic(n: int, start: date, days: int) -> list:
+    rng = random.Random(42)
+    return [(datetime.combine(start, datetime.min.time()) + timedelta(seconds=rng.randrange(days * 86400)))
+            .isoformat() + "+00:00" for _ in range(n)]
+
+
+@pytest.mark.parametrize("period", ["day", "week", "month"])
+def test_matches_a_per_row_reference(period):
+    start, end = date(2020, 11, 1), date(2021, 2, 28)
+    values = _synthetic(2000, start - timedelta(days=10), 140)
+    fmt = {"day": "%d/%m", "week": "%G-W%V", "month": "%Y-%m"}[period]
+    expected = {label: 0 for label in bucket_labels(period, start, end)[1]}
+    for value in values:
+        day = datetime.fromisoformat(value).date()
+        if start <= day <= end:
+            expected[day.strftime(fmt)] += 1
+    assert _counts(values, period, start, end) == expected
+
+
+def _per_row_loop(incidents, period, start_date, end_date):
+    """Boucle d'origine de `aggregate_incidents_by_period`, gardée comme point de comparaison."""
+    labels = []
+    if period == 'day':
+        labels = [(start_date + timedelta(days=i)).strftime('%d/%m') for i in range((end_date - start_date).days + 1)]
+    elif period == 'week':
+        current_date = start_date
+        while current_date <= end_date:
+            labels.append(current_date.strftime('%Y-W%U'))
+            current_date += timedelta(weeks=1)
+    elif period == 'month':
+        current_date = start_date
+        while current_date <= end_date:
+            labels.append(current_date.strftime('%Y-%m'))
+            current_date = (current_date.replace(day=1) + timedelta(days=32)).replace(day=1)
+    period_counts = {label: 0 for label in labels}
+    for incident in incidents:
+        incident_date = datetime.fromisoformat(incident['date_signalement']).date()
+        if start_date <= incident_date <= end_date:
+            if period == 'day':
+                label = incident_date.strftime('%d/%m')
+            elif period == 'week':
+                label = incident_date.strftime('%Y-W%U')
+            else:
+                label = incident_date.strftime('%Y-%m')
+            if label in period_counts:
+                period_counts[label] += 1
+    return list(period_counts.items())
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("period", ["day", "week", "month"])
+def test_benchmark_one_million_incidents(period):
+    start, end = date(2025, 1, 1), date(2025, 12, 31)
+    values = _synthetic(1_000_000, start, 365)
+    incidents = [{"date_signalement": value} for value in values]
+
+    loop = best_time(lambda: _per_row_loop(incidents, period, start, end), repeat=1)
+    vectorized = best_time(lambda: bucket_counts(values, period, start, end), repeat=3)
+    print(f"{period} x1M: per-row loop {loop:.2f} s, vectorised {vectorized:.2f} s ({loop / vectorized:.1f}x)")
+    assert vectorized < loop
@@ -0,0 +1,278 @@
+"""
+Mesures des chemins d'accès aux données sur un Postgres local (hors suite par défaut) :
+
+    BENCH_DATABASE_URL=postgresql://postgres@localhost/incidents_bench pytest --benchmarks -s \\
+        tests/test_database_benchmarks.py
+
+La base indiquée doit être jetable : les tables de l'API y sont recréées
+(tests/sql/base_schema.sql puis supabase/migrations) et remplies de données synthétiques.
+Pour comparer avec PostgREST, BENCH_SUPABASE_URL / BENCH_SUPABASE_KEY doivent désigner
+l'API servant cette même base (ex : `supabase start`).
+"""
+import asyncio
+import glob
+import os
+import statistics
+import time
+from datetime import date, timedelta
+
+import pytest
+
+from conftest import ROOT
+from app.database import repositories
+from app.database.database import AsyncSupabaseClient
+from app.database.postgres import PostgresPool
+from app.schemas.incidents import IncidentFilters
+from app.utils.transitions import allowed_from
+
+BENCH_DATABASE_URL = os.getenv("BENCH_DATABASE_URL")
+BENCH_SUPABASE_URL = os.getenv("BENCH_SUPABASE_URL")
+BENCH_SUPABASE_KEY = os.getenv("BENCH_SUPABASE_KEY")
+# Latence réseau simulée par aller-retour entre l'API et la base (Render -> Supabase)
+BENCH_RTT_MS = float(os.getenv("BENCH_RTT_MS", 30))
+# Latence p95 au-delà de laquelle un niveau de concurrence n'est plus tenu
+BENCH_SLO_MS = float(os.getenv("BENCH_SLO_MS", 250))
+BENCH_INCIDENTS = int(os.getenv("BENCH_INCIDENTS", 20000))
+# Limite du threadpool de Starlette (anyio) qui exécute les routes `def`
+THREADPOOL_SIZE = 40
+
+pytestmark = [
+    pytest.mark.benchmark,
+    pytest.mark.skipif(not BENCH_DATABASE_URL, reason="BENCH_DATABASE_URL non défini (Postgres local jetable)"),
+]
+
+BENCH_TABLES = [
+    "agent_daily_closures", "agent_performance", "resolution_sketches", "incident_daily_rollup",
+    "incidents_tombstones", "piecesjointes", "rapportsintervention", "historiquestatuts", "incidents",
+    "utilisateurs", "typesincident", "fokontany", "postes_securite",
+]
+
+SEED_SQL = """
+insert into public.postes_securite (nom_poste) select 'Poste ' || g from generate_series(1, 8) g;
+insert into public.fokontany (nom_fokontany) select 'Fokontany ' || g from generate_series(1, 40) g;
+insert into public.typesincident (nom_type, categorie, poste_recommande_id)
+    select 'Type ' || g, 'Sécurité', 1 + g % 8 from generate_series(1, 12) g;
+insert into public.utilisateurs (nom, prenom, email, mot_de_passe, role, fokontany_id, poste_securite_id, est_verifie)
+    select 'Nom' || g, 'Prenom' || g, 'user' || g || '@bench.test', 'hash',
+           case when g = 1 then 'AUTORITE_LOCALE' when g <= 41 then 'CHEF_FOKONTANY'
+                when g <= 121 then 'SECURITE_URBAINE' else 'CITOYEN' end,
+           1 + g % 40, case when g between 42 and 121 then 1 + g % 8 end, true
+    from generate_series(1, 2000) g;
+insert into public.incidents (titre, description, date_signalement, latitude, longitude, statut,
+                              signale_par_id, fokontany_id, type_id)
+    select 'Incident ' || g, 'Description de l''incident ' || g,
+           now() - (g % 365) * interval '1 day' - (g % 86400) * interval '1 second',
+           -21.45 + (g % 100) / 1000.0, 47.08 + (g % 100) / 1000.0, 'NOUVEAU',
+           c.id, 1 + g % 40, 1 + g % 12
+    from generate_series(1, $1::integer) g
+    join public.utilisateurs c on c.email = 'user' || (122 + g % 1879) || '@bench.test';
+update public.incidents i set statut = 'RESOLU', assigne_a_id = a.id,
+       date_assignation = i.date_signalement + interval '1 hour',
+       date_resolution = i.date_signalement + interval '1 day'
+    from public.utilisateurs a
+    where i.id % 3 = 0 and a.email = 'user' || (42 + i.id % 80) || '@bench.test';
+analyze;
+"""
+
+# Chemin d'origine d'une validation : quatre allers-retours indépendants
+INCIDENT_WITH_REFERENCES = """
+    select to_jsonb(i) || jsonb_build_object('fokontany', to_jsonb(f), 'typesincident', to_jsonb(t))
+    from public.incidents i
+    left join public.fokontany f on f.id = i.fokontany_id
+    left join public.typesincident t on t.id = i.type_id
+    where i.id = $1
+"""
+
+
+async def _connect(dsn: str):
+    import asyncpg
+    return await asyncpg.connect(dsn)
+
+
+async def _prepare_database(dsn: str) -> None:
+    conn = await _connect(dsn)
+    try:
+        await conn.execute("drop table if exists " + ", ".join(f"public.{t}" for t in BENCH_TABLES) + " cascade")
+        with open(os.path.join(ROOT, "tests", "sql", "base_schema.sql"), encoding="utf-8") as f:
+            await conn.execute(f.read())
+        for path in sorted(glob.glob(os.path.join(ROOT, "supabase", "migrations", "*.sql"))):
+            with open(path, encoding="utf-8") as f:
+                await conn.execute(f.read())
+        for statement in SEED_SQL.split(";\n"):
+            if statement.strip():
+                await (conn.execute(statement, BENCH_INCIDENTS) if "$1" in statement else conn.execute(statement))
+        # PostgREST relit son cache de schéma après la recréation des tables
+        await conn.execute("notify pgrst, 'reload schema'")
+    finally:
+        await conn.close()
+
+
+@pytest.fixture(scope="module")
+def bench_database() -> str:
+    asyncio.run(_prepare_database(BENCH_DATABASE_URL))
+    if BENCH_SUPABASE_URL:
+        time.sleep(1)
+    return BENCH_DATABASE_URL
+
+
+def _summary(latencies) -> str:
+    ordered = sorted(latencies)
+    p95 = ordered[int(0.95 * (len(ordered) - 1))]
+    return f"p50 {statistics.median(ordered) * 1000:.2f} ms, p95 {p95 * 1000:.2f} ms"
+
+
+async def _sequential(call, n: int, warmup: int = 5) -> list:
+    for _ in range(warmup):
+        await call()
+    latencies = []
+    for _ in range(n):
+        start = time.perf_counter()
+        await call()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+# --- user-033 : transition de statut en un appel ---
+
+def test_benchmark_transition_round_trips(bench_database):
+    # Sans latence ajoutée (socket local), puis avec la latence réseau simulée par aller-retour
+    runs = {0.0: 200, BENCH_RTT_MS: 50}
+
+    async def run():
+        conn = await _connect(bench_database)
+        try:
+            authority = await conn.fetchval("select id from public.utilisateurs where role = 'AUTORITE_LOCALE'")
+            ids = iter([r["id"] for r in await conn.fetch(
+                "select id from public.incidents where statut = 'NOUVEAU' order by id limit $1",
+                2 * sum(n + 5 for n in runs.values()))])
+            results = {}
+            for rtt, n in runs.items():
+                async def round_trip(query, *args, method="fetchval"):
+                    await asyncio.sleep(rtt / 1000)
+                    return await getattr(conn, method)(query, *args)
+
+                async def four_round_trips():
+                    incident_id = next(ids)
+                    old_status = await round_trip("select statut from public.incidents where id = $1", incident_id)
+                    assert old_status in allowed_from("VALIDE")
+                    await round_trip("update public.incidents set statut = 'VALIDE' where id = $1", incident_id,
+                                     method="execute")
+                    await round_trip(INCIDENT_WITH_REFERENCES, incident_id)
+                    await round_trip(
+                        "insert into public.historiquestatuts (incident_id, ancien_statut, nouveau_statut, modifie_par_id) "
+                        "values ($1, $2, 'VALIDE', $3)", incident_id, old_status, authority, method="execute")
+
+                async def one_call():
+                    result = await round_trip("select public.transition_incident_status($1, 'VALIDE', $2, $3)",
+                                              next(ids), allowed_from("VALIDE"), authority)
+                    assert '"outcome": "ok"' in result
+
+                results[rtt] = (await _sequential(four_round_trips, n), await _sequential(one_call, n))
+            return results
+        finally:
+            await conn.close()
+
+    results = asyncio.run(run())
+    print()
+    for rtt, (before, after) in results.items():
+        print(f"transition, RTT {rtt:.0f} ms : 4 allers-retours {_summary(before)} ; "
+              f"transition_incident_status {_summary(after)}")
+    # En local, l'appel unique coûte à peu près autant que les quatre requêtes :
+    # le gain tient aux allers-retours évités, d'où l'assertion sur la latence simulée
+    before, after = results[BENCH_RTT_MS]
+    assert statistics.median(after) < statistics.median(before)
+
+
+# --- user-048 : PostgREST contre le pool asyncpg ---
+
+REPOSITORY_CALLS = {
+    "users.get_by_email": lambda users, incidents, stats: users.get_by_email("user500@bench.test"),
+    "users.get_session_by_email": lambda users, incidents, stats: users.get_session_by_email("user500@bench.test"),
+    "incidents.list (1 fokontany)": lambda users, incidents, stats: incidents.list(IncidentFilters(fokontany_id=3)),
+    "stats.grouped (30 jours)": lambda users, incidents, stats: stats.grouped({
+        "p_start": (date.today() - timedelta(days=30)).isoformat(), "p_end": date.today().isoformat(), "p_period": "day",
+        "p_fokontany_id": None, "p_type_id": None, "p_assigne_a_id": None,
+    }),
+}
+
+
+def test_benchmark_repository_backends(bench_database, monkeypatch):
+    pool = PostgresPool(bench_database)
+    monkeypatch.setattr(repositories, "postgres", pool)
+    backends = {"postgres": (repositories.PostgresUserRepository(), repositories.PostgresIncidentRepository(),
+                             repositories.PostgresStatsRepository())}
+    if BENCH_SUPABASE_URL and BENCH_SUPABASE_KEY:
+        monkeypatch.setenv("SUPABASE_URL", BENCH_SUPABASE_URL)
+        monkeypatch.setenv("SUPABASE_KEY", BENCH_SUPABASE_KEY)
+        monkeypatch.setattr(repositories, "async_supabase", AsyncSupabaseClient())
+        backends["postgrest"] = (repositories.PostgrestUserRepository(), repositories.PostgrestIncidentRepository(),
+                                 repositories.PostgrestStatsRepository())
+
+    async def run():
+        results = {}
+        try:
+            for label, call in REPOSITORY_CALLS.items():
+                for backend, repos in backends.items():
+                    results[label, backend] = await _sequential(lambda: call(*repos), 200)
+        finally:
+            await pool.close()
+        return results
+
+    print()
+    for (label, backend), latencies in asyncio.run(run()).items():
+        print(f"{label} [{backend}] : {_summary(latencies)}")
+
+
+# --- user-049 : concurrence, threadpool des routes `def` contre routes `async def` ---
+
+def test_benchmark_concurrency_threadpool_vs_async(bench_database, monkeypatch):
+    import anyio
+
+    pool = PostgresPool(bench_database)
+    monkeypatch.setattr(repositories, "postgres", pool)
+    users = repositories.PostgresUserRepository()
+    levels = [50, 100, 200, 400, 800, 1600]
+
+    async def db_call(i: int):
+        # Requête réelle sur le Postgres local + latence réseau simulée vers la base distante
+        await asyncio.sleep(BENCH_RTT_MS / 1000)
+        return await users.get_session_by_email(f"user{1 + i % 2000}@bench.test")
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        limiter = anyio.CapacityLimiter(THREADPOOL_SIZE)
+
+        async def blocking_route(i: int):
+            # Route `def` d'avant : un thread du pool reste bloqué pendant tout l'appel à la base
+            return await anyio.to_thread.run_sync(
+                lambda: asyncio.run_coroutine_threadsafe(db_call(i), loop).result(), limiter=limiter)
+
+        async def async_route(i: int):
+            return await db_call(i)
+
+        async def timed(route, i: int) -> float:
+            start = time.perf_counter()
+            assert await route(i) is not None
+            return time.perf_counter() - start
+
+        results = {}
+        try:
+            for route in (blocking_route, async_route):
+                for level in levels:
+                    started = time.perf_counter()
+                    latencies = await asyncio.gather(*(timed(route, i) for i in range(level)))
+                    results[route.__name__, level] = (latencies, level / (time.perf_counter() - started))
+        finally:
+            await pool.close()
+        return results
+
+    results = asyncio.run(run())
+    sustainable = {}
+    print(f"\nRTT simulé {BENCH_RTT_MS:.0f} ms, objectif p95 < {BENCH_SLO_MS:.0f} ms")
+    for (route, level), (latencies, throughput) in results.items():
+        print(f"{route} x{level} : {_summary(latencies)}, {throughput:.0f} req/s")
+        if sorted(latencies)[int(0.95 * (level - 1))] * 1000 < BENCH_SLO_MS:
+            sustainable[route] = max(sustainable.get(route, 0), level)
+    print(f"concurrence maximale tenue : threadpool {sustainable.get('blocking_route', 0)}, "
+          f"async {sustainable.get('async_route', 0)}")
+    assert sustainable.get("async_route", 0) > sustainable.get("blocking_route", 0)
@@ -0,0 +1,54 @@
+from app.utils.etag import ResourceVersions
+
+
+def _versions(fake_supabase, table: list) -> ResourceVersions:
+    fake_supabase({"resource_versions": lambda calls: table}, modules=("app.utils.etag",))
+    return ResourceVersions()
+
+
+def test_no_version_before_the_first_read(fake_supabase):
+    versions = _versions(fake_supabase, [{"name": "incidents", "version": 4}])
+    assert versions.current("incidents") == (None,)
+    versions.refresh()
+    assert versions.current("incidents", "fokontany") == ((4, 0), None)
+
+
+def test_database_change_notifies_listeners_but_not_the_first_read(fake_supabase):
+    table = [{"name": "incidents", "version": 1}, {"name": "fokontany", "version": 7}]
+    versions = _versions(fake_supabase, table)
+    seen = []
+    versions.on_change(seen.append)
+
+    versions.refresh()
+    versions.refresh()
+    assert seen == []
+
+    # Écriture faite par un autre worker ou directement en base
+    table[0] = {"name": "incidents", "version": 2}
+    versions.refresh()
+    assert seen == ["incidents"]
+    assert versions.current("incidents", "fokontany") == ((2, 0), (7, 0))
+
+
+def test_local_writes_change_the_version_until_the_next_read(fake_supabase):
+    table = [{"name": "incidents", "version": 1}]
+    versions = _versions(fake_supabase, table)
+    versions.refresh()
+    versions.bump("incidents")
+    assert versions.current("incidents") == ((1, 1),)
+
+    table[0] = {"name": "incidents", "version": 2}
+    versions.refresh()
+    assert versions.current("incidents") == ((2, 0),)
+
+
+def test_failing_listener_does_not_stop_the_others(fake_supabase):
+    table = [{"name": "incidents", "version": 1}]
+    versions = _versions(fake_supabase, table)
+    seen = []
+    versions.on_change(lambda name: 1 / 0)
+    versions.on_change(seen.append)
+    versions.refresh()
+    table[0] = {"name": "incidents", "version": 2}
+    versions.refresh()
+    assert seen == ["incidents"]
@@ -0,0 +1,104 @@
+import json
+from typing import List
+from uuid import uuid4
+
+import pytest
+from fastapi import HTTPException
+from pydantic import TypeAdapter
+
+from conftest import best_time
+from app.schemas.incidents import IncidentResponse
+from app.utils import incident_payloads
+from app.utils.incident_payloads import IncidentPayloadOptions
+from app.utils.reference_data import ReferenceCache
+
+FOKONTANY = [{"id": i, "nom_fokontany": f"Fokontany {i}"} for i in range(1, 41)]
+TYPES = [{"id": i, "nom_type": f"Type {i}", "categorie": "Sécurité", "poste_recommande_id": None} for i in range(1, 13)]
+FULL_SELECT = "*, fokontany:fokontany_id(*), typesincident:type_id(*)"
+
+
+@pytest.fixture(autouse=True)
+def references(monkeypatch):
+    cache = ReferenceCache()
+    cache._store("fokontany", FOKONTANY, 0)
+    cache._store("typesincident", TYPES, 0)
+    monkeypatch.setattr(incident_payloads, "reference_data", cache)
+    return cache
+
+
+def _rows(n: int) -> List[dict]:
+    # Lignes complètes telles que renvoyées par la sélection avec jointures
+    rows = []
+    for i in range(n):
+        fokontany, incident_type = FOKONTANY[i % len(FOKONTANY)], TYPES[i % len(TYPES)]
+        rows.append({
+            "id": i, "titre": f"Incident {i}", "description": "Description suffisamment longue",
+            "date_signalement": "2026-10-19T08:00:00+00:00", "latitude": -21.45, "longitude": 47.08,
+            "adresse_approximative": None, "statut": "NOUVEAU", "signale_par_id": str(uuid4()),
+            "fokontany_id": fokontany["id"], "type_id": incident_type["id"], "assigne_a_id": None,
+            "date_assignation": None, "date_resolution": None,
+            "fokontany": fokontany, "typesincident": incident_type,
+        })
+    return rows
+
+
+def _compact_rows(rows: List[dict], options: IncidentPayloadOptions) -> List[dict]:
+    # En mode compact, le dépôt ne lit que les colonnes demandées, sans jointure
+    return [{f: row[f] for f in options.columns()} for row in rows]
+
+
+@pytest.mark.parametrize("fields, include", [("titre,secret", None), (None, "utilisateurs"), ("fokontany", None)])
+def test_unknown_fields_and_includes_are_rejected(fields, include):
+    with pytest.raises(HTTPException) as error:
+        IncidentPayloadOptions(fields, include)
+    assert error.value.status_code == 400
+
+
+def test_compact_rows_keep_id_and_foreign_keys():
+    options = IncidentPayloadOptions("titre,statut", "fokontany")
+    assert options.fields == ["id", "fokontany_id", "type_id", "titre", "statut"]
+    assert options.select_clause(FULL_SELECT) == "id, fokontany_id, type_id, titre, statut"
+
+    rows = _rows(3)
+    body = json.loads(options.render(_compact_rows(rows, options)).body)
+    assert [row["id"] for row in body["data"]] == [0, 1, 2]
+    assert set(body["data"][0]) == {"id", "fokontany_id", "type_id", "titre", "statut"}
+    assert body["included"] == {"fokontany": {str(r["fokontany_id"]): {"id": r["fokontany_id"],
+                                                                      "nom_fokontany": r["fokontany"]["nom_fokontany"]}
+                                              for r in rows}}
+
+
+def test_without_parameters_the_full_response_is_kept():
+    options = IncidentPayloadOptions(None, None)
+    assert not options.compact and options.columns() is None
+    assert options.select_clause(FULL_SELECT) == FULL_SELECT
+    rows, adapter = _rows(2), TypeAdapter(List[IncidentResponse])
+    assert options.render(rows).body == adapter.dump_json(adapter.validate_python(rows))
+
+
+def test_compact_payload_is_smaller_on_a_large_list():
+    rows = _rows(10_000)
+    full = IncidentPayloadOptions(None, None).render(rows).body
+    options = IncidentPayloadOptions(None, "fokontany,typesincident")
+    compact = options.render(_compact_rows(rows, options)).body
+    # Chaque référence n'est envoyée qu'une fois au lieu d'une fois par incident
+    assert len(compact) < 0.85 * len(full)
+
+
+@pytest.mark.benchmark
+def test_benchmark_payload_bytes_and_serialisation_time():
+    rows = _rows(10_000)
+    adapter = TypeAdapter(List[IncidentResponse])
+    modes = {
+        "response_model (avant)": lambda: adapter.dump_json(adapter.validate_python(rows)),
+        "complet, sérialisation rapide": lambda: IncidentPayloadOptions(None, None).render(rows).body,
+    }
+    for fields, include in [(None, "fokontany,typesincident"), ("titre,statut,date_signalement", "fokontany,typesincident")]:
+        options = IncidentPayloadOptions(fields, include)
+        compact_rows = _compact_rows(rows, options)
+        modes[f"compact fields={fields} include={include}"] = (
+            lambda options=options, compact_rows=compact_rows: options.render(compact_rows).body
+        )
+    for label, render in modes.items():
+        size = len(render())
+        print(f"10k incidents, {label}: {size / 1024:.0f} KiB, {best_time(render) * 1000:.1f} ms")
@@ -0,0 +1,112 @@
+from uuid import uuid4
+
+import pytest
+from fastapi import BackgroundTasks
+
+from app.routers import incidents, users
+from app.schemas.incidents import IncidentCreate
+from app.schemas.users import UserResponse
+from app.utils import incident_events
+from app.utils.loaders import Loaders, UserScope
+from app.utils.reference_data import ReferenceCache
+
+FOKONTANY_ID = 3
+TYPE_ID = 2
+POSTE_ID = 7
+
+
+def _user(role, email, fokontany_id=None, poste_securite_id=None):
+    return {
+        "id": str(uuid4()), "nom": "Rakoto", "prenom": "Jean", "email": email, "role": role,
+        "fokontany_id": fokontany_id, "poste_securite_id": poste_securite_id,
+        "est_verifie": True, "postes_securite": None,
+    }
+
+
+# Le client factice n'applique aucun filtre : le loader doit répartir lui-même les lignes par périmètre
+VERIFIED_USERS = [
+    _user("AUTORITE_LOCALE", "autorite@example.test"),
+    _user("CHEF_FOKONTANY", "chef3@example.test", FOKONTANY_ID),
+    _user("CHEF_FOKONTANY", "chef4@example.test", 4),
+    _user("SECURITE_URBAINE", "agent-poste7@example.test", FOKONTANY_ID, POSTE_ID),
+    _user("SECURITE_URBAINE", "agent-poste8@example.test", FOKONTANY_ID, 8),
+    _user("SECURITE_URBAINE", "agent-fk4@example.test", 4, POSTE_ID),
+]
+
+
+@pytest.fixture
+def references(monkeypatch):
+    cache = ReferenceCache()
+    cache._store("fokontany", [{"id": FOKONTANY_ID, "nom_fokontany": "Tanambao"}], 0)
+    cache._store("typesincident", [{"id": TYPE_ID, "nom_type": "Vol", "categorie": "Sécurité",
+                                    "poste_recommande_id": POSTE_ID}], 0)
+    monkeypatch.setattr(incidents, "reference_data", cache)
+    monkeypatch.setattr(users, "reference_data", cache)
+    return cache
+
+
+@pytest.fixture(autouse=True)
+def no_listeners(monkeypatch):
+    # Caches, compteurs et détecteurs ne sont pas concernés par ces tests
+    monkeypatch.setattr(incident_events, "_listeners", [])
+
+
+def _citizen(role="CITOYEN"):
+    return UserResponse(id=uuid4(), nom="Rabe", prenom="Aina", email="citoyen@example.test",
+                        role=role, fokontany_id=FOKONTANY_ID, est_verifie=True)
+
+
+def test_create_incident_reads_recipients_in_one_query(fake_supabase, references):
+    current_user = _citizen()
+    fake = fake_supabase({
+        "incidents": [{
+            "id": 10, "titre": "Vol de moto", "description": "Moto volée devant le marché",
+            "date_signalement": "2026-10-19T08:00:00+00:00", "latitude": -21.45, "longitude": 47.08,
+            "statut": "NOUVEAU", "signale_par_id": str(current_user.id),
+            "fokontany_id": FOKONTANY_ID, "type_id": TYPE_ID,
+        }],
+        "utilisateurs": VERIFIED_USERS,
+        "historiquestatuts": [],
+    })
+    background_tasks = BackgroundTasks()
+
+    incidents.create_incident(
+        IncidentCreate(titre="Vol de moto", description="Moto volée devant le marché",
+                       latitude=-21.45, longitude=47.08, type_id=TYPE_ID, fokontany_id=FOKONTANY_ID),
+        background_tasks,
+        current_user=current_user,
+        loaders=Loaders(),
+    )
+
+    assert fake.count("utilisateurs") == 1  # trois requêtes par rôle auparavant
+    assert fake.count("fokontany") == 0 and fake.count("typesincident") == 0
+    [task] = background_tasks.tasks
+    assert sorted(task.kwargs["recipient_emails"]) == [
+        "agent-poste7@example.test", "agent-poste8@example.test",
+        "autorite@example.test", "chef3@example.test",
+    ]
+
+
+def test_panic_contacts_read_in_one_query(fake_supabase, references):
+    fake = fake_supabase({"utilisateurs": VERIFIED_USERS})
+
+    contacts = users.get_panic_contacts(
+        fokontany_id=FOKONTANY_ID, type_id=TYPE_ID, current_user=_citizen(), loaders=Loaders()
+    )
+
+    assert fake.count("utilisateurs") == 1  # type puis deux requêtes d'utilisateurs auparavant
+    assert fake.count("typesincident") == 0
+    assert [c.email for c in contacts] == ["autorite@example.test", "agent-poste7@example.test"]
+
+
+def test_loader_batches_and_memoises_within_a_request(fake_supabase):
+    fake = fake_supabase({"utilisateurs": VERIFIED_USERS})
+    loaders = Loaders()
+    chief, other_chief = UserScope("CHEF_FOKONTANY", FOKONTANY_ID), UserScope("CHEF_FOKONTANY", 4)
+
+    loaders.verified_users.load_many([chief, other_chief, chief])
+    loaders.verified_users.load(chief)
+
+    assert fake.count("utilisateurs") == 1
+    ((name, args),) = [call for call in fake.queries[0][1] if call[0] == "or_"]
+    assert args[0] == f"and(role.eq.CHEF_FOKONTANY,fokontany_id.eq.{FOKONTANY_ID}),and(role.eq.CHEF_FOKONTANY,fokontany_id.eq.4)"
@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta, timezone
+from typing import List
+from uuid import UUID, uuid4
+
+import pytest
+from pydantic import TypeAdapter, ValidationError
+
+from conftest import best_time
+from app.schemas.incidents import IncidentDetailResponse, IncidentResponse
+from app.schemas.users import UserResponse
+from app.utils import serialization
+from app.utils.serialization import serialize
+
+AGENT_ID = "5f0c6f3e-8d1a-4c59-9b7e-2a4d61c0e7b1"
+
+
+def _incident(i: int, **overrides) -> dict:
+    # Ligne telle que renvoyée par PostgREST : dates en texte, UUID en texte, colonnes en trop
+    row = {
+        "id": i, "titre": f"Vol à l'étalage n°{i}", "description": "Signalé près du marché d'Ambozontany",
+        "date_signalement": "2026-10-19T08:00:00.12345+00:00", "latitude": -21.4536789, "longitude": 47.0857,
+        "adresse_approximative": None, "statut": "NOUVEAU", "signale_par_id": str(uuid4()),
+        "fokontany_id": 3, "type_id": 2, "assigne_a_id": None, "date_assignation": None,
+        "date_resolution": None, "updated_at": "2026-10-19T08:00:00+00:00",
+        "fokontany": {"id": 3, "nom_fokontany": "Tanambao"},
+        "typesincident": {"id": 2, "nom_type": "Vol", "categorie": "Sécurité", "poste_recommande_id": 7},
+    }
+    row.update(overrides)
+    return row
+
+
+INCIDENT_ROWS = [
+    _incident(1),
+    # Date naïve, assignation avec décalage horaire, coordonnées entières
+    _incident(2, date_signalement="2026-10-19T08:00:00", latitude=-21.0, longitude=47,
+              statut="EN_COURS", assigne_a_id=AGENT_ID, date_assignation="2026-10-19T11:30:00+03:00"),
+    # Valeurs Python (et non texte) et références absentes
+    _incident(3, date_signalement=datetime(2026, 10, 19, 8, tzinfo=timezone.utc),
+              date_resolution=datetime(2026, 10, 20, 9, 15, 30, 500000, tzinfo=timezone(timedelta(hours=3))),
+              signale_par_id=UUID(AGENT_ID), statut="RESOLU", fokontany=None, typesincident=None),
+    # Colonnes optionnelles non sélectionnées : valeurs par défaut du modèle
+    {key: value for key, value in _incident(4).items()
+     if key not in ("adresse_approximative", "assigne_a_id", "fokontany", "typesincident")},
+]
+
+DETAIL_ROWS = [
+    {**_incident(5), "signale_par": {"prenom": "Aina", "nom": "Rabe"}, "assigne_a": None,
+     "piecesjointes": [{"id": 1, "url_fichier": "https://cdn.example.test/a.jpg", "type_fichier": "image"}],
+     "rapports_intervention": [{
+         "contenu": "Suspect interpellé", "date_rapport": "2026-10-19T10:00:00+00:00",
+         "redige_par": {"nom": "Rakoto", "prenom": "Jean", "postes_securite": {"nom_poste": "Poste 7"}},
+     }]},
+    # can_edit_delete, pièces jointes et rapports absents : valeurs par défaut
+    {**_incident(6, assigne_a_id=AGENT_ID), "signale_par": {"prenom": "Aina", "nom": "Rabe"},
+     "assigne_a": {"prenom": "Jean", "nom": "Rakoto"}},
+]
+
+USER_ROWS = [
+    {"id": AGENT_ID, "nom": "Rakoto", "prenom": "Jean", "email": "agent@example.test", "role": "SECURITE_URBAINE",
+     "telephone": "0341234567", "fokontany_id": 3, "poste_securite_id": 7, "est_verifie": True,
+     "photo_url": None, "postes_securite": {"nom_poste": "Poste 7"}, "mot_de_passe": "hash"},
+    {"id": str(uuid4()), "nom": "Rabe", "prenom": "Aina", "email": "citoyen@example.test", "role": None,
+     "est_verifie": False},
+]
+
+
+def _reference(model, data, many=False) -> bytes:
+    """Ce que produit `response_model` : validation pydantic puis dump_json."""
+    adapter = TypeAdapter(List[model] if many else model)
+    return adapter.dump_json(adapter.validate_python(data))
+
+
+@pytest.mark.parametrize("model, rows", [
+    (IncidentResponse, INCIDENT_ROWS),
+    (IncidentDetailResponse, DETAIL_ROWS),
+    (UserResponse, USER_ROWS),
+])
+def test_fast_path_matches_response_model(model, rows):
+    assert serialize(model, rows, many=True) == _reference(model, rows, many=True)
+    for row in rows:
+        assert serialize(model, row) == _reference(model, row)
+
+
+@pytest.mark.parametrize("model, rows", [(IncidentResponse, INCIDENT_ROWS), (UserResponse, USER_ROWS)])
+def test_stdlib_encoder_matches_response_model(monkeypatch, model, rows):
+    # orjson est optionnel : le repli sur json doit produire les mêmes octets
+    monkeypatch.setattr(serialization, "orjson", None)
+    assert serialize(model, rows, many=True) == _reference(model, rows, many=True)
+
+
+def test_untrusted_or_incomplete_rows_fall_back_to_validation():
+    row = {key: value for key, value in _incident(7).items() if key != "titre"}
+    with pytest.raises(ValidationError):
+        serialize(IncidentResponse, row)
+    row = _incident(8, latitude="-21.45")
+    assert serialize(IncidentResponse, row) == _reference(IncidentResponse, row)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("model, template", [
+    (IncidentResponse, INCIDENT_ROWS[0]),
+    (IncidentDetailResponse, DETAIL_ROWS[0]),
+    (UserResponse, USER_ROWS[0]),
+])
+def test_benchmark_fast_path(model, template):
+    rows = [dict(template) for _ in range(5000)]
+    serialization.prepare(model)
+    adapter = TypeAdapter(List[model])
+
+    baseline = best_time(lambda: adapter.dump_json(adapter.validate_python(rows)))
+    fast = best_time(lambda: serialize(model, rows, many=True))
+    print(f"{model.__name__} x{len(rows)}: response_model {baseline * 1000:.1f} ms, "
+          f"fast path {fast * 1000:.1f} ms ({baseline / fast:.1f}x)")
+    assert fast < baseline
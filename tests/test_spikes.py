@@ -0,0 +1,51 @@
+import threading
+
+from app.utils import spikes
+from app.utils.exports import keyset_pages
+
+
+def test_keyset_pages_resume_after_the_last_date_and_id(fake_supabase):
+    pages = [[{"id": 9, "date_signalement": "2026-10-01T08:00:00+00:00"},
+              {"id": 3, "date_signalement": "2026-10-02T08:00:00+00:00"}],
+             [{"id": 5, "date_signalement": "2026-10-02T08:00:00+00:00"}]]
+    fake = fake_supabase({"incidents": lambda calls: pages.pop(0)}, modules=("app.utils.spikes",))
+    rows = list(keyset_pages(lambda: fake.table("incidents").select("id, date_signalement"),
+                             page_size=2, order_by="date_signalement"))
+    assert [row["id"] for row in rows] == [9, 3, 5]
+
+    first, second = (calls for _, calls in fake.queries)
+    assert ("order", ("date_signalement",)) in first and ("order", ("id",)) in first
+    assert ("or_", ('date_signalement.gt."2026-10-02T08:00:00+00:00",'
+                    'and(date_signalement.eq."2026-10-02T08:00:00+00:00",id.gt.3)',)) in second
+
+
+def test_rebuild_replays_in_report_date_order(fake_supabase):
+    fake = fake_supabase({"incidents": []}, modules=("app.utils.spikes",))
+    spikes.SpikeDetector().rebuild()
+    calls = fake.queries[0][1]
+    assert [args for name, args in calls if name == "order"] == [("date_signalement",), ("id",)]
+
+
+def test_email_alerts_use_a_bounded_pool(monkeypatch):
+    release = threading.Event()
+    sent = []
+
+    def send(alert):
+        try:
+            release.wait(5)
+            sent.append(alert)
+        finally:
+            spikes._email_slots.release()
+
+    monkeypatch.setattr(spikes, "_send_alert_email", send)
+    slots = threading.BoundedSemaphore(2)
+    monkeypatch.setattr(spikes, "_email_slots", slots)
+    before = threading.active_count()
+    for i in range(10):
+        spikes._email_alert({"fokontany_id": i})
+    # Au plus SPIKE_EMAIL_WORKERS threads, quel que soit le nombre d'alertes
+    assert threading.active_count() - before <= spikes.SPIKE_EMAIL_WORKERS
+    release.set()
+    # Les envois libèrent leur place une fois terminés ; les 8 alertes en trop sont abandonnées
+    assert slots.acquire(timeout=5) and slots.acquire(timeout=5)
+    assert len(sent) == 2
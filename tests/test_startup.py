@@ -0,0 +1,47 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT, TEST_ENV
+
+# Budget du démarrage à froid (import de app.main) au-delà de l'import seul du framework
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", 3.0))
+# Dépendances lourdes qui ne doivent être importées qu'au premier usage
+DEFERRED_MODULES = ["supabase", "numpy", "asyncpg", "dns.resolver"]
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import %s
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+"""
+# Point de comparaison : le framework seul, que toute version de l'application importe
+BASELINE_MODULES = "fastapi, fastapi.middleware.cors, pydantic, jose.jwt, dotenv"
+
+
+def _cold_import(modules: str = "app.main") -> dict:
+    # Nouveau processus : aucun module déjà en cache, comme au démarrage sur Render
+    env = {**os.environ, **TEST_ENV, "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, os.getenv("PYTHONPATH")]))}
+    result = subprocess.run([sys.executable, "-c", _PROBE % (modules, DEFERRED_MODULES)], cwd=ROOT, env=env,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_heavy_dependencies_are_not_imported_at_startup():
+    assert _cold_import()["loaded"] == []
+
+
+@pytest.mark.benchmark
+def test_cold_import_stays_within_budget():
+    # Meilleur de trois essais pour lisser le bruit de la machine ; seul le coût propre
+    # à l'application est comparé au budget, pas la vitesse de la machine
+    baseline = min(_cold_import(BASELINE_MODULES)["seconds"] for _ in range(3))
+    seconds = min(_cold_import()["seconds"] for _ in range(3))
+    print(f"cold import: framework {baseline:.3f}s, app.main {seconds:.3f}s "
+          f"(+{seconds - baseline:.3f}s, budget {STARTUP_BUDGET_SECONDS}s)")
+    assert seconds - baseline < STARTUP_BUDGET_SECONDS